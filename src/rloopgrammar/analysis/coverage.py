@@ -5,6 +5,9 @@ from collections import defaultdict
 
 from typing import *
 
+from rloopgrammar.model.bed_intervals import BedIntervals
+from rloopgrammar.model.packed_sequence import PackedSequence
+
 PROGRAM_DESCRIPTION = "Find coverage"
 TABLE_NTUPLES_PER_LINE = 5
 MAX_NTUPLES_TO_DISPLAY = TABLE_NTUPLES_PER_LINE * 5
@@ -15,32 +18,6 @@ MAX_NTUPLES_TO_DISPLAY = TABLE_NTUPLES_PER_LINE * 5
 # - INDICATES THAT IT IS DETECTED ON THE CODING STRAND (POSSIBLE TEMPLATE?)
 # EXPERIMENT DETECTS C TO T CONVERSION USING THE CODING STRAND (POSSIBLE TEMPLATE?)
 
-class GenomicRegion:
-    def __init__(self, scaffold: str, start: int, end: int, *optional: List[any]):
-        self.scaffold = scaffold
-        self.start = start
-        self.end = end
-        self.optional_columns = optional
-
-    def __str__(self):
-        return str([self.scaffold, self.start, self.end, *self.optional_columns])
-
-    def __repr__(self):
-        return str(self)
-
-
-class BEDReader:
-    def __init__(self, file):
-        self.file = file
-        self.genomic_regions: List[GenomicRegion] = []
-
-        lines = self.file.readlines()
-        for line in lines:
-            columns = line.split()
-            genomic_region = GenomicRegion(columns[0], int(columns[1]), int(columns[2]), *columns[3:])
-            self.genomic_regions.append(genomic_region)
-
-
 def get_all_ntuples(sequence, start, end, window_length, padding):
     start_first_region = start - window_length if start - window_length >= 0 else 0
     end_first_region = start + window_length if start + window_length <= len(sequence) else len(sequence)
@@ -50,29 +27,21 @@ def get_all_ntuples(sequence, start, end, window_length, padding):
 
     sequences = list()
 
-    start_region = sequence[start_first_region - padding:end_first_region + padding]
-    end_region = sequence[start_second_region - padding:end_second_region + padding]
+    # The n-tuples are read from the shared k-mers of the packed sequence, the regions
+    # are bounded as slices of the sequence
+    kmers = sequence.kmer_strings(window_length)
+    start_region, start_region_end, _ = slice(start_first_region - padding, end_first_region + padding).indices(len(sequence))
+    end_region, end_region_end, _ = slice(start_second_region - padding, end_second_region + padding).indices(len(sequence))
 
-    for i in range(0, len(start_region) - window_length + 1):
-        sequences.append(start_region[i: i + window_length])
-        sequences.append(end_region[i: i + window_length])
+    for i in range(0, start_region_end - start_region - window_length + 1):
+        sequences.append(kmers[start_region + i])
 
-    return sequences
-
-
-def modify_genomic_regions(genomic_regions, width):
-    for genomic_region in genomic_regions:
-        i = 0
-        while ((genomic_region.end - (genomic_region.start + i)) % width) != 0:  # modify first index in R-loop
-            if i >= 0:
-                i += 1
-
-                if (genomic_region.start - i) < 0:
-                    continue
+        if end_region + i + window_length <= end_region_end:
+            sequences.append(kmers[end_region + i])
+        else:
+            sequences.append(sequence[end_region + i:max(end_region + i, end_region_end)])
 
-            i *= -1
-
-        genomic_region.start += i
+    return sequences
 
 
 def main():
@@ -83,19 +52,17 @@ def main():
     parser.add_argument('-p', '--padding', metavar='PADDING', type=int, help='padding size', required=True)
 
     args = parser.parse_args()
-    with open(args.bed_file, 'r') as bed_file:
-        bed_reader = BEDReader(bed_file)
-
-    modify_genomic_regions(bed_reader.genomic_regions, args.width)
+    # First index of each R-loop aligned to the n-tuple size
+    genomic_regions = BedIntervals.read(args.bed_file).aligned(args.width)
 
     with open(args.fasta_file, 'r') as fasta_file:
-        sequence = fasta_file.read()
+        sequence = PackedSequence(fasta_file.read())
 
     ntuples_unqiue = set()
     ntuple_frequency = defaultdict(lambda: 0)
 
-    for genomic_region in bed_reader.genomic_regions:
-        ntuples_all = get_all_ntuples(sequence, genomic_region.start, genomic_region.end, args.width, args.padding)
+    for start, end in genomic_regions.coordinates():
+        ntuples_all = get_all_ntuples(sequence, start, end, args.width, args.padding)
         ntuples_unqiue |= set(ntuples_all)
 
         for ntuple in ntuples_all:
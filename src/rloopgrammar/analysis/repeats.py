@@ -1,10 +1,12 @@
 import collections
 import json
 
+from rloopgrammar.model.bed_intervals import BedIntervals
+
 files = ["pfc53_supercoiledcr.bed", "pfc8_supercoiledcr.bed"]
 
 def read_all_rloops(bed_file):
-    return [tuple(map(int, t.split()[1:3])) for t in bed_file.readlines()]
+    return BedIntervals.read(bed_file).coordinates()
 
 rloop_counts = collections.defaultdict(lambda: 0)
 
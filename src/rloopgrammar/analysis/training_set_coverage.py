@@ -4,6 +4,8 @@ import matplotlib.pyplot as pyplot
 from collections import defaultdict
 from pathlib import Path
 
+from rloopgrammar.model.bed_intervals import BedIntervals
+
 PLASMIDS = ["pFC8_LINEARIZED", "pFC53_LINEARIZED"]
 RUNS = 10
 PADDING = 7
@@ -28,7 +30,11 @@ class RLoop:
 
 
 def read_all_rloops(bed_file):
-    return [RLoop(*t.split()[0:3] + [i]) for i, t in enumerate(bed_file.readlines())]
+    rloops = BedIntervals.read(bed_file)
+    return [
+        RLoop(plasmid, start, end, i)
+        for i, (plasmid, (start, end)) in enumerate(zip(rloops.chroms, rloops.coordinates()))
+    ]
 
 if __name__ == "__main__":
     run_folders = [
@@ -0,0 +1,197 @@
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+
+from typing import *
+
+"""
+Import-time budget of the command line programs.
+
+The programs import their heavy dependencies (numpy, openpyxl, Biopython, gmpy2,
+xlsxwriter, scipy and matplotlib) in the functions using them, so parsing the
+arguments, printing the help and starting a pool worker do not pay for them.
+Each entry point is imported in a fresh interpreter with -X importtime, its
+import time must stay within its budget and none of the deferred modules may be
+loaded. The time of a --help invocation is reported alongside.
+"""
+
+STARTUP_FORMAT_VERSION = 1
+
+DEFERRED_MODULES = (
+    "numpy",
+    "openpyxl",
+    "Bio",
+    "gmpy2",
+    "xlsxwriter",
+    "scipy",
+    "matplotlib",
+)
+
+# milliseconds to import the module of each console script
+IMPORT_BUDGETS = {
+    "rloopgrammar.build_model": 150.0,
+    "rloopgrammar.kfold_model": 150.0,
+    "rloopgrammar.union_models": 150.0,
+    "rloopgrammar.sweep_model": 150.0,
+    "rloopgrammar.update_model": 150.0,
+    "rloopgrammar.predict": 150.0,
+    "rloopgrammar.verify": 150.0,
+    "rloopgrammar.graph_prediction": 100.0,
+    "rloopgrammar.model_bundle": 100.0,
+    "rloopgrammar.profiling": 100.0,
+    "rloopgrammar.benchmark.suite": 150.0,
+}
+
+LOADED_MODULES_CODE = (
+    "import json, sys\n"
+    "import {module}\n"
+    "print(json.dumps(sorted(m for m in {deferred!r} if m in sys.modules)))\n"
+)
+
+
+def import_time(module: str) -> Tuple[float, List[str]]:
+    """Milliseconds to import a module in a fresh interpreter, and the deferred
+    modules it loads."""
+    completed = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            LOADED_MODULES_CODE.format(module=module, deferred=DEFERRED_MODULES),
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    # import time: SELF_US | CUMULATIVE_US | MODULE
+    for line in completed.stderr.splitlines():
+        fields = line.split("|")
+
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1]) / 1000, json.loads(completed.stdout)
+
+    raise RuntimeError(f"No import time reported for {module}")
+
+
+def help_time(module: str) -> float:
+    """Milliseconds to run a module with --help, interpreter startup included."""
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-m", module, "--help"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        check=True,
+    )
+
+    return (time.perf_counter() - start) * 1000
+
+
+def measure(modules: Iterable[str], repeat: int) -> Dict[str, Dict[str, Any]]:
+    """Best import and --help times of each module over the repeats."""
+    results = dict()
+
+    for module in modules:
+        import_times, loaded = list(), set()
+
+        for _ in range(repeat):
+            milliseconds, deferred = import_time(module)
+            import_times.append(milliseconds)
+            loaded.update(deferred)
+
+        results[module] = dict(
+            import_time=min(import_times),
+            help_time=min(help_time(module) for _ in range(repeat)),
+            deferred_loaded=sorted(loaded),
+        )
+
+    return results
+
+
+def over_budget(
+    results: Dict[str, Dict[str, Any]], factor: float = 1.0
+) -> List[str]:
+    """Entry points over their budget, scaled by factor, or loading a deferred
+    module."""
+    return [
+        module
+        for module, result in results.items()
+        if result["import_time"] > IMPORT_BUDGETS[module] * factor
+        or result["deferred_loaded"]
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Check the import time of the command line programs."
+    )
+    parser.add_argument(
+        "-m",
+        "--modules",
+        nargs="+",
+        choices=list(IMPORT_BUDGETS),
+        default=list(IMPORT_BUDGETS),
+    )
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        type=int,
+        default=5,
+        help="Runs of every measure, the shortest time is kept.",
+    )
+    parser.add_argument(
+        "-f",
+        "--factor",
+        type=float,
+        default=1.0,
+        help="Scale of the budgets, for slower machines.",
+    )
+    parser.add_argument(
+        "-o",
+        "--results",
+        type=str,
+        default=None,
+        help="File to write the measures to, as JSON.",
+    )
+    args = parser.parse_args()
+
+    results = measure(args.modules, args.repeat)
+    failures = over_budget(results, args.factor)
+
+    print(f"{'entry point':<32} {'import':>10} {'budget':>10} {'--help':>10}")
+    for module, result in results.items():
+        print(
+            f"{module:<32} {result['import_time']:>7.1f} ms "
+            f"{IMPORT_BUDGETS[module] * args.factor:>7.1f} ms "
+            f"{result['help_time']:>7.1f} ms"
+        )
+
+        if result["deferred_loaded"]:
+            print(f"  loads {', '.join(result['deferred_loaded'])} at import")
+
+    if args.results:
+        with open(args.results, "w") as fout:
+            json.dump(
+                {
+                    "version": STARTUP_FORMAT_VERSION,
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "factor": args.factor,
+                    "budgets": IMPORT_BUDGETS,
+                    "entry_points": results,
+                },
+                fout,
+                indent=1,
+            )
+
+    if failures:
+        print(f"Over the import budget: {', '.join(failures)}.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+import argparse
+import dataclasses
+import hashlib
+import json
+import pathlib
+import platform
+import sys
+
+from typing import *
+
+import rloopgrammar.benchmark.synthetic as synthetic
+import rloopgrammar.build_model as build_model
+import rloopgrammar.predict as predict
+import rloopgrammar.stage_metrics as stage_metrics
+
+from rloopgrammar.stage_cache import StageCache
+
+"""
+Benchmark of the model build and prediction on synthetic plasmids.
+
+Each scale builds one model and predicts with it through the same functions as
+the command line programs, and records the time of their metrics stages: the
+stages of RegionsExtractor (extract, weights), RegionsThreshold (threshold),
+GrammarDict (dictionary), GrammarWord (words), GrammarTraining (probabilities),
+Probabilistic_Language (word_probabilities) and Loop_probabilities (in_loop),
+with the end-to-end time of the build and the prediction. The best time over
+the repeats is kept, and the results are compared with a baseline written by an
+earlier benchmark, by default the reference results of baseline.json committed
+with this package. Besides the preset scales of synthetic.SCALES, a custom
+scale is given by its gene length, number of R-loops and length distribution.
+"""
+
+BENCHMARK_FORMAT_VERSION = 1
+
+DEFAULT_THRESHOLD = 0.25  # relative slowdown reported as a regression
+MIN_TIME = 0.05  # seconds, shorter times are within the timing noise
+
+REFERENCE_BASELINE = pathlib.Path(__file__).parent / "baseline.json"
+
+
+def stage_times(run_folder: pathlib.Path) -> Dict[str, float]:
+    with open(run_folder / stage_metrics.RUN_METRICS_FILENAME, "r") as fin:
+        metrics = json.load(fin)
+
+    return {stage["name"]: stage["wall_time"] for stage in metrics["stages"]}
+
+
+def benchmark_scale(
+    folder: pathlib.Path,
+    scale: synthetic.SyntheticScale,
+    window_length: int,
+    padding_length: int,
+    training_set_percent: float,
+    seed: int,
+) -> Dict[str, Any]:
+    """Build and predict once on the synthetic plasmid of a scale."""
+    plasmid = synthetic.write_plasmid(folder / "data", scale, seed)
+    model_folder = folder / "model"
+    prediction_folder = folder / "prediction"
+    model_folder.mkdir(exist_ok=True)
+    prediction_folder.mkdir(exist_ok=True)
+
+    # the training set is drawn from a fixed seed
+    seed_file = folder / "SEED.b"
+    with open(seed_file, "wb") as fout:
+        fout.write(hashlib.sha256(str(seed).encode()).digest())
+
+    bed_extra_file = model_folder / f"{plasmid.name}.bed_extra.bed"
+    metrics = stage_metrics.RunMetrics()
+
+    with metrics.stage("extract", [plasmid.fasta_file, plasmid.bed_file]):
+        build_model.create_bed_extra(
+            plasmid, window_length, padding_length, bed_extra_file, StageCache(None)
+        )
+
+    mp = build_model.ModelParameters(
+        model_folder,
+        0,
+        plasmid,
+        window_length,
+        padding_length,
+        training_set_percent,
+        seed_file,
+        None,
+        bed_extra_file,
+    )
+    with metrics.stage("build"):
+        build_model.build_model(mp)
+
+    with metrics.stage("all_rloops"):
+        predicted_rloops = predict.write_all_rloops(
+            plasmid,
+            window_length,
+            predict.get_all_rloops_bed_file(prediction_folder, plasmid, window_length),
+        )
+
+    pp = predict.PredictionParameters(
+        build_model.get_run_folder(mp),
+        prediction_folder,
+        plasmid,
+        window_length,
+        padding_length,
+        0,
+    )
+    with metrics.stage("predict"):
+        predict.do_prediction(pp)
+
+    times = {stage.name: stage.wall_time for stage in metrics.stages}
+
+    return {
+        "predicted_rloops": predicted_rloops,
+        "build": {
+            "wall_time": times["extract"] + times["build"],
+            "stages": dict(
+                extract=times["extract"],
+                **stage_times(build_model.get_run_folder(mp)),
+            ),
+        },
+        "predict": {
+            "wall_time": times["all_rloops"] + times["predict"],
+            "stages": dict(
+                all_rloops=times["all_rloops"],
+                **stage_times(predict.get_run_folder(pp)),
+            ),
+        },
+    }
+
+
+def best_of(repeats: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Shortest time of every stage over the repeats of a scale."""
+    best = repeats[0]
+
+    for phase in ("build", "predict"):
+        best[phase]["wall_time"] = min(r[phase]["wall_time"] for r in repeats)
+
+        for stage in best[phase]["stages"]:
+            best[phase]["stages"][stage] = min(
+                r[phase]["stages"][stage] for r in repeats
+            )
+
+    return best
+
+
+def timings(results: Dict[str, Any]) -> Dict[str, float]:
+    """Times of the results by SCALE/PHASE and SCALE/PHASE/STAGE."""
+    flat = dict()
+
+    for scale_name, scale_results in results["scales"].items():
+        for phase in ("build", "predict"):
+            flat[f"{scale_name}/{phase}"] = scale_results[phase]["wall_time"]
+
+            for stage, wall_time in scale_results[phase]["stages"].items():
+                flat[f"{scale_name}/{phase}/{stage}"] = wall_time
+
+    return flat
+
+
+def compare(
+    results: Dict[str, Any],
+    baseline: Dict[str, Any],
+    threshold: float = DEFAULT_THRESHOLD,
+    min_time: float = MIN_TIME,
+) -> List[Dict[str, Any]]:
+    """Times slower than the baseline by more than threshold, relatively.
+
+    Only the times of the scales found in both with the same parameters are
+    compared, and baseline times under min_time are ignored.
+    """
+    current, reference = timings(results), timings(baseline)
+    regressions = []
+
+    same_scales = {
+        name
+        for name, scale_results in results["scales"].items()
+        if name in baseline["scales"]
+        and baseline["scales"][name]["scale"] == scale_results["scale"]
+    }
+
+    for key, wall_time in current.items():
+        if key.split("/")[0] not in same_scales:
+            continue
+        if key not in reference or reference[key] < min_time:
+            continue
+
+        if wall_time > reference[key] * (1 + threshold):
+            regressions.append(
+                dict(
+                    timing=key,
+                    baseline=reference[key],
+                    current=wall_time,
+                    ratio=wall_time / reference[key],
+                )
+            )
+
+    return regressions
+
+
+def run_benchmark(
+    output_folder: pathlib.Path,
+    scales: List[synthetic.SyntheticScale],
+    window_length: int,
+    padding_length: int,
+    training_set_percent: float,
+    seed: int,
+    repeat: int,
+) -> Dict[str, Any]:
+    results = {
+        "version": BENCHMARK_FORMAT_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": dict(
+            window_length=window_length,
+            padding_length=padding_length,
+            training_set_percent=training_set_percent,
+            seed=seed,
+        ),
+        "repeat": repeat,
+        "scales": {},
+    }
+
+    for scale in scales:
+        repeats = []
+
+        for number in range(repeat):
+            print(f"Benchmarking {scale.name}, repeat {number + 1} of {repeat}.")
+            repeats.append(
+                benchmark_scale(
+                    output_folder / scale.name / f"repeat_{number}",
+                    scale,
+                    window_length,
+                    padding_length,
+                    training_set_percent,
+                    seed,
+                )
+            )
+
+        results["scales"][scale.name] = dict(
+            scale=dataclasses.asdict(scale), **best_of(repeats)
+        )
+
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Time the model build and prediction on synthetic plasmids."
+    )
+    parser.add_argument("output_folder")
+    parser.add_argument(
+        "-s",
+        "--scales",
+        nargs="+",
+        choices=list(synthetic.SCALES),
+        default=None,
+        help="Preset scales, small and medium by default without a custom scale.",
+    )
+    parser.add_argument(
+        "--gene_length",
+        type=int,
+        default=None,
+        help="Gene length of a custom scale, given with --rloops.",
+    )
+    parser.add_argument(
+        "--rloops", type=int, default=None, help="R-loops of a custom scale."
+    )
+    parser.add_argument(
+        "--mean_length",
+        type=float,
+        default=synthetic.SyntheticScale.mean_length,
+        help="Mean R-loop length of a custom scale.",
+    )
+    parser.add_argument(
+        "--sd_length",
+        type=float,
+        default=synthetic.SyntheticScale.sd_length,
+        help="Standard deviation of the R-loop lengths of a custom scale.",
+    )
+    parser.add_argument("-k", "--width", type=int, default=4)
+    parser.add_argument("-p", "--padding", type=int, default=13)
+    parser.add_argument("-sp", "--sampling_precent", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        type=int,
+        default=3,
+        help="Runs of every scale, the shortest time of each stage is kept.",
+    )
+    parser.add_argument(
+        "-o",
+        "--results",
+        type=str,
+        default=None,
+        help="Results file, benchmark.json in the output folder by default.",
+    )
+    parser.add_argument(
+        "-b",
+        "--baseline",
+        type=str,
+        default=str(REFERENCE_BASELINE),
+        help="Results of an earlier benchmark to compare with, the reference "
+        "results of this package by default.",
+    )
+    parser.add_argument(
+        "--no_baseline",
+        action="store_true",
+        help="Do not compare with a baseline.",
+    )
+    parser.add_argument(
+        "-t",
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Relative slowdown from the baseline reported as a regression.",
+    )
+    args = parser.parse_args()
+
+    scales = [synthetic.SCALES[name] for name in args.scales or []]
+
+    if (args.gene_length is None) != (args.rloops is None):
+        parser.error("a custom scale needs both --gene_length and --rloops.")
+    elif args.gene_length is not None:
+        try:
+            scales.append(
+                synthetic.custom_scale(
+                    args.gene_length, args.rloops, args.mean_length, args.sd_length
+                )
+            )
+        except ValueError as error:
+            parser.error(str(error))
+    elif not scales:
+        scales = [synthetic.SCALES[name] for name in ("small", "medium")]
+
+    output_folder = pathlib.Path(args.output_folder)
+    output_folder.mkdir(parents=True, exist_ok=True)
+
+    results = run_benchmark(
+        output_folder,
+        scales,
+        args.width,
+        args.padding,
+        args.sampling_precent,
+        args.seed,
+        args.repeat,
+    )
+
+    flat = timings(results)
+    width = max(len(key) for key in flat)
+
+    for key, wall_time in flat.items():
+        print(f"{key:<{width}} {wall_time:>10.3f} s")
+
+    regressions = []
+
+    if args.baseline and not args.no_baseline:
+        with open(args.baseline, "r") as fin:
+            baseline = json.load(fin)
+
+        if baseline["parameters"] != results["parameters"]:
+            print(f"{args.baseline} was run with other parameters.")
+
+        regressions = compare(results, baseline, args.threshold)
+        results["comparison"] = dict(
+            baseline=args.baseline,
+            threshold=args.threshold,
+            regressions=regressions,
+        )
+
+        for regression in regressions:
+            print(
+                f"Regression {regression['timing']}: {regression['baseline']:.3f} s "
+                f"-> {regression['current']:.3f} s ({regression['ratio']:.2f}x)"
+            )
+
+    results_filename = args.results or output_folder / "benchmark.json"
+    with open(results_filename, "w") as fout:
+        json.dump(results, fout, indent=1)
+
+    print(f"Wrote {results_filename}.")
+
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import dataclasses
+import pathlib
+import random
+
+from typing import *
+
+from rloopgrammar.config_reader import Plasmid
+
+"""
+Synthetic plasmids and R-loops for benchmarks.
+
+The sequence is drawn uniformly, and the R-loops are drawn inside the gene with
+normally distributed lengths, a fraction of them repeated as the duplicate
+reads of experimental BED files. The same scale and seed give the same files.
+"""
+
+
+@dataclasses.dataclass
+class SyntheticScale:
+    name: str
+    gene_length: int
+    rloops: int
+    mean_length: float = 150.0
+    sd_length: float = 60.0
+    min_length: int = 20
+    duplicate_fraction: float = 0.2  # of the R-loops repeating an earlier one
+    flank_length: int = 80  # bases before and after the gene
+
+
+SCALES = {
+    "small": SyntheticScale("small", 300, 200, mean_length=80.0, sd_length=30.0),
+    "medium": SyntheticScale("medium", 600, 1000, mean_length=150.0),
+    "large": SyntheticScale("large", 1200, 5000, mean_length=250.0, sd_length=100.0),
+}
+
+RLOOP_MARGIN = 16  # bases between the R-loops and the ends of the gene
+
+
+def custom_scale(
+    gene_length: int,
+    rloops: int,
+    mean_length: float = SyntheticScale.mean_length,
+    sd_length: float = SyntheticScale.sd_length,
+) -> SyntheticScale:
+    """Scale named after its parameters, so that its results are only compared
+    with a scale of the same parameters."""
+    name = f"custom_g{gene_length}_r{rloops}_m{mean_length:g}_sd{sd_length:g}"
+
+    if gene_length < 2 * RLOOP_MARGIN + SyntheticScale.min_length:
+        raise ValueError(f"{name}: the gene is too short for R-loops.")
+
+    return SyntheticScale(name, gene_length, rloops, mean_length, sd_length)
+
+
+def random_sequence(length: int, rng: random.Random) -> str:
+    return "".join(rng.choice("ACGT") for _ in range(length))
+
+
+def random_rloops(
+    scale: SyntheticScale, gene_start: int, rng: random.Random
+) -> List[Tuple[int, int]]:
+    """R-loops inside the gene, clear of its ends by a few windows."""
+    margin = RLOOP_MARGIN
+    max_length = scale.gene_length - 2 * margin
+
+    rloops = []
+    for _ in range(scale.rloops):
+        if rloops and rng.random() < scale.duplicate_fraction:
+            rloops.append(rng.choice(rloops))
+            continue
+
+        length = round(rng.gauss(scale.mean_length, scale.sd_length))
+        length = min(max(length, scale.min_length), max_length)
+        start = rng.randint(
+            gene_start + margin, gene_start + scale.gene_length - margin - length
+        )
+        rloops.append((start, start + length))
+
+    return rloops
+
+
+def write_plasmid(
+    folder: pathlib.Path,
+    scale: SyntheticScale,
+    seed: int = 0,
+    name: str = "SYNTH",
+) -> Plasmid:
+    """Write the FASTA, BED and plasmids.ini files of a synthetic plasmid."""
+    folder = pathlib.Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(f"{scale.name} {seed}")
+
+    gene_start = scale.flank_length
+    gene_end = gene_start + scale.gene_length
+    plasmid = Plasmid(
+        name,
+        gene_start,
+        gene_end,
+        str(folder / f"{name}.fa"),
+        str(folder / f"{name}.bed"),
+    )
+
+    with open(plasmid.fasta_file, "w") as fout:
+        fout.write(f">{name}\n")
+        fout.write(random_sequence(gene_end + scale.flank_length, rng) + "\n")
+
+    with open(plasmid.bed_file, "w") as fout:
+        for number, (start, end) in enumerate(random_rloops(scale, gene_start, rng)):
+            fout.write(f"{name}_rloop{number}\t{start}\t{end}\n")
+
+    with open(folder / "plasmids.ini", "w") as fout:
+        fout.write(
+            f"[{name}]\n"
+            f"GeneStart = {gene_start}\n"
+            f"GeneEnd = {gene_end}\n"
+            f"FastaFile = {plasmid.fasta_file}\n"
+            f"BEDFile = {plasmid.bed_file}\n"
+        )
+
+    return plasmid
@@ -1,4 +1,3 @@
-import multiprocessing
 import sys
 import os
 import pathlib
@@ -8,18 +7,32 @@ import math
 import random
 import logging
 import argparse
+import itertools
 import shutil
 
 from typing import *
 
-NUMBER_OF_PROCESSES = 10
-
 import rloopgrammar.model.regions_extractor as region_extractor
 import rloopgrammar.model.regions_threshold as region_threshold
 import rloopgrammar.model.training_set as training_set
 import rloopgrammar.model.grammar_dict as grammar_dict
 import rloopgrammar.model.grammar_word as grammar_word
 import rloopgrammar.model.grammar_training as grammar_training
+import rloopgrammar.model.rloop_blocks as rloop_blocks
+import rloopgrammar.model.bed_intervals as bed_intervals
+import rloopgrammar.model.packed_sequence as packed_sequence
+import rloopgrammar.model.bootstrap_ensemble as bootstrap_ensemble
+import rloopgrammar.model.model_update as model_update
+
+import rloopgrammar.model_bundle as model_bundle
+import rloopgrammar.manifest as manifest
+import rloopgrammar.profiling as profiling
+import rloopgrammar.verify as verify
+import rloopgrammar.stage_metrics as stage_metrics
+
+from rloopgrammar.stage_cache import Stage, StageCache
+from rloopgrammar.scheduler import run_tasks
+from rloopgrammar.checkpoint import is_complete
 
 from rloopgrammar.config_reader import read_plasmids
 from rloopgrammar.config_reader import Plasmid
@@ -58,14 +71,50 @@ class ModelParameters:
     training_set_percent: float
     seed_file: Optional[pathlib.Path]
     training_set_file: Optional[pathlib.Path]
+    bed_extra_file: pathlib.Path
+    cache_folder: Optional[pathlib.Path] = None
+    weight_file: Optional[pathlib.Path] = None
+    bootstrap: Optional[str] = None  # resampling method of bootstrap runs
 
 
-def build_model(mp: ModelParameters) -> None:
-    run_folder = (
+def get_run_folder(mp: ModelParameters) -> pathlib.Path:
+    return (
         mp.parent_folder
         / f"Model_{mp.plasmid.name}_p{mp.padding_length}_w{mp.window_length}_{mp.run_number}"
     )
 
+
+def get_collection_folder(mp: ModelParameters) -> pathlib.Path:
+    return mp.parent_folder
+
+
+def get_bootstrap_collection_folder(runs: List[ModelParameters]) -> pathlib.Path:
+    return runs[0].parent_folder
+
+
+def write_seed(mp: ModelParameters, run_folder: pathlib.Path) -> Tuple[bytes, str]:
+    """Seed of a run, read from its seed file or drawn, and the _SEED.b file it is
+    written to in the run folder."""
+    if mp.seed_file:
+        with open(mp.seed_file, "rb") as seed_file_handle:
+            seed = seed_file_handle.read()
+    else:
+        seed = os.urandom(32)
+
+    seed_filename = str(
+        run_folder
+        / f"{mp.plasmid.name}_p{mp.padding_length}_w{mp.window_length}_{mp.run_number}_SEED.b"
+    )
+
+    with open(seed_filename, "wb") as seed_file:
+        seed_file.write(seed)
+
+    return seed, seed_filename
+
+
+def build_model(mp: ModelParameters) -> manifest.RunRecord:
+    run_folder = get_run_folder(mp)
+
     try:
         os.mkdir(run_folder)
     except FileExistsError:
@@ -75,34 +124,16 @@ def build_model(mp: ModelParameters) -> None:
         filename=mp.parent_folder / "model_build_log.txt",
         format=f"%(asctime)s [{mp.run_number}] - %(message)s",
         level=logging.DEBUG,
+        force=True,
     )
     logger = logging.getLogger("r-loop_grammar")
 
     logger.info(dataclasses.asdict(mp))
     logger.info(f"Extracting critical regions.")
 
-    if mp.seed_file:
-        with open(mp.seed_file, "rb") as seed_file_handle:
-            seed_bytes = seed_file_handle.read()
-    else:
-        seed_bytes = os.urandom(32)
-
-    int.from_bytes(seed_bytes, "little")
-    seed = seed_bytes
+    seed, seed_filename = write_seed(mp, run_folder)
     random.seed(seed)
 
-    seed_filename = str(
-        run_folder
-        / f"{mp.plasmid.name}_p{mp.padding_length}_w{mp.window_length}_{mp.run_number}_SEED.b"
-    )
-
-    with open(seed_filename, "wb") as seed_file:
-        seed_file.write(seed)
-
-    bed_extra_filename = str(
-        run_folder
-        / f"{mp.plasmid.name}_p{mp.padding_length}_w{mp.window_length}_{mp.run_number}.bed_extra.bed"
-    )
     weight_xlsx_filename = str(
         run_folder
         / f"{mp.plasmid.name}_p{mp.padding_length}_w{mp.window_length}_{mp.run_number}_weight.xlsx"
@@ -131,6 +162,10 @@ def build_model(mp: ModelParameters) -> None:
         run_folder
         / f"{mp.plasmid.name}_SHANNON_p{mp.padding_length}_w{mp.window_length}_{mp.run_number}_probabilities.json"
     )
+    statistics_filename = str(
+        run_folder
+        / f"{mp.plasmid.name}_p{mp.padding_length}_w{mp.window_length}_{mp.run_number}{model_update.STATISTICS_SUFFIX}"
+    )
 
     with open(mp.plasmid.bed_file, "r") as bed_file_fd:
         bed_file_length = len(bed_file_fd.readlines())
@@ -138,82 +173,428 @@ def build_model(mp: ModelParameters) -> None:
     training_set_size = math.ceil(bed_file_length * (mp.training_set_percent / 100.0))
     logger.info("Training set size: {training_set_size}.")
 
+    cache = StageCache(mp.cache_folder)
+    metrics = stage_metrics.RunMetrics()
+    gene_parameters = dict(
+        gene_start=mp.plasmid.gene_start,
+        gene_end=mp.plasmid.gene_end,
+        window_length=mp.window_length,
+        padding_length=mp.padding_length,
+    )
+
+    def run_stage(stage: Stage, function: Callable[[], Any]) -> None:
+        with metrics.stage(stage.name, stage.inputs) as measured:
+            measured.cached = cache.run(stage, function)
+
+        if measured.cached:
+            logger.info(f"Stage {stage.name} restored from cache.")
+
     if not mp.training_set_file:
+        logger.info("Creating training set.")
+        run_stage(
+            Stage(
+                "training_set",
+                [mp.bed_extra_file],
+                [bed_extra_training_set_filename],
+                dict(seed=seed.hex(), training_set_size=training_set_size),
+                [training_set],
+            ),
+            lambda: training_set.TrainingSet.training_set(
+                str(mp.bed_extra_file),
+                training_set_size,
+                bed_extra_training_set_filename,
+            ),
+        )
+    else:
+        logger.info("Duplicating training set.")
+        with metrics.stage("training_set", [mp.training_set_file]):
+            shutil.copyfile(mp.training_set_file, bed_extra_training_set_filename)
+
+    def extract_weights():
         with SupressOutput():
             region_extractor.RegionsExtractor.extract_regions(
                 mp.plasmid.fasta_file,
-                mp.plasmid.bed_file,
+                bed_extra_training_set_filename,
                 mp.plasmid.gene_start,
                 mp.plasmid.gene_end,
                 window_length=mp.window_length,
+                out_pref=weight_xlsx_filename,
                 num_regions=4,
                 padding=mp.padding_length,
-                bed_extra=True,
-                bed_extra_output=bed_extra_filename,
-                create_weights=False,
+                bed_extra=False,
+                create_weights=True,
             )
 
-        logger.info("Creating training set.")
-        training_set.TrainingSet.training_set(
-            bed_extra_filename, training_set_size, bed_extra_training_set_filename
+    if not mp.weight_file:
+        run_stage(
+            Stage(
+                "weights",
+                [mp.plasmid.fasta_file, bed_extra_training_set_filename],
+                [weight_xlsx_filename],
+                gene_parameters,
+                [region_extractor, bed_intervals, packed_sequence],
+            ),
+            extract_weights,
         )
     else:
-        logger.info("Duplicating training set.")
-        shutil.copyfile(mp.training_set_file, bed_extra_training_set_filename)
-
-    with SupressOutput():
-        region_extractor.RegionsExtractor.extract_regions(
-            mp.plasmid.fasta_file,
-            bed_extra_training_set_filename,
-            mp.plasmid.gene_start,
-            mp.plasmid.gene_end,
-            window_length=mp.window_length,
-            out_pref=weight_xlsx_filename,
-            num_regions=4,
-            padding=mp.padding_length,
-            bed_extra=False,
-            create_weights=True,
-        )
+        logger.info("Duplicating weights.")
+        shutil.copyfile(mp.weight_file, weight_xlsx_filename)
 
     logger.info("Thresholding critical regions.")
 
-    with SupressOutput():
-        region_threshold.RegionsThreshold.extract_regions(
-            weight_xlsx_filename,
-            weight_shannon_entropy_xlsx_filename,
-            True,  # Shannon Entropy
-        )
+    def threshold_weights():
+        with SupressOutput():
+            region_threshold.RegionsThreshold.extract_regions(
+                weight_xlsx_filename,
+                weight_shannon_entropy_xlsx_filename,
+                True,  # Shannon Entropy
+            )
+
+    run_stage(
+        Stage(
+            "threshold",
+            [weight_xlsx_filename],
+            [weight_shannon_entropy_xlsx_filename],
+            dict(shannon_entropy=True),
+            [region_threshold],
+        ),
+        threshold_weights,
+    )
 
     logger.info("Creating dictionary.")
 
-    with SupressOutput():
-        grammar_dict.GrammarDict.extract_regions(
-            mp.plasmid.fasta_file,
-            bed_extra_training_set_filename,
-            weight_xlsx_filename,
-            mp.plasmid.gene_start,
-            mp.plasmid.gene_end,
-            mp.window_length,
-            weight_shannon_entropy_xlsx_filename,
-            dict_shannon_xlsx_filename,
-        )
+    def create_dictionary():
+        with SupressOutput():
+            table = grammar_dict.GrammarDict.extract_regions(
+                mp.plasmid.fasta_file,
+                bed_extra_training_set_filename,
+                weight_xlsx_filename,
+                mp.plasmid.gene_start,
+                mp.plasmid.gene_end,
+                mp.window_length,
+                weight_shannon_entropy_xlsx_filename,
+                dict_shannon_xlsx_filename,
+            )
+
+        metrics.count(grammar_dict.GrammarDict.resolution_counts(table))
+
+    run_stage(
+        Stage(
+            "dictionary",
+            [
+                mp.plasmid.fasta_file,
+                bed_extra_training_set_filename,
+                weight_xlsx_filename,
+                weight_shannon_entropy_xlsx_filename,
+            ],
+            [dict_shannon_xlsx_filename, dict_shannon_json_filename],
+            gene_parameters,
+            [grammar_dict, rloop_blocks, bed_intervals, packed_sequence],
+        ),
+        create_dictionary,
+    )
 
     logger.info("Extracting training set words.")
 
-    with SupressOutput():
-        grammar_word.GrammarWord.extract_word(
+    def extract_words():
+        with SupressOutput():
+            grammar_word.GrammarWord.extract_word(
+                mp.plasmid.fasta_file,
+                bed_extra_training_set_filename,
+                dict_shannon_json_filename,
+                mp.plasmid.gene_start,
+                mp.plasmid.gene_end,
+                mp.window_length,
+                training_set_words_filename,
+            )
+
+    run_stage(
+        Stage(
+            "words",
+            [
+                mp.plasmid.fasta_file,
+                bed_extra_training_set_filename,
+                dict_shannon_json_filename,
+            ],
+            [training_set_words_filename],
+            gene_parameters,
+            [grammar_word, rloop_blocks, bed_intervals, packed_sequence],
+        ),
+        extract_words,
+    )
+
+    logger.info("Finding probabilities.")
+    run_stage(
+        Stage(
+            "probabilities",
+            [training_set_words_filename],
+            [probabilities_filename],
+            dict(window_length=mp.window_length),
+            [grammar_training],
+        ),
+        lambda: grammar_training.GrammarTraining.find_probabilities(
+            training_set_words_filename, mp.window_length, probabilities_filename
+        ),
+    )
+
+    # Read by update_model instead of the training set
+    logger.info("Counting training set statistics.")
+    run_stage(
+        Stage(
+            "statistics",
+            [mp.plasmid.fasta_file, bed_extra_training_set_filename],
+            [statistics_filename],
+            gene_parameters,
+            [
+                model_update,
+                bootstrap_ensemble,
+                region_extractor,
+                grammar_dict,
+                rloop_blocks,
+                bed_intervals,
+                packed_sequence,
+            ],
+        ),
+        lambda: model_update.ModelUpdate.write_statistics(
+            model_update.ModelUpdate.model_statistics(
+                mp.plasmid.fasta_file,
+                bed_extra_training_set_filename,
+                mp.plasmid.gene_start,
+                mp.plasmid.gene_end,
+                mp.window_length,
+                mp.padding_length,
+            ),
+            statistics_filename,
+        ),
+    )
+
+    run_metadata = dict(
+        kind="model",
+        plasmid=mp.plasmid.name,
+        window_length=mp.window_length,
+        padding_length=mp.padding_length,
+        run=mp.run_number,
+        training_set_percent=mp.training_set_percent,
+    )
+    run_files = dict(
+        dictionary=dict_shannon_json_filename,
+        probabilities=probabilities_filename,
+        thresholds=weight_shannon_entropy_xlsx_filename,
+        training_set=bed_extra_training_set_filename,
+        statistics=statistics_filename,
+        seed=seed_filename,
+    )
+
+    logger.info("Bundling model.")
+    with metrics.stage("bundle", run_files.values()):
+        model_bundle.bundle_run(run_folder, run_metadata, run_files)
+
+    metrics.write(run_folder / stage_metrics.RUN_METRICS_FILENAME)
+
+    run_record = manifest.complete_run(
+        run_folder,
+        mp.run_number,
+        run_metadata,
+        dict(
+            run_files,
+            bundle=run_folder / model_bundle.BUNDLE_FILENAME,
+            metrics=run_folder / stage_metrics.RUN_METRICS_FILENAME,
+        ),
+    )
+    logger.info("Run complete.")
+
+    return run_record
+
+
+def build_bootstrap_models(runs: List[ModelParameters]) -> List[manifest.RunRecord]:
+    """Build runs of a collection from bootstrap replicates of its R-loops.
+
+    The statistics of the R-loops of the aligned BED file are extracted once,
+    each run draws the multiplicity of every R-loop in its training set and
+    sums their statistics, see BootstrapEnsemble.
+    """
+    mp = runs[0]
+
+    logging.basicConfig(
+        filename=mp.parent_folder / "model_build_log.txt",
+        format="%(asctime)s [bootstrap] - %(message)s",
+        level=logging.DEBUG,
+        force=True,
+    )
+    logger = logging.getLogger("r-loop_grammar")
+
+    # The statistics are shared by the runs, they are measured in the first one
+    metrics = stage_metrics.RunMetrics()
+
+    logger.info("Extracting R-loop statistics.")
+    with metrics.stage("statistics", [mp.plasmid.fasta_file, mp.bed_extra_file]):
+        statistics = bootstrap_ensemble.BootstrapEnsemble.rloop_statistics(
             mp.plasmid.fasta_file,
-            bed_extra_training_set_filename,
-            dict_shannon_json_filename,
+            str(mp.bed_extra_file),
             mp.plasmid.gene_start,
             mp.plasmid.gene_end,
             mp.window_length,
-            training_set_words_filename,
+            mp.padding_length,
         )
+        metrics.count({"rloops": len(statistics.bed_lines), "runs": len(runs)})
 
-    logger.info("Finding probabilities.")
-    grammar_training.GrammarTraining.find_probabilities(
-        training_set_words_filename, mp.window_length, probabilities_filename
+    rloops_count = len(statistics.bed_lines)
+    run_records = []
+
+    for mp in runs:
+        run_folder = get_run_folder(mp)
+
+        try:
+            os.mkdir(run_folder)
+        except FileExistsError:
+            pass
+
+        logger.info(dataclasses.asdict(mp))
+
+        run_prefix = str(
+            run_folder
+            / f"{mp.plasmid.name}_p{mp.padding_length}_w{mp.window_length}_{mp.run_number}"
+        )
+        probabilities_filename = str(
+            run_folder
+            / f"{mp.plasmid.name}_SHANNON_p{mp.padding_length}_w{mp.window_length}_{mp.run_number}_probabilities.json"
+        )
+
+        # The training set of a replicate is drawn from the seed of its run, as
+        # the training sets of the other runs
+        seed, seed_filename = write_seed(mp, run_folder)
+        training_set_size = math.ceil(rloops_count * (mp.training_set_percent / 100.0))
+        weights = bootstrap_ensemble.BootstrapEnsemble.resampling_weights(
+            rloops_count,
+            training_set_size,
+            mp.bootstrap,
+            int.from_bytes(seed, "little"),
+        )
+        logger.info(f"Training set size: {weights.sum()}.")
+
+        with metrics.stage("replicate"):
+            bootstrap_ensemble.BootstrapEnsemble.write_replicate(
+                statistics,
+                weights,
+                run_prefix + ".bed_extra_training-set.bed",
+                run_prefix + "_DICT_SHANNON.xlsx.json",
+                probabilities_filename,
+            )
+            model_update.ModelUpdate.write_statistics(
+                model_update.ModelUpdate.replicate_statistics(statistics, weights),
+                run_prefix + model_update.STATISTICS_SUFFIX,
+            )
+            metrics.count({"rloops": int(weights.sum())})
+
+        run_metadata = dict(
+            kind="bootstrap",
+            plasmid=mp.plasmid.name,
+            window_length=mp.window_length,
+            padding_length=mp.padding_length,
+            run=mp.run_number,
+            training_set_percent=mp.training_set_percent,
+            resampling=mp.bootstrap,
+        )
+        run_files = dict(
+            dictionary=run_prefix + "_DICT_SHANNON.xlsx.json",
+            probabilities=probabilities_filename,
+            training_set=run_prefix + ".bed_extra_training-set.bed",
+            statistics=run_prefix + model_update.STATISTICS_SUFFIX,
+            seed=seed_filename,
+        )
+        with metrics.stage("bundle", run_files.values()):
+            model_bundle.bundle_run(run_folder, run_metadata, run_files)
+
+        metrics.write(run_folder / stage_metrics.RUN_METRICS_FILENAME)
+        metrics = stage_metrics.RunMetrics()
+
+        run_records.append(
+            manifest.complete_run(
+                run_folder,
+                mp.run_number,
+                run_metadata,
+                dict(
+                    run_files,
+                    bundle=run_folder / model_bundle.BUNDLE_FILENAME,
+                    metrics=run_folder / stage_metrics.RUN_METRICS_FILENAME,
+                ),
+            )
+        )
+        logger.info(f"Run {mp.run_number} complete.")
+
+    return run_records
+
+
+def run_cost(mp: ModelParameters) -> float:
+    if mp.training_set_file:
+        return os.path.getsize(mp.training_set_file)
+
+    return os.path.getsize(mp.bed_extra_file) * mp.training_set_percent
+
+
+def bootstrap_cost(runs: List[ModelParameters]) -> float:
+    return os.path.getsize(runs[0].bed_extra_file) * len(runs)
+
+
+def write_model_settings(
+    parent_folder: pathlib.Path,
+    plasmid: Plasmid,
+    window_length: int,
+    padding_length: int,
+    number_of_models: int,
+) -> None:
+    run_config = configparser.ConfigParser()
+    run_config[CONFIG_MODEL_PARAMETER_NAME] = {}
+    run_config[CONFIG_MODEL_PARAMETER_NAME]["Plasmid"] = plasmid.name
+    run_config[CONFIG_MODEL_PARAMETER_NAME]["WindowLength"] = str(window_length)
+    run_config[CONFIG_MODEL_PARAMETER_NAME]["Padding"] = str(padding_length)
+    run_config[CONFIG_MODEL_PARAMETER_NAME]["NumberOfModels"] = str(number_of_models)
+
+    with open(parent_folder / "model_settings.ini", "w") as configfile:
+        run_config.write(configfile)
+
+
+def create_bed_extra(
+    plasmid: Plasmid,
+    window_length: int,
+    padding_length: int,
+    bed_extra_filename: pathlib.Path,
+    cache: StageCache,
+) -> bool:
+    """Align the R-loops of the plasmid once for all the runs of a collection.
+
+    Returns True if the alignment was restored from the cache.
+    """
+
+    def extract_bed_extra():
+        with SupressOutput():
+            region_extractor.RegionsExtractor.extract_regions(
+                plasmid.fasta_file,
+                plasmid.bed_file,
+                plasmid.gene_start,
+                plasmid.gene_end,
+                window_length=window_length,
+                num_regions=4,
+                padding=padding_length,
+                bed_extra=True,
+                bed_extra_output=str(bed_extra_filename),
+                create_weights=False,
+            )
+
+    return cache.run(
+        Stage(
+            "extract",
+            [plasmid.fasta_file, plasmid.bed_file],
+            [bed_extra_filename],
+            dict(
+                gene_start=plasmid.gene_start,
+                gene_end=plasmid.gene_end,
+                window_length=window_length,
+                padding_length=padding_length,
+            ),
+            [region_extractor, bed_intervals],
+        ),
+        extract_bed_extra,
     )
 
 
@@ -230,10 +611,53 @@ parser.add_argument(
     "--duplicate",
     help="Duplicate the seed from another set of runs, this will override the count.",
 )
+parser.add_argument(
+    "--bootstrap",
+    choices=bootstrap_ensemble.RESAMPLING_METHODS,
+    default=None,
+    help="Draw the training sets as bootstrap replicates of the R-loops, "
+    "sharing their statistics between the runs.",
+)
+parser.add_argument(
+    "--cache_folder",
+    type=str,
+    default=None,
+    help="Reuse the outputs of stages whose inputs, parameters and code are unchanged.",
+)
+parser.add_argument(
+    "--resume",
+    action="store_true",
+    help="Reuse the output folders and only run the runs that did not complete.",
+)
+parser.add_argument(
+    "-j",
+    "--processes",
+    type=int,
+    default=None,
+    help="Number of worker processes, sized to the machine by default.",
+)
+parser.add_argument(
+    "--verify",
+    type=float,
+    default=None,
+    metavar="FRACTION",
+    help="Check a fraction of the runs against the reference pipeline.",
+)
+parser.add_argument(
+    "--profile",
+    action="store_true",
+    help="Write cProfile statistics of every stage to the collection profile folder.",
+)
+parser.add_argument(
+    "--profile_memory",
+    action="store_true",
+    help="With --profile, also write tracemalloc snapshots at the end of every stage.",
+)
 
 
 def main() -> None:
     args = parser.parse_args()
+    profiler = profiling.Profiler(args.profile_memory) if args.profile else None
     print(args)
 
     plasmids = read_plasmids(args.ini_file)
@@ -243,36 +667,28 @@ def main() -> None:
     paddings = args.paddings
     model_plasmid_names = [args.plasmid]
     training_set_percent = args.sampling_precent
+    cache_folder = pathlib.Path(args.cache_folder) if args.cache_folder else None
 
     if args.duplicate:
-        duplicate_collection_model_folders = [x[1] for x in os.walk(args.duplicate)][0]
-        number_of_models = len(duplicate_collection_model_folders)
+        duplicate_manifest = manifest.Manifest.load(args.duplicate)
+        duplicate_runs = duplicate_manifest.finished_runs()
+        number_of_models = len(duplicate_runs)
 
-        duplicate_collection_model_folders_sorted = sorted(
-            duplicate_collection_model_folders, key=lambda x: int(x.split("_")[-1])
-        )
-
-        get_model_files = lambda x: next(os.walk(pathlib.Path(args.duplicate) / x))[2]
-        model_files_find = lambda y, z: list(filter(lambda x: y in x, z))[0]
-        duplicate_training_set_instead = False
-
-        try:
-            seed_files = [
-                pathlib.Path(args.duplicate)
-                / x
-                / model_files_find("SEED", get_model_files(x))
-                for x in duplicate_collection_model_folders_sorted
-            ]
+        if all(duplicate_manifest.has_artifact(x, "seed") for x in duplicate_runs):
+            seed_files = [duplicate_manifest.artifact(x, "seed") for x in duplicate_runs]
             get_run_seed_file = lambda x: seed_files[x]
             get_training_set_file = lambda x: None
             print("Copying seed.")
 
-        except IndexError:
+        elif args.bootstrap:
+            parser.error(
+                "--bootstrap redraws the training sets from the seeds of the runs, "
+                f"{args.duplicate} has none."
+            )
+
+        else:
             training_set_files = [
-                pathlib.Path(args.duplicate)
-                / x
-                / model_files_find("bed_extra_training-set.bed", get_model_files(x))
-                for x in duplicate_collection_model_folders_sorted
+                duplicate_manifest.artifact(x, "training_set") for x in duplicate_runs
             ]
             get_run_seed_file = lambda x: None
             get_training_set_file = lambda x: training_set_files[x]
@@ -282,6 +698,11 @@ def main() -> None:
         get_run_seed_file = lambda x: None
         get_training_set_file = lambda x: None
 
+    cache = StageCache(cache_folder)
+    runs: list[ModelParameters] = []
+    collection_parameters: Dict[pathlib.Path, Dict[str, Any]] = {}
+    collection_metrics: Dict[pathlib.Path, stage_metrics.RunMetrics] = {}
+
     model_plasmids: list[Plasmid] = [
         list(filter(lambda x: x.name == k, plasmids))[0] for k in model_plasmid_names
     ]
@@ -295,37 +716,106 @@ def main() -> None:
                 width=window_length,
                 number_of_models=number_of_models,
             )
-            os.mkdir(parent_folder)
-
-            run_config = configparser.ConfigParser()
-            run_config[CONFIG_MODEL_PARAMETER_NAME] = {}
-            run_config[CONFIG_MODEL_PARAMETER_NAME]["Plasmid"] = plasmid.name
-            run_config[CONFIG_MODEL_PARAMETER_NAME]["WindowLength"] = str(window_length)
-            run_config[CONFIG_MODEL_PARAMETER_NAME]["Padding"] = str(padding)
-            run_config[CONFIG_MODEL_PARAMETER_NAME]["NumberOfModels"] = str(
-                number_of_models
+            if not (args.resume and parent_folder.is_dir()):
+                os.mkdir(parent_folder)
+
+            write_model_settings(
+                parent_folder, plasmid, window_length, padding, number_of_models
+            )
+            collection_parameters[parent_folder] = dict(
+                plasmid=plasmid.name,
+                window_length=window_length,
+                padding_length=padding,
+                number_of_models=number_of_models,
+                training_set_percent=training_set_percent,
+                bootstrap=args.bootstrap,
+            )
+
+            bed_extra_file = (
+                parent_folder
+                / f"{plasmid.name}_p{padding}_w{window_length}.bed_extra.bed"
+            )
+            collection_metrics[parent_folder] = stage_metrics.RunMetrics()
+            with profiling.session(profiler, parent_folder), collection_metrics[
+                parent_folder
+            ].stage("extract", [plasmid.fasta_file, plasmid.bed_file]) as measured:
+                measured.cached = create_bed_extra(
+                    plasmid, window_length, padding, bed_extra_file, cache
+                )
+
+            runs.extend(
+                ModelParameters(
+                    parent_folder,
+                    run_number,
+                    plasmid,
+                    window_length,
+                    padding,
+                    training_set_percent,
+                    get_run_seed_file(run_number),
+                    get_training_set_file(run_number),
+                    bed_extra_file,
+                    cache_folder,
+                    bootstrap=args.bootstrap,
+                )
+                for run_number in range(number_of_models)
             )
 
-            with open(parent_folder / "model_settings.ini", "w") as configfile:
-                run_config.write(configfile)
-
-        runs = [
-            ModelParameters(
-                parent_folder,
-                run_number,
-                plasmid,
-                window_length,
-                padding,
-                training_set_percent,
-                get_run_seed_file(run_number),
-                get_training_set_file(run_number),
+    if args.resume:
+        runs = [mp for mp in runs if not is_complete(get_run_folder(mp))]
+        print(f"Resuming {len(runs)} incomplete runs.")
+
+    manifests = [
+        manifest.Manifest.create(
+            parent_folder,
+            "bootstrap" if args.bootstrap else "model",
+            parameters,
+            [
+                (get_run_folder(mp), mp.run_number)
+                for mp in runs
+                if mp.parent_folder == parent_folder
+            ],
+        )
+        for parent_folder, parameters in collection_parameters.items()
+    ]
+
+    if args.bootstrap:
+        collections = [
+            list(collection_runs)
+            for _, collection_runs in itertools.groupby(
+                runs, lambda mp: mp.parent_folder
             )
-            for run_number in range(number_of_models)
-            for padding in paddings
         ]
+        run_tasks(
+            profiling.profiled(
+                build_bootstrap_models, get_bootstrap_collection_folder, profiler
+            ),
+            collections,
+            cost=bootstrap_cost,
+            processes=args.processes,
+            on_result=manifest.recorder(manifests),
+        )
+    else:
+        run_tasks(
+            profiling.profiled(build_model, get_collection_folder, profiler),
+            runs,
+            cost=run_cost,
+            processes=args.processes,
+            on_result=manifest.recorder(manifests),
+        )
+
+    for collection_manifest in manifests:
+        stage_metrics.write_collection_metrics(
+            collection_manifest,
+            collection_metrics[collection_manifest.collection_folder],
+        )
 
-        with multiprocessing.Pool(NUMBER_OF_PROCESSES) as pool:
-            pool.map(build_model, runs)
+    if args.verify and not verify.verify_collections(
+        [collection_manifest.collection_folder for collection_manifest in manifests],
+        plasmids,
+        sample=args.verify,
+        processes=args.processes,
+    ):
+        sys.exit(1)
 
 
 if __name__ == "__main__":
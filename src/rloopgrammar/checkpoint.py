@@ -0,0 +1,53 @@
+import json
+import os
+import pathlib
+
+from typing import *
+
+from rloopgrammar.stage_cache import file_digest
+
+"""
+Completion markers for the run folders of a collection.
+
+A finished run writes a marker listing the checksum of every file in its
+folder. When a collection is resumed, runs without a marker, or whose files no
+longer match it, are scheduled again.
+"""
+
+COMPLETION_MARKER = ".complete.json"
+
+
+def mark_complete(run_folder: pathlib.Path) -> Dict[str, str]:
+    """Write the completion marker of a run folder, returns the checksums."""
+    run_folder = pathlib.Path(run_folder)
+    checksums = {
+        f.name: file_digest(f)
+        for f in sorted(run_folder.iterdir())
+        if f.is_file() and not f.name.startswith(COMPLETION_MARKER)
+    }
+
+    temporary_marker = run_folder / f"{COMPLETION_MARKER}.{os.getpid()}"
+    with open(temporary_marker, "w") as marker:
+        json.dump(checksums, marker, indent=1)
+
+    os.replace(temporary_marker, run_folder / COMPLETION_MARKER)
+
+    return checksums
+
+
+def is_complete(run_folder: pathlib.Path) -> bool:
+    marker_filename = pathlib.Path(run_folder) / COMPLETION_MARKER
+
+    try:
+        with open(marker_filename, "r") as marker:
+            checksums = json.load(marker)
+    except (OSError, ValueError):
+        return False
+
+    for name, checksum in checksums.items():
+        artifact = marker_filename.parent / name
+
+        if not artifact.is_file() or file_digest(artifact) != checksum:
+            return False
+
+    return True
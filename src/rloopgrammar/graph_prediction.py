@@ -1,34 +1,45 @@
-import openpyxl
-import openpyxl.chart
-import glob
 import collections
 import pathlib
-import matplotlib.pyplot as pyplot
 import re
 import argparse
 import sys
-import numpy
-import scipy
-import scipy.stats
 
 from typing import *
 
 import warnings
 
+import rloopgrammar.manifest as manifest
+import rloopgrammar.profiling as profiling
+
 PROGRAM_NAME = pathlib.Path(sys.argv[0]).parts[-1][:-4]
 DESCRIPTION = "Graph a r-loop grammar prediction."
 
 parser = argparse.ArgumentParser(prog=PROGRAM_NAME, description=DESCRIPTION)
 parser.add_argument("prediction_folder")
 parser.add_argument("-n", "--name", type=str, default=None)
+parser.add_argument(
+    "--profile",
+    action="store_true",
+    help="Write cProfile statistics of every stage to the collection profile folder.",
+)
+parser.add_argument(
+    "--profile_memory",
+    action="store_true",
+    help="With --profile, also write tracemalloc snapshots at the end of every stage.",
+)
 
 
 def get_average_probabilities(folder):
-    subfolders = [f for f in pathlib.Path(folder).iterdir() if f.is_dir()]
-    files = []
-
-    for subfolder in subfolders:
-        files.extend(glob.glob(f"{subfolder}/*base_in_loop*.XLSX"))
+    import numpy
+    import openpyxl
+    import scipy.stats
+
+    prediction_manifest = manifest.Manifest.load(folder)
+    files = [
+        prediction_manifest.artifact(run_folder, "base_in_loop")
+        for run_folder in prediction_manifest.finished_runs()
+        if prediction_manifest.has_artifact(run_folder, "base_in_loop")
+    ]
 
     average_probabilities_list = None
 
@@ -69,9 +80,10 @@ def get_average_probabilities(folder):
 
 
 def aggregate_graph(name, prediction_folder, axis) -> None:
-    prediction_probabilities_avg, prediction_intervals = get_average_probabilities(
-        prediction_folder
-    )
+    with profiling.stage("average"):
+        prediction_probabilities_avg, prediction_intervals = (
+            get_average_probabilities(prediction_folder)
+        )
 
     axis.plot(
         list(range(1, len(prediction_probabilities_avg) + 1)),
@@ -131,23 +143,30 @@ def aggregate_graph(name, prediction_folder, axis) -> None:
 
 
 def main():
-    pyplot.rcParams["font.family"] = "Times New Roman"
-
     args = parser.parse_args()
 
+    # matplotlib is only loaded once the arguments are parsed
+    import matplotlib.pyplot as pyplot
+
+    pyplot.rcParams["font.family"] = "Times New Roman"
+    profiler = profiling.Profiler(args.profile_memory) if args.profile else None
+
     prediction_folder = args.prediction_folder
     name = prediction_folder if not args.name else args.name
 
-    fig, axis = pyplot.subplots()
+    with profiling.session(profiler, prediction_folder):
+        fig, axis = pyplot.subplots()
 
-    aggregate_graph(
-        name,
-        prediction_folder,
-        axis,
-    )
+        aggregate_graph(
+            name,
+            prediction_folder,
+            axis,
+        )
+
+        pyplot.subplots_adjust(bottom=0.15)
 
-    pyplot.subplots_adjust(bottom=0.15)
-    fig.savefig(f"{name}.pdf")
+        with profiling.stage("plot"):
+            fig.savefig(f"{name}.pdf")
 
 
 if __name__ == "__main__":
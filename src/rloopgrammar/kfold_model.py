@@ -1,4 +1,3 @@
-import multiprocessing
 import sys
 import os
 import pathlib
@@ -8,21 +7,29 @@ import math
 import random
 import logging
 import argparse
+import itertools
+import json
 import shutil
 
 from typing import *
 
-NUMBER_OF_PROCESSES = 10
-
 import rloopgrammar.model.regions_extractor as region_extractor
 import rloopgrammar.model.regions_threshold as region_threshold
 import rloopgrammar.model.training_set as training_set
 import rloopgrammar.model.grammar_dict as grammar_dict
 import rloopgrammar.model.grammar_word as grammar_word
 import rloopgrammar.model.grammar_training as grammar_training
+import rloopgrammar.model.held_out_likelihood as held_out_likelihood
+import rloopgrammar.model.model_update as model_update
+import rloopgrammar.model_bundle as model_bundle
+import rloopgrammar.manifest as manifest
+import rloopgrammar.profiling as profiling
+import rloopgrammar.stage_metrics as stage_metrics
 
 from rloopgrammar.config_reader import read_plasmids
 from rloopgrammar.config_reader import Plasmid
+from rloopgrammar.scheduler import run_tasks
+from rloopgrammar.checkpoint import is_complete
 
 CONFIG_MODEL_PARAMETER_NAME = "Model Parameters"
 
@@ -57,14 +64,30 @@ class ModelParameters:
     window_length: int
     padding_length: int
     seed_file: pathlib.Path
+    bed_extra_file: pathlib.Path
 
 
-def build_model(mp: ModelParameters) -> None:
-    run_folder = (
+def get_run_folder(mp: ModelParameters) -> pathlib.Path:
+    return (
         mp.parent_folder
         / f"Model_{mp.plasmid.name}_p{mp.padding_length}_w{mp.window_length}_{mp.fold_number}"
     )
 
+
+def get_collection_folder(mp: ModelParameters) -> pathlib.Path:
+    return mp.parent_folder
+
+
+def get_fold_prefix(mp: ModelParameters) -> pathlib.Path:
+    return (
+        get_run_folder(mp)
+        / f"{mp.plasmid.name}_p{mp.padding_length}_w{mp.window_length}_{mp.fold_number}"
+    )
+
+
+def build_model(mp: ModelParameters) -> manifest.RunRecord:
+    run_folder = get_run_folder(mp)
+
     try:
         os.mkdir(run_folder)
     except FileExistsError:
@@ -74,37 +97,22 @@ def build_model(mp: ModelParameters) -> None:
         filename=mp.parent_folder / "model_build_log.txt",
         format=f"%(asctime)s [{mp.fold_number}] - %(message)s",
         level=logging.DEBUG,
+        force=True,
     )
     logger = logging.getLogger("r-loop_grammar")
 
     logger.info(dataclasses.asdict(mp))
-    logger.info(f"Extracting critical regions.")
 
-    with open(mp.seed_file, "rb") as seed_file_handle:
-        seed = seed_file_handle.read()
-
-    random.seed(seed)
-
-    bed_extra_filename = str(
-        run_folder
-        / f"{mp.plasmid.name}_p{mp.padding_length}_w{mp.window_length}_{mp.fold_number}.bed_extra.bed"
-    )
-    weight_xlsx_filename = str(
-        run_folder
-        / f"{mp.plasmid.name}_p{mp.padding_length}_w{mp.window_length}_{mp.fold_number}_weight.xlsx"
+    # Written by create_folds
+    weight_xlsx_filename = str(get_fold_prefix(mp)) + "_weight.xlsx"
+    bed_extra_training_set_filename = (
+        str(get_fold_prefix(mp)) + ".bed_extra_training-set.bed"
     )
+
     weight_shannon_entropy_xlsx_filename = str(
         run_folder
         / f"{mp.plasmid.name}_p{mp.padding_length}_w{mp.window_length}_{mp.fold_number}_weight_shannon.xlsx"
     )
-    bed_extra_training_set_filename = str(
-        run_folder
-        / f"{mp.plasmid.name}_p{mp.padding_length}_w{mp.window_length}_{mp.fold_number}.bed_extra_training-set.bed"
-    )
-    bed_extra_test_set_filename = str(
-        run_folder
-        / f"{mp.plasmid.name}_p{mp.padding_length}_w{mp.window_length}_{mp.fold_number}.bed_extra_test-set.bed"
-    )
     dict_shannon_xlsx_filename = str(
         run_folder
         / f"{mp.plasmid.name}_p{mp.padding_length}_w{mp.window_length}_{mp.fold_number}_DICT_SHANNON.xlsx"
@@ -121,60 +129,17 @@ def build_model(mp: ModelParameters) -> None:
         run_folder
         / f"{mp.plasmid.name}_SHANNON_p{mp.padding_length}_w{mp.window_length}_{mp.fold_number}_probabilities.json"
     )
+    statistics_filename = str(
+        run_folder
+        / f"{mp.plasmid.name}_p{mp.padding_length}_w{mp.window_length}_{mp.fold_number}{model_update.STATISTICS_SUFFIX}"
+    )
 
-    with SupressOutput():
-        region_extractor.RegionsExtractor.extract_regions(
-            mp.plasmid.fasta_file,
-            mp.plasmid.bed_file,
-            mp.plasmid.gene_start,
-            mp.plasmid.gene_end,
-            window_length=mp.window_length,
-            num_regions=4,
-            padding=mp.padding_length,
-            bed_extra=True,
-            bed_extra_output=bed_extra_filename,
-            create_weights=False,
-        )
-
-    logger.info(f"Creating {mp.fold_number} training set.")
-    with open(bed_extra_filename, "r") as fin:
-        lines = fin.readlines()
-
-    random.shuffle(lines)
-
-    test_size = math.ceil(len(lines) * (1 / mp.folds))
-    nfold_test_sets = [
-        lines[i : min(i + test_size, len(lines))]
-        for i in range(0, len(lines), test_size)
-    ]
-
-    nfold_train_sets = [
-        nfold_test_sets[i] for i in range(len(nfold_test_sets)) if i != mp.fold_number
-    ]
-
-    nfold_training_set = sum(nfold_train_sets, [])
-    with open(bed_extra_training_set_filename, "w") as fout:
-        fout.writelines(nfold_training_set)
-    with open(bed_extra_test_set_filename, "w") as fout:
-        fout.writelines(nfold_test_sets[mp.fold_number])
-
-    with SupressOutput():
-        region_extractor.RegionsExtractor.extract_regions(
-            mp.plasmid.fasta_file,
-            bed_extra_training_set_filename,
-            mp.plasmid.gene_start,
-            mp.plasmid.gene_end,
-            window_length=mp.window_length,
-            out_pref=weight_xlsx_filename,
-            num_regions=4,
-            padding=mp.padding_length,
-            bed_extra=False,
-            create_weights=True,
-        )
+    test_set_filename = str(get_fold_prefix(mp)) + ".bed_extra_test-set.bed"
+    metrics = stage_metrics.RunMetrics()
 
     logger.info("Thresholding critical regions.")
 
-    with SupressOutput():
+    with SupressOutput(), metrics.stage("threshold", [weight_xlsx_filename]):
         region_threshold.RegionsThreshold.extract_regions(
             weight_xlsx_filename,
             weight_shannon_entropy_xlsx_filename,
@@ -183,8 +148,11 @@ def build_model(mp: ModelParameters) -> None:
 
     logger.info("Creating dictionary.")
 
-    with SupressOutput():
-        grammar_dict.GrammarDict.extract_regions(
+    with SupressOutput(), metrics.stage(
+        "dictionary",
+        [mp.plasmid.fasta_file, bed_extra_training_set_filename, weight_xlsx_filename],
+    ):
+        table = grammar_dict.GrammarDict.extract_regions(
             mp.plasmid.fasta_file,
             bed_extra_training_set_filename,
             weight_xlsx_filename,
@@ -194,10 +162,13 @@ def build_model(mp: ModelParameters) -> None:
             weight_shannon_entropy_xlsx_filename,
             dict_shannon_xlsx_filename,
         )
+        metrics.count(grammar_dict.GrammarDict.resolution_counts(table))
 
     logger.info("Extracting training set words.")
 
-    with SupressOutput():
+    with SupressOutput(), metrics.stage(
+        "words", [bed_extra_training_set_filename, dict_shannon_json_filename]
+    ):
         grammar_word.GrammarWord.extract_word(
             mp.plasmid.fasta_file,
             bed_extra_training_set_filename,
@@ -209,30 +180,231 @@ def build_model(mp: ModelParameters) -> None:
         )
 
     logger.info("Finding probabilities.")
-    grammar_training.GrammarTraining.find_probabilities(
-        training_set_words_filename, mp.window_length, probabilities_filename
+
+    with metrics.stage("probabilities", [training_set_words_filename]):
+        grammar_training.GrammarTraining.find_probabilities(
+            training_set_words_filename, mp.window_length, probabilities_filename
+        )
+
+    # Read by update_model instead of the training set
+    logger.info("Counting training set statistics.")
+
+    with metrics.stage(
+        "statistics", [mp.plasmid.fasta_file, bed_extra_training_set_filename]
+    ):
+        model_update.ModelUpdate.write_statistics(
+            model_update.ModelUpdate.model_statistics(
+                mp.plasmid.fasta_file,
+                bed_extra_training_set_filename,
+                mp.plasmid.gene_start,
+                mp.plasmid.gene_end,
+                mp.window_length,
+                mp.padding_length,
+            ),
+            statistics_filename,
+        )
+
+    logger.info("Scoring test set.")
+
+    with metrics.stage("held_out", [test_set_filename, probabilities_filename]):
+        summary = held_out_likelihood.HeldOutLikelihood.score(
+            mp.plasmid.fasta_file,
+            test_set_filename,
+            dict_shannon_json_filename,
+            probabilities_filename,
+            mp.plasmid.gene_start,
+            mp.plasmid.gene_end,
+            mp.window_length,
+            str(get_fold_prefix(mp)) + ".bed_extra_test-set_log_likelihood.bed",
+        )
+
+    with open(str(get_fold_prefix(mp)) + "_cross_validation.json", "w") as fout:
+        json.dump({"fold": mp.fold_number, **summary}, fout, indent=4)
+
+    run_metadata = dict(
+        kind="kfold",
+        plasmid=mp.plasmid.name,
+        window_length=mp.window_length,
+        padding_length=mp.padding_length,
+        run=mp.fold_number,
+        folds=mp.folds,
+    )
+    run_files = dict(
+        dictionary=dict_shannon_json_filename,
+        probabilities=probabilities_filename,
+        thresholds=weight_shannon_entropy_xlsx_filename,
+        training_set=bed_extra_training_set_filename,
+        statistics=statistics_filename,
+    )
+
+    with metrics.stage("bundle", run_files.values()):
+        model_bundle.bundle_run(run_folder, run_metadata, run_files)
+
+    metrics.write(run_folder / stage_metrics.RUN_METRICS_FILENAME)
+
+    run_record = manifest.complete_run(
+        run_folder,
+        mp.fold_number,
+        run_metadata,
+        dict(
+            run_files,
+            bundle=run_folder / model_bundle.BUNDLE_FILENAME,
+            test_set=test_set_filename,
+            cross_validation=str(get_fold_prefix(mp)) + "_cross_validation.json",
+            metrics=run_folder / stage_metrics.RUN_METRICS_FILENAME,
+        ),
     )
+    logger.info("Fold complete.")
+
+    return run_record
+
+
+def run_cost(mp: ModelParameters) -> float:
+    return os.path.getsize(mp.bed_extra_file) * (mp.folds - 1) / mp.folds
+
+
+def write_cross_validation(runs: List[ModelParameters]) -> None:
+    """Collect the held-out log-likelihoods of the folds of a collection."""
+    folds = []
+
+    for mp in runs:
+        with open(str(get_fold_prefix(mp)) + "_cross_validation.json", "r") as fin:
+            folds.append(json.load(fin))
+
+    scored = sum(fold["scored"] for fold in folds)
+    total_log_likelihood = sum(fold["total_log_likelihood"] for fold in folds)
+
+    with open(runs[0].parent_folder / "cross_validation.json", "w") as fout:
+        json.dump(
+            {
+                "folds": folds,
+                "rloops": sum(fold["rloops"] for fold in folds),
+                "scored": scored,
+                "total_log_likelihood": total_log_likelihood,
+                "mean_log_likelihood": total_log_likelihood / scored
+                if scored
+                else None,
+            },
+            fout,
+            indent=4,
+        )
+
+
+def create_folds(runs: List[ModelParameters]) -> None:
+    """Split the R-loops of a collection and write the sets and weights of its folds.
+
+    The weights of every fold come from a single count of the windows of all the
+    R-loops, see RegionsExtractor.extract_fold_regions.
+    """
+    mp = runs[0]
+
+    with open(mp.seed_file, "rb") as seed_file_handle:
+        seed = seed_file_handle.read()
+
+    random.seed(seed)
+
+    with open(mp.bed_extra_file, "r") as fin:
+        lines = fin.readlines()
+
+    random.shuffle(lines)
+
+    test_size = math.ceil(len(lines) * (1 / mp.folds))
+    nfold_test_ranges = [
+        (i, min(i + test_size, len(lines))) for i in range(0, len(lines), test_size)
+    ]
+    folds = [nfold_test_ranges[mp.fold_number] for mp in runs]
+
+    for mp, (test_start, test_end) in zip(runs, folds):
+        os.makedirs(get_run_folder(mp), exist_ok=True)
+        fold_prefix = str(get_fold_prefix(mp))
+
+        with open(fold_prefix + ".bed_extra_training-set.bed", "w") as fout:
+            fout.writelines(lines[:test_start] + lines[test_end:])
+        with open(fold_prefix + ".bed_extra_test-set.bed", "w") as fout:
+            fout.writelines(lines[test_start:test_end])
+
+    with SupressOutput():
+        region_extractor.RegionsExtractor.extract_fold_regions(
+            mp.plasmid.fasta_file,
+            lines,
+            mp.plasmid.gene_start,
+            mp.plasmid.gene_end,
+            mp.window_length,
+            mp.padding_length,
+            folds,
+            [str(get_fold_prefix(mp)) + "_weight.xlsx" for mp in runs],
+        )
+
+
+def create_bed_extra(
+    plasmid: Plasmid,
+    window_length: int,
+    padding_length: int,
+    bed_extra_filename: pathlib.Path,
+) -> None:
+    """Align the R-loops of the plasmid once for all the folds of a collection."""
+    with SupressOutput():
+        region_extractor.RegionsExtractor.extract_regions(
+            plasmid.fasta_file,
+            plasmid.bed_file,
+            plasmid.gene_start,
+            plasmid.gene_end,
+            window_length=window_length,
+            num_regions=4,
+            padding=padding_length,
+            bed_extra=True,
+            bed_extra_output=str(bed_extra_filename),
+            create_weights=False,
+        )
 
 
 parser = argparse.ArgumentParser(prog=PROGRAM_NAME, description=DESCRIPTION)
 parser.add_argument("output_folder")
+parser.add_argument("-i", "--ini_file", type=str)
 parser.add_argument("-f", "--folds", type=int, default=3)
 parser.add_argument("-p", "--paddings", type=int, nargs="+", default=[13])
 parser.add_argument("-w", "--width", type=int, default=4)
 parser.add_argument("--plasmids", type=str, nargs="+")
+parser.add_argument(
+    "--resume",
+    action="store_true",
+    help="Reuse the output folders and only run the folds that did not complete.",
+)
+parser.add_argument(
+    "-j",
+    "--processes",
+    type=int,
+    default=None,
+    help="Number of worker processes, sized to the machine by default.",
+)
+parser.add_argument(
+    "--profile",
+    action="store_true",
+    help="Write cProfile statistics of every stage to the collection profile folder.",
+)
+parser.add_argument(
+    "--profile_memory",
+    action="store_true",
+    help="With --profile, also write tracemalloc snapshots at the end of every stage.",
+)
 
 
 def main() -> None:
     args = parser.parse_args()
+    profiler = profiling.Profiler(args.profile_memory) if args.profile else None
     print(args)
 
-    plasmids = read_plasmids()
+    plasmids = read_plasmids(args.ini_file)
 
     window_length = args.width
     number_of_folds = args.folds
     paddings = args.paddings
     model_plasmid_names = args.plasmids
 
+    runs: list[ModelParameters] = []
+    collection_parameters: Dict[pathlib.Path, Dict[str, Any]] = {}
+    collection_metrics: Dict[pathlib.Path, stage_metrics.RunMetrics] = {}
+
     model_plasmids: list[Plasmid] = [
         list(filter(lambda x: x.name == k, plasmids))[0] for k in model_plasmid_names
     ]
@@ -246,11 +418,14 @@ def main() -> None:
                 width=window_length,
                 number_of_folds=number_of_folds,
             )
-            os.mkdir(parent_folder)
+            if not (args.resume and parent_folder.is_dir()):
+                os.mkdir(parent_folder)
 
-            random_seed = os.urandom(32)
-            with open(parent_folder / "random_seed", "wb") as seedfile:
-                seedfile.write(random_seed)
+            # Resumed folds must partition the R-loops like the completed ones
+            if not (args.resume and (parent_folder / "random_seed").is_file()):
+                random_seed = os.urandom(32)
+                with open(parent_folder / "random_seed", "wb") as seedfile:
+                    seedfile.write(random_seed)
 
             run_config = configparser.ConfigParser()
             run_config[CONFIG_MODEL_PARAMETER_NAME] = {}
@@ -264,22 +439,83 @@ def main() -> None:
             with open(parent_folder / "model_settings.ini", "w") as configfile:
                 run_config.write(configfile)
 
-        runs = [
-            ModelParameters(
-                parent_folder,
-                number_of_folds,
-                fold_number,
-                plasmid,
-                window_length,
-                padding,
-                parent_folder / "random_seed",
+            collection_parameters[parent_folder] = dict(
+                plasmid=plasmid.name,
+                window_length=window_length,
+                padding_length=padding,
+                number_of_folds=number_of_folds,
+            )
+
+            bed_extra_file = (
+                parent_folder
+                / f"{plasmid.name}_p{padding}_w{window_length}.bed_extra.bed"
+            )
+            collection_metrics[parent_folder] = stage_metrics.RunMetrics()
+            with profiling.session(profiler, parent_folder), collection_metrics[
+                parent_folder
+            ].stage("extract", [plasmid.fasta_file, plasmid.bed_file]):
+                create_bed_extra(plasmid, window_length, padding, bed_extra_file)
+
+            runs.extend(
+                ModelParameters(
+                    parent_folder,
+                    number_of_folds,
+                    fold_number,
+                    plasmid,
+                    window_length,
+                    padding,
+                    parent_folder / "random_seed",
+                    bed_extra_file,
+                )
+                for fold_number in range(number_of_folds)
             )
-            for fold_number in range(number_of_folds)
-            for padding in paddings
-        ]
 
-        with multiprocessing.Pool(NUMBER_OF_PROCESSES) as pool:
-            pool.map(build_model, runs)
+    all_runs = runs
+
+    if args.resume:
+        runs = [mp for mp in runs if not is_complete(get_run_folder(mp))]
+        print(f"Resuming {len(runs)} incomplete folds.")
+
+    for parent_folder, collection_runs in itertools.groupby(
+        runs, lambda mp: mp.parent_folder
+    ):
+        with profiling.session(profiler, parent_folder), collection_metrics[
+            parent_folder
+        ].stage("folds"):
+            create_folds(list(collection_runs))
+
+    manifests = [
+        manifest.Manifest.create(
+            parent_folder,
+            "kfold",
+            parameters,
+            [
+                (get_run_folder(mp), mp.fold_number)
+                for mp in runs
+                if mp.parent_folder == parent_folder
+            ],
+        )
+        for parent_folder, parameters in collection_parameters.items()
+    ]
+
+    run_tasks(
+        profiling.profiled(build_model, get_collection_folder, profiler),
+        runs,
+        cost=run_cost,
+        processes=args.processes,
+        on_result=manifest.recorder(manifests),
+    )
+
+    for _, collection_runs in itertools.groupby(
+        all_runs, lambda mp: mp.parent_folder
+    ):
+        write_cross_validation(list(collection_runs))
+
+    for collection_manifest in manifests:
+        stage_metrics.write_collection_metrics(
+            collection_manifest,
+            collection_metrics[collection_manifest.collection_folder],
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,239 @@
+import dataclasses
+import json
+import os
+import pathlib
+
+from typing import *
+
+from rloopgrammar.checkpoint import mark_complete
+from rloopgrammar.stage_cache import file_digest
+
+"""
+Manifest of the runs of a collection.
+
+The manifest lists every run of a collection folder with its parameters, its
+artifacts by role, their checksums and the status of the run. Workers describe
+the runs they complete, and the parent process records them in the manifest as
+they finish, replacing the file atomically, so tools find the runs and files of
+a collection without listing its folders.
+"""
+
+MANIFEST_FILENAME = "manifest.json"
+MANIFEST_FORMAT_VERSION = 1
+
+RUN_PENDING = "pending"
+RUN_COMPLETE = "complete"
+RUN_UNVERIFIED = "unverified"  # found in a collection built before manifests
+
+# Artifacts of the runs of a collection built before manifests, by role
+LEGACY_ARTIFACT_SUFFIXES = {
+    "bundle": "model.rlgb",
+    "seed": "_SEED.b",
+    "training_set": ".bed_extra_training-set.bed",
+    "base_in_loop": "_base_in_loop.XLSX",
+}
+
+
+def run_number(folder_name: str) -> Optional[int]:
+    """Number of the run of a folder named NAME_RUN, None for other folders."""
+    _, separator, suffix = folder_name.rpartition("_")
+
+    if separator and suffix.isascii() and suffix.isdigit():
+        return int(suffix)
+
+    return None
+
+
+@dataclasses.dataclass
+class RunRecord:
+    collection_folder: pathlib.Path
+    folder: str
+    run: int
+    parameters: Dict[str, Any]
+    artifacts: Dict[str, str]  # paths relative to the run folder
+    checksums: Dict[str, str]
+    status: str = RUN_COMPLETE
+
+
+def complete_run(
+    run_folder: pathlib.Path,
+    run: int,
+    parameters: Dict[str, Any],
+    artifacts: Dict[str, Any],
+) -> RunRecord:
+    """Mark a run folder complete, and describe the run for its manifest."""
+    run_folder = pathlib.Path(run_folder)
+    checksums = mark_complete(run_folder)
+
+    relative_artifacts = {
+        role: os.path.relpath(filename, run_folder)
+        for role, filename in artifacts.items()
+    }
+
+    return RunRecord(
+        run_folder.parent,
+        run_folder.name,
+        run,
+        parameters,
+        relative_artifacts,
+        {
+            role: checksums.get(filename) or file_digest(run_folder / filename)
+            for role, filename in relative_artifacts.items()
+        },
+    )
+
+
+class Manifest:
+    def __init__(
+        self,
+        collection_folder: pathlib.Path,
+        kind: str,
+        parameters: Dict[str, Any],
+        runs: Optional[Dict[str, Dict[str, Any]]] = None,
+    ):
+        self.collection_folder = pathlib.Path(collection_folder)
+        self.kind = kind
+        self.parameters = parameters
+        self.runs: Dict[str, Dict[str, Any]] = runs if runs is not None else {}
+
+    @classmethod
+    def create(
+        cls,
+        collection_folder: pathlib.Path,
+        kind: str,
+        parameters: Dict[str, Any],
+        scheduled: Iterable[Tuple[pathlib.Path, int]],
+    ) -> "Manifest":
+        """Manifest of a collection about to run the scheduled run folders.
+
+        The runs a resumed collection already completed are kept.
+        """
+        manifest_filename = pathlib.Path(collection_folder) / MANIFEST_FILENAME
+
+        if manifest_filename.is_file():
+            manifest = cls.load(collection_folder)
+            manifest.kind = kind
+            manifest.parameters = parameters
+        else:
+            manifest = cls(collection_folder, kind, parameters)
+
+        for run_folder, run in scheduled:
+            manifest.runs[pathlib.Path(run_folder).name] = {
+                "run": run,
+                "status": RUN_PENDING,
+                "parameters": {},
+                "artifacts": {},
+                "checksums": {},
+            }
+
+        manifest.write()
+        return manifest
+
+    @classmethod
+    def load(cls, collection_folder: pathlib.Path) -> "Manifest":
+        collection_folder = pathlib.Path(collection_folder)
+
+        try:
+            with open(collection_folder / MANIFEST_FILENAME, "r") as fin:
+                description = json.load(fin)
+        except FileNotFoundError:
+            return cls.scan(collection_folder)
+
+        return cls(
+            collection_folder,
+            description["kind"],
+            description["parameters"],
+            description["runs"],
+        )
+
+    @classmethod
+    def scan(cls, collection_folder: pathlib.Path) -> "Manifest":
+        """Manifest of a collection built before manifests, from its folders."""
+        runs = dict()
+
+        for run_folder in collection_folder.iterdir():
+            # Other folders, such as profile/, are not runs
+            if not run_folder.is_dir() or run_number(run_folder.name) is None:
+                continue
+
+            run_files = sorted(f.name for f in run_folder.iterdir())
+            artifacts = dict()
+
+            for role, suffix in LEGACY_ARTIFACT_SUFFIXES.items():
+                matches = [name for name in run_files if name.endswith(suffix)]
+
+                if matches:
+                    artifacts[role] = matches[0]
+
+            runs[run_folder.name] = {
+                "run": run_number(run_folder.name),
+                "status": RUN_UNVERIFIED,
+                "parameters": {},
+                "artifacts": artifacts,
+                "checksums": {},
+            }
+
+        return cls(collection_folder, "legacy", {}, runs)
+
+    def write(self) -> None:
+        description = {
+            "version": MANIFEST_FORMAT_VERSION,
+            "kind": self.kind,
+            "parameters": self.parameters,
+            "runs": dict(sorted(self.runs.items(), key=lambda x: x[1]["run"])),
+        }
+
+        temporary_filename = (
+            self.collection_folder / f"{MANIFEST_FILENAME}.{os.getpid()}"
+        )
+        with open(temporary_filename, "w") as fout:
+            json.dump(description, fout, indent=1, default=str)
+
+        os.replace(temporary_filename, self.collection_folder / MANIFEST_FILENAME)
+
+    def record(self, record: RunRecord) -> None:
+        self.runs[record.folder] = {
+            "run": record.run,
+            "status": record.status,
+            "parameters": record.parameters,
+            "artifacts": record.artifacts,
+            "checksums": record.checksums,
+        }
+        self.write()
+
+    def finished_runs(self) -> List[str]:
+        """Folders of the runs that finished, by run number."""
+        return [
+            folder
+            for folder, entry in sorted(self.runs.items(), key=lambda x: x[1]["run"])
+            if entry["status"] != RUN_PENDING
+        ]
+
+    def run_number(self, folder: str) -> int:
+        return self.runs[folder]["run"]
+
+    def run_folder(self, folder: str) -> pathlib.Path:
+        return self.collection_folder / folder
+
+    def artifact(self, folder: str, role: str) -> pathlib.Path:
+        return self.collection_folder / folder / self.runs[folder]["artifacts"][role]
+
+    def has_artifact(self, folder: str, role: str) -> bool:
+        return role in self.runs[folder]["artifacts"]
+
+
+def recorder(manifests: Iterable[Manifest]) -> Callable[[Any], None]:
+    """Record the run records returned by the workers in their manifests.
+
+    Workers return a record, or a list of records when they complete several
+    runs.
+    """
+    by_folder = {manifest.collection_folder: manifest for manifest in manifests}
+
+    def record(result: Any) -> None:
+        records = result if isinstance(result, list) else [result]
+
+        for run_record in records:
+            by_folder[run_record.collection_folder].record(run_record)
+
+    return record
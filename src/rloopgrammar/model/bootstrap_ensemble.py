@@ -0,0 +1,559 @@
+#!/usr/bin/env python3
+import argparse
+import collections
+import dataclasses
+import json
+import os
+
+from typing import Dict, List, Tuple
+
+from rloopgrammar.model.bed_intervals import BedIntervals
+from rloopgrammar.model.grammar_dict import GrammarDict
+from rloopgrammar.model.grammar_training import GrammarTraining, smoothing_parameter
+from rloopgrammar.model.held_out_likelihood import DEFAULT_SYMBOLS
+from rloopgrammar.model.packed_sequence import PackedSequence
+from rloopgrammar.model.regions_extractor import RegionsExtractor
+from rloopgrammar.model.regions_threshold import RegionsThreshold
+from rloopgrammar.model.rloop_blocks import RLoopBlocks
+
+"""
+Script to build bootstrap replicates of a grammar from one aligned BED file.
+
+The windows, parsing blocks and transitions of every R-loop are extracted once.
+A replicate draws how many times each R-loop is in its training set, and its
+weights, dictionary and probabilities are computed from sums of the statistics
+of the R-loops weighted by these multiplicities, as the model pipeline would
+compute them from the training set file.
+"""
+
+# Count of a transition depending on the part of the word it is read in, the
+# last symbol read in each part uses the second table, see GrammarTraining
+TRANSITION_COUNTS = {
+    "region4": (
+        {
+            "SIGMA": "S_sigma_S",
+            "SIGMA^": "S_sigma_hat_S",
+            "GAMMA": "S_gamma_S",
+            "DELTA": "S_delta_S",
+        },
+        {
+            "SIGMA": "S_sigma_alpha_R",
+            "SIGMA^": "S_sigma_hat_alpha_R",
+            "GAMMA": "S_gamma_alpha_R",
+            "DELTA": "S_delta_alpha_R",
+        },
+    ),
+    "region2_3": (
+        {
+            "TAU": "R_tau_R",
+            "TAU^": "R_tau_hat_R",
+            "RHO": "R_rho_R",
+            "BETA": "R_beta_R",
+        },
+        {
+            "TAU": "R_tau_omega_Q",
+            "TAU^": "R_tau_hat_omega_Q",
+            "RHO": "R_rho_omega_Q",
+            "BETA": "R_beta_omega_Q",
+        },
+    ),
+    "region1": (
+        {
+            "SIGMA": "Q_sigma_Q",
+            "SIGMA^": "Q_sigma_hat_Q",
+            "GAMMA": "Q_gamma_Q",
+            "DELTA": "Q_delta_Q",
+        },
+        {
+            "SIGMA": "Q_sigma_end",
+            "SIGMA^": "Q_sigma_hat_end",
+            "GAMMA": "Q_gamma_end",
+            "DELTA": "Q_delta_end",
+        },
+    ),
+}
+
+RESAMPLING_METHODS = ("multinomial", "poisson")
+
+
+class Occurrences:
+    """Occurrences of keys in the R-loops of a BED file, in reading order."""
+
+    def __init__(self):
+        self.names = list()
+        self.__columns = dict()
+        self.__rows = list()
+        self.__keys = list()
+
+    def add(self, row, keys):
+        for key in keys:
+            if key not in self.__columns:
+                self.__columns[key] = len(self.names)
+                self.names.append(key)
+
+            self.__rows.append(row)
+            self.__keys.append(self.__columns[key])
+
+    def freeze(self):
+        import numpy as np
+
+        self.__rows = np.array(self.__rows, dtype=np.int64)
+        self.__keys = np.array(self.__keys, dtype=np.int64)
+
+    # Occurrences of every key in the training set holding each R-loop as many
+    # times as its weight
+    def counts(self, weights):
+        import numpy as np
+
+        counts = np.bincount(
+            self.__keys, weights=weights[self.__rows], minlength=len(self.names)
+        )
+
+        return counts.astype(np.int64)
+
+    # Keys of the training set, in the order they are first read
+    def first_seen(self, weights):
+        import numpy as np
+
+        keys = self.__keys[weights[self.__rows] > 0]
+        _, first = np.unique(keys, return_index=True)
+
+        return [self.names[k] for k in keys[np.sort(first)]]
+
+
+@dataclasses.dataclass
+class RLoopStatistics:
+    bed_lines: List[str]
+    coordinates: List[Tuple[int, int]]
+    window_length: int
+    gene_count: object  # occurrences of a window in the gene
+    windows: List[Occurrences]  # regions 1-4 of RegionsExtractor
+    blocks: Dict[str, Occurrences]  # parsing blocks, by block key
+    transitions: Dict[Tuple[str, str], Occurrences]  # by region, inner or last
+
+
+class BootstrapEnsemble:
+    @classmethod
+    def __transition_blocks(cls, blocks, window_length):
+        # Parsing blocks of the word of the R-loop read by each transition of
+        # GrammarTraining, short blocks carry no symbol
+        def full(values):
+            return [val for val in values if len(val) == window_length]
+
+        r1 = list(blocks.r1())
+        r2 = list(blocks.r2_rev())
+        r3 = list(blocks.r3_rev())
+
+        # A short block next to the R-loop is read as the alpha terminal symbol
+        # alone, so the transition to R is read on the block before it
+        if r3 and len(r3[-1]) != window_length:
+            r3 = r3[:-1]
+
+        return {
+            ("region1", "inner"): full(r1[1:]),
+            ("region1", "last"): full(r1[:1]),
+            ("region2_3", "inner"): full(r2[:-1]),
+            ("region2_3", "last"): full(r2[-1:]),
+            ("region4", "inner"): r3[:-1],
+            ("region4", "last"): r3[-1:],
+        }
+
+    @classmethod
+    def get_args(cls):
+        parser = argparse.ArgumentParser(description="Bootstrap ensemble")
+        parser.add_argument(
+            "-f",
+            "--input-fasta",
+            metavar="FASTA_IN_FILE",
+            type=str,
+            required=True,
+            help="FASTA input file",
+            default=None,
+        )
+        parser.add_argument(
+            "-b",
+            "--input-bed",
+            metavar="BED_IN_FILE",
+            type=str,
+            required=True,
+            help="Aligned BED input file",
+            default=None,
+        )
+        parser.add_argument(
+            "-s",
+            "--start-index",
+            metavar="START_INDEX",
+            type=int,
+            required=True,
+            help="Start index of gene region",
+            default=0,
+        )
+        parser.add_argument(
+            "-e",
+            "--end-index",
+            metavar="END_INDEX",
+            type=int,
+            required=True,
+            help="End index of gene region",
+            default=0,
+        )
+        parser.add_argument(
+            "-w",
+            "--window-length",
+            metavar="WINDOW_LENGTH",
+            type=int,
+            required=False,
+            help="Number of nucleotides in single region",
+            default=5,
+        )
+        parser.add_argument(
+            "-p",
+            "--padding",
+            type=int,
+            required=False,
+            help="Maximum number of nucleotides to be padded for each region",
+            default=0,
+        )
+        parser.add_argument(
+            "-r",
+            "--replicates",
+            type=int,
+            required=False,
+            help="Number of replicates",
+            default=10,
+        )
+        parser.add_argument(
+            "-n",
+            "--sample-size",
+            type=int,
+            required=False,
+            help="R-loops in the training set of a replicate, all of them by default",
+            default=None,
+        )
+        parser.add_argument(
+            "-m",
+            "--method",
+            choices=RESAMPLING_METHODS,
+            required=False,
+            help="Resampling method",
+            default="multinomial",
+        )
+        parser.add_argument(
+            "--seed-file",
+            metavar="SEED_FILE",
+            type=str,
+            required=False,
+            help="Seed of the replicates, written to PREFIX_SEED.b, drawn by default",
+            default=None,
+        )
+        parser.add_argument(
+            "-o",
+            "--prefix-output-files",
+            metavar="PREFIX_OUTPUT_FILES",
+            type=str,
+            required=False,
+            help="Prefix output files (without extension)",
+            default="output",
+        )
+        return parser.parse_args()
+
+    @classmethod
+    def rloop_statistics(
+        cls, fasta_in, bed_in, start_idx, end_idx, window_length=5, padding=0
+    ):
+        with open(fasta_in, "r") as fin:
+            fin.readline()
+            gene_seq = fin.readline().strip().upper()
+
+        gene_seq = PackedSequence(gene_seq[start_idx:end_idx])
+
+        with open(bed_in, "r") as fin:
+            bed_lines = [line.rstrip("\n") + "\n" for line in fin if line.strip()]
+
+        records = BedIntervals.read(bed_lines)
+        unique_rloops, unique_index = records.collapsed()
+
+        rloop_windows, gene_count = RegionsExtractor.extract_rloop_regions(
+            fasta_in, bed_lines, start_idx, end_idx, window_length, padding
+        )
+        statistics = RLoopStatistics(
+            bed_lines,
+            records.coordinates(),
+            window_length,
+            gene_count,
+            [Occurrences() for _ in range(4)],
+            {block_key: Occurrences() for block_key in GrammarDict.BLOCK_REGIONS},
+            {
+                (region, part): Occurrences()
+                for region in TRANSITION_COUNTS
+                for part in ("inner", "last")
+            },
+        )
+
+        # The blocks of duplicate R-loops are read once
+        unique_blocks = list()
+        for idx_1, idx_2 in unique_rloops.coordinates():
+            blocks = RLoopBlocks(
+                gene_seq, idx_1 - start_idx, idx_2 - start_idx, window_length
+            )
+            unique_blocks.append(
+                (
+                    {key: list(blocks.blocks(key)) for key in statistics.blocks},
+                    cls.__transition_blocks(blocks, window_length),
+                )
+            )
+
+        for n, (u, windows) in enumerate(zip(unique_index.tolist(), rloop_windows)):
+            rloop_blocks, rloop_transitions = unique_blocks[u]
+
+            for r, region_windows in enumerate(windows):
+                statistics.windows[r].add(n, region_windows)
+
+            for block_key, occurrences in statistics.blocks.items():
+                occurrences.add(n, rloop_blocks[block_key])
+
+            for key, values in rloop_transitions.items():
+                statistics.transitions[key].add(n, values)
+
+        for occurrences in statistics.windows:
+            occurrences.freeze()
+        for occurrences in statistics.blocks.values():
+            occurrences.freeze()
+        for occurrences in statistics.transitions.values():
+            occurrences.freeze()
+
+        return statistics
+
+    @classmethod
+    def resampling_weights(
+        cls, rloops_count, sample_size, method="multinomial", seed=None
+    ):
+        """Multiplicity of each R-loop in the training set of a replicate.
+
+        Multinomial weights give training sets of exactly sample_size R-loops,
+        Poisson weights draw each R-loop independently with the same mean.
+        """
+        import numpy as np
+
+        rng = np.random.default_rng(seed)
+
+        while True:
+            if method == "poisson":
+                weights = rng.poisson(sample_size / rloops_count, rloops_count)
+            else:
+                weights = rng.multinomial(
+                    sample_size, np.full(rloops_count, 1 / rloops_count)
+                )
+
+            if weights.sum() > 0:
+                return weights
+
+    @classmethod
+    def region_values(cls, window_counts, gene_count, rloops_count):
+        """Weights of the windows of each region, all and above the threshold.
+
+        As RegionsExtractor and RegionsThreshold, from the counts of the windows.
+        Rows of equal weight are kept or cut together, so their order does not
+        change the threshold.
+        """
+        regions_values = list()
+        regions_extra_values = list()
+
+        for counts in window_counts:
+            rows = list()
+
+            for wnd, count in counts.items():
+                if count == 0:
+                    continue
+
+                gene = gene_count(wnd)
+                weight = -1 if gene == 0 else count / (gene * rloops_count)
+                rows.append((wnd, weight))
+
+            rows.sort(key=lambda x: x[1], reverse=True)
+            regions_extra_values.append(dict(rows))
+            regions_values.append(
+                {row[0]: row[1] for row in RegionsThreshold.shannon_rows(rows)}
+            )
+
+        return tuple(regions_values), tuple(regions_extra_values)
+
+    @classmethod
+    def transition_probabilities(cls, grammar_dict, transition_counts, window_length):
+        """Probabilities of the words of the parsing blocks in transition_counts.
+
+        transition_counts are the occurrences of the blocks read by each
+        transition, by region and inner or last part, as GrammarWord and
+        GrammarTraining would count them on the words.
+        """
+        region_counts = dict()
+
+        for region, (inner, last) in TRANSITION_COUNTS.items():
+            symbols = dict()
+            for letter, values in grammar_dict.get(region, dict()).items():
+                for val in values:
+                    symbols.setdefault(val, letter)
+
+            counts = {key: smoothing_parameter for key in inner.values()}
+            counts.update({key: smoothing_parameter for key in last.values()})
+
+            for part, keys in (("inner", inner), ("last", last)):
+                for val, count in transition_counts[region, part].items():
+                    key = keys.get(symbols.get(val, DEFAULT_SYMBOLS[region]))
+
+                    if key is not None:
+                        counts[key] += count
+
+            region_counts[region] = counts
+
+        return GrammarTraining.probabilities(
+            region_counts["region4"],
+            region_counts["region2_3"],
+            region_counts["region1"],
+            window_length,
+        )
+
+    @classmethod
+    def counts(cls, statistics, weights):
+        """Occurrences of the windows, blocks and transitions in a training set.
+
+        The training set holds each R-loop as many times as its weight, keys are
+        in the order they are first read.
+        """
+        import numpy as np
+
+        weights = np.asarray(weights, dtype=np.int64)
+
+        def ordered_counts(occurrences):
+            counts = dict(zip(occurrences.names, occurrences.counts(weights).tolist()))
+            return {key: counts[key] for key in occurrences.first_seen(weights)}
+
+        return (
+            [ordered_counts(windows) for windows in statistics.windows],
+            {
+                block_key: ordered_counts(blocks)
+                for block_key, blocks in statistics.blocks.items()
+            },
+            {
+                key: ordered_counts(transitions)
+                for key, transitions in statistics.transitions.items()
+            },
+        )
+
+    @classmethod
+    def replicate(cls, statistics, weights):
+        """Dictionary and probabilities of the training set given by the weights."""
+        import numpy as np
+
+        window_counts, block_counts, transition_counts = cls.counts(
+            statistics, weights
+        )
+        regions_values, regions_extra_values = cls.region_values(
+            window_counts, statistics.gene_count, int(np.sum(weights))
+        )
+
+        # Occurrences of the tuples of each block, in the order GrammarDict
+        # reads them
+        n_counts = {
+            block_key: collections.Counter(counts)
+            for block_key, counts in block_counts.items()
+        }
+        table = GrammarDict.resolve_tuples(
+            {
+                region: n_counts[block_key]
+                for block_key, region in GrammarDict.BLOCK_REGIONS.items()
+            },
+            regions_values,
+            regions_extra_values,
+            n_counts,
+        )
+
+        rloops = list()
+        for (idx_1, idx_2), weight in zip(statistics.coordinates, weights.tolist()):
+            for _ in range(weight):
+                rloops.append(f"{idx_1}_{idx_2}_{len(rloops) + 1}")
+
+        grammar_dict = GrammarDict.build_grammar_dict(
+            rloops, table, statistics.window_length
+        )
+        probabilities = cls.transition_probabilities(
+            grammar_dict, transition_counts, statistics.window_length
+        )
+
+        return grammar_dict, probabilities
+
+    @classmethod
+    def write_replicate(cls, statistics, weights, bed_out, json_out, probabs_out):
+        grammar_dict, probabilities = cls.replicate(statistics, weights)
+
+        # The training set of the replicate, R-loops in the order of the BED file
+        with open(bed_out, "w") as fout:
+            for line, weight in zip(statistics.bed_lines, weights.tolist()):
+                fout.write(line * weight)
+
+        with open(json_out, "w") as fout:
+            json.dump(grammar_dict, fout)
+
+        GrammarTraining.write_probabilities(probabilities, probabs_out)
+
+    @classmethod
+    def extract_replicates(
+        cls,
+        fasta_in,
+        bed_in,
+        start_idx,
+        end_idx,
+        window_length=5,
+        padding=0,
+        replicates=10,
+        sample_size=None,
+        method="multinomial",
+        out_pref="output",
+        seed_file=None,
+    ):
+        statistics = cls.rloop_statistics(
+            fasta_in, bed_in, start_idx, end_idx, window_length, padding
+        )
+        rloops_count = len(statistics.bed_lines)
+
+        # The replicates are drawn again from the same seed file
+        if seed_file:
+            with open(seed_file, "rb") as fin:
+                seed = fin.read()
+        else:
+            seed = os.urandom(32)
+
+        with open(out_pref + "_SEED.b", "wb") as fout:
+            fout.write(seed)
+
+        for n in range(replicates):
+            weights = cls.resampling_weights(
+                rloops_count,
+                sample_size or rloops_count,
+                method,
+                [int.from_bytes(seed, "little"), n],
+            )
+            cls.write_replicate(
+                statistics,
+                weights,
+                out_pref + "_" + str(n) + ".bed",
+                out_pref + "_" + str(n) + "_DICT.json",
+                out_pref + "_" + str(n) + "_probabilities.json",
+            )
+
+
+if __name__ == "__main__":
+    args = vars(BootstrapEnsemble.get_args())
+    BootstrapEnsemble.extract_replicates(
+        args.get("input_fasta", None),
+        args.get("input_bed", None),
+        args.get("start_index", 0),
+        args.get("end_index", 0),
+        args.get("window_length", 5),
+        args.get("padding", 0),
+        args.get("replicates", 10),
+        args.get("sample_size", None),
+        args.get("method", "multinomial"),
+        args.get("prefix_output_files", "output"),
+        args.get("seed_file", None),
+    )
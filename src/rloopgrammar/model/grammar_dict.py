@@ -1,14 +1,16 @@
 #!/usr/bin/env python3
 import argparse
+import collections
+import dataclasses
+import itertools
 import json
 import random
 
-from Bio import SeqIO
+from typing import Tuple
 
-import openpyxl
-from openpyxl import Workbook
-from openpyxl.cell import WriteOnlyCell
-from openpyxl.styles import Font
+from rloopgrammar.model.bed_intervals import BedIntervals
+from rloopgrammar.model.packed_sequence import PackedSequence
+from rloopgrammar.model.rloop_blocks import RLoopBlocks
 
 """
 Script to generate an R-loop dictionary from a BED file.
@@ -34,6 +36,23 @@ along with GrammarDict.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 
+@dataclasses.dataclass(frozen=True)
+class Location:
+    # W1-W4 for a weight region, N1-N3 for an occurrence count
+    name: str
+    value: float
+
+    def __str__(self):
+        return self.name + "_" + str(self.value)
+
+
+@dataclasses.dataclass(frozen=True)
+class SymbolRecord:
+    block: str
+    locations: Tuple[Location, ...]
+    symbols: Tuple[str, ...]
+
+
 class GrammarDict:
     __alpha = "\u03B1"
     __beta = "\u03B2"
@@ -98,106 +117,116 @@ class GrammarDict:
         "FORCE_GAMMA": __gamma,
     }
 
+    # Dictionary region: symbol mapping, key forced on N ties, pair merged into one
+    REGION_RESOLUTION = {
+        "region1": (GREEK_MAPPING_R1, "FORCE_GAMMA", (__sigma, __sigma_hat), __delta),
+        "region2_3": (GREEK_MAPPING_R2, "FORCE_RHO", (__tau, __tau_hat), __beta),
+        "region4": (GREEK_MAPPING_R3, "FORCE_GAMMA", (__sigma, __sigma_hat), __delta),
+    }
+
+    # Parsing blocks of an R-loop and the region of the dictionary they belong to
+    BLOCK_REGIONS = {"r1": "region1", "r2_rev": "region2_3", "r3_rev": "region4"}
+
     COLS_PER_RLOOP = 9
 
+    # Max R-loops in a sheet of the report, given the max cols allowed by Excel
+    MAX_REPORT_RLOOPS = 1800
+
+    # For finding occurrences of parsing block in the output of RegionExtractor
     @classmethod
-    def __get_order_key(cls, x):
-        if not x:
-            return 0
+    def __find_locations(cls, val, regions_values):
+        locations = [
+            Location("W" + str(n + 1), region_values[val])
+            for n, region_values in enumerate(regions_values)
+            if val in region_values
+        ]
+        # A seq may have the same weight in more regions, keep them in region order
+        locations.sort(key=lambda x: x.value, reverse=True)
 
-        return int(x.split("_")[2])
+        return tuple(locations)
 
+    # For computing N1, N2, N3
     @classmethod
-    def __get_regions(cls, gene_seq, bed_start, bed_end):
-        if not gene_seq:
-            raise AssertionError("Specify a gene sequence")
-        if bed_start > bed_end:
-            raise AssertionError("Start index must be lower or equal than end index")
-        if len(gene_seq) < bed_end:
-            raise AssertionError("End index too large")
+    def __count_occurrences(cls, val, n_counts):
+        locations = [
+            Location("N1", n_counts["r1"][val]),
+            Location("N2", n_counts["r2_rev"][val]),
+            Location("N3", n_counts["r3_rev"][val]),
+        ]
+        locations.sort(key=lambda x: x.value, reverse=True)
 
-        return gene_seq[:bed_start], gene_seq[bed_start:bed_end], gene_seq[bed_end:]
+        return tuple(locations)
 
-    # For finding occurrences of parsing block in the output of RegionExtractor
     @classmethod
-    def __find_locations(
-        cls, val, region1_values, region2_values, region3_values, region4_values, ret
-    ):
-        if val in ret.keys():
-            return ret.get(val, list())
-
-        tmp = (
-            dict()
-        )  # key = weight, value = [W1_..., W2_...] --- a seq may have the same weight in more region
-        if val in region1_values.keys():
-            tmp_key = region1_values.get(val, 0)
-            if tmp_key not in tmp.keys():
-                tmp[tmp_key] = list()
-            tmp[tmp_key].append("W1_" + str(tmp_key))
-        if val in region2_values.keys():
-            tmp_key = region2_values.get(val, 0)
-            if tmp_key not in tmp.keys():
-                tmp[tmp_key] = list()
-            tmp[tmp_key].append("W2_" + str(tmp_key))
-        if val in region3_values.keys():
-            tmp_key = region3_values.get(val, 0)
-            if tmp_key not in tmp.keys():
-                tmp[tmp_key] = list()
-            tmp[tmp_key].append("W3_" + str(tmp_key))
-        if val in region4_values.keys():
-            tmp_key = region4_values.get(val, 0)
-            if tmp_key not in tmp.keys():
-                tmp[tmp_key] = list()
-            tmp[tmp_key].append("W4_" + str(tmp_key))
-
-        sorted_keys = list(tmp.keys())
-        sorted_keys.sort(reverse=True)
-        sorted_values = list()
-
-        for k in sorted_keys:
-            sorted_values.extend(tmp[k])
-
-        ret[val] = sorted_values
-
-        return sorted_values
+    def __get_locations(cls, val, regions_values, n_counts, ret):
+        if val in ret:
+            return ret[val]
+
+        locations = cls.__find_locations(val, regions_values)
+
+        # If val not in "most relevant list"
+        if not locations:
+            locations = cls.__count_occurrences(val, n_counts)
+
+        ret[val] = locations
+
+        return locations
 
-    # For computing N1, N2, N3
     @classmethod
-    def __count_occurrences(cls, val, data, ret):
-        if val in ret.keys():
-            return ret.get(val, list())
+    def __max_location_names(cls, locations):
+        # Collect N/W whose value is the same as the maximum one
+        return [x.name for x in locations if x.value == locations[0].value]
+
+    @classmethod
+    def __resolve_symbols(cls, val, val_locations, regions_extra_values, region):
+        mapping, force_key, pair, merged = cls.REGION_RESOLUTION[region]
+        names = cls.__max_location_names(val_locations)
+
+        # If max is achieved in more than one N-value
+        if len(names) > 1 and any(x.startswith("N") for x in names):
+            extra_locations = cls.__find_locations(val, regions_extra_values)
+
+            if not extra_locations:
+                names = [force_key]
+            else:
+                names = cls.__max_location_names(extra_locations)
+
+        # This can only happen if names has length 1 bc we update it if length > 1
+        if "N2" in names:
+            extra_locations = cls.__find_locations(
+                val, (dict(), regions_extra_values[1], regions_extra_values[2], dict())
+            )
 
-        r1_count = 0
-        r2_count = 0
-        r3_count = 0
+            if extra_locations:
+                names = cls.__max_location_names(extra_locations)
 
-        for v in data.values():
-            r1_count += v.get("r1", list()).count(val)
-            r2_count += v.get("r2_rev", list()).count(val)
-            r3_count += v.get("r3_rev", list()).count(val)
+        symbols = list(dict.fromkeys(mapping.get(x, "?") for x in names))
 
-        tmp = dict()
-        tmp[r1_count] = list()
-        tmp[r1_count].append("N1_" + str(r1_count))
+        if pair[0] in symbols and pair[1] in symbols:
+            symbols.remove(pair[0])
+            symbols.remove(pair[1])
+            symbols.append(merged)
 
-        if r2_count not in tmp.keys():
-            tmp[r2_count] = list()
-        tmp[r2_count].append("N2_" + str(r2_count))
+        return tuple(symbols)
 
-        if r3_count not in tmp.keys():
-            tmp[r3_count] = list()
-        tmp[r3_count].append("N3_" + str(r3_count))
+    @classmethod
+    def __read_weights(cls, xlsx_in):
+        import openpyxl
 
-        sorted_keys = list(tmp.keys())
-        sorted_keys.sort(reverse=True)
-        sorted_values = list()
+        regions_values = [dict(), dict(), dict(), dict()]
+        wb_regions = openpyxl.load_workbook(xlsx_in, read_only=True)
 
-        for k in sorted_keys:
-            sorted_values.extend(tmp[k])
+        for ws_region in wb_regions.worksheets:
+            for n in range(len(regions_values)):
+                if ws_region.title.endswith(str(n + 1)):
+                    regions_values[n] = {
+                        x[0]: x[7] for x in ws_region.iter_rows(values_only=True)
+                    }
+                    break
 
-        ret[val] = sorted_values
+        wb_regions.close()
 
-        return sorted_values
+        return tuple(regions_values)
 
     @classmethod
     def get_args(cls):
@@ -274,103 +303,124 @@ class GrammarDict:
             help="Output XLSX file",
             default="output.xlsx",
         )
+        parser.add_argument(
+            "-n",
+            "--no-report",
+            required=False,
+            action="store_true",
+            help="Only write the JSON dictionary, skip the XLSX report",
+        )
         return parser.parse_args()
 
     @classmethod
-    def extract_regions(
-        cls,
-        fasta_in,
-        bed_in,
-        xlsx_in,
-        start_idx,
-        end_idx,
-        window_length=5,
-        xlsx_threshold_in=None,
-        out_file="output.xlsx",
-    ):
-        max_rloops = 1800
-        res = dict()
-        gene_seq = str(SeqIO.read(fasta_in, 'fasta').seq)
-        gene_seq = gene_seq[start_idx:end_idx]
+    def resolve_tuples(cls, tuples, regions_values, regions_extra_values, n_counts):
+        """Build the resolution table of the tuples of each region of the dictionary.
+
+        The symbols of a tuple depend only on its value and on the weight tables,
+        so every unique tuple is resolved once per region.
+        """
+        table = dict()
+        locations = dict()
 
-        with open(bed_in, "r") as fin:
-            line = fin.readline()
+        for region, region_tuples in tuples.items():
+            table[region] = dict()
 
-            i = 1  # We keep track of the row we are reading in the BED file
-            while line:
-                parts = line.strip().split("\t")
-                idx_1 = int(parts[1])
-                idx_2 = int(parts[2])
+            for val in region_tuples:
+                if val in table[region]:
+                    continue
 
-                r1, r2, r3 = cls.__get_regions(
-                    gene_seq, idx_1 - start_idx, idx_2 - start_idx
+                val_locations = cls.__get_locations(
+                    val, regions_values, n_counts, locations
                 )
-                r1_rev = r1[::-1]
-                r2_rev = r2[::-1]
-                r3_rev = r3[::-1]
-
-                r1_pblocks = [
-                    r1[i : i + window_length] for i in range(0, len(r1), window_length)
-                ]
-                r1_rev_pblocks = [
-                    r1_rev[i : i + window_length][::-1]
-                    for i in range(0, len(r1), window_length)
-                ]
-
-                r2_pblocks = [
-                    r2[i : i + window_length] for i in range(0, len(r2), window_length)
-                ]
-                r2_rev_pblocks = [
-                    r2_rev[i : i + window_length][::-1]
-                    for i in range(0, len(r2), window_length)
-                ]
-
-                # res contains info from all the R-loops in BED file
-                res[str(idx_1) + "_" + str(idx_2) + "_" + str(i)] = {
-                    "r1": [
-                        r1[i : i + window_length]
-                        for i in range(0, len(r1), window_length)
-                    ],
-                    "r1_rev": [
-                        r1_rev[i : i + window_length][::-1]
-                        for i in range(0, len(r1), window_length)
-                    ],
-                    "r2": [
-                        r2[i : i + window_length]
-                        for i in range(0, len(r2), window_length)
-                    ],
-                    "r2_rev": [
-                        r2_rev[i : i + window_length][::-1]
-                        for i in range(0, len(r2), window_length)
-                    ],
-                    "r3": [
-                        r3[i : i + window_length]
-                        for i in range(0, len(r3), window_length)
-                    ],
-                    "r3_rev": [
-                        r3_rev[i : i + window_length][::-1]
-                        for i in range(0, len(r3), window_length)
-                    ],
-                }
-
-                line = fin.readline()
-                i += 1
+                symbols = cls.__resolve_symbols(
+                    val, val_locations, regions_extra_values, region
+                )
+                table[region][val] = SymbolRecord(val, val_locations, symbols)
 
-        wb = Workbook(write_only=True)
-        ws = wb.create_sheet("Grammar Symbols")
+        return table
+
+    @classmethod
+    def resolution_counts(cls, table):
+        """Tuples of a resolution table located by their weights or occurrences."""
+        counts = {"tuples": 0, "resolved_by_weight": 0, "resolved_by_occurrences": 0}
+
+        for region_table in table.values():
+            for record in region_table.values():
+                counts["tuples"] += 1
+
+                if record.locations and record.locations[0].name.startswith("W"):
+                    counts["resolved_by_weight"] += 1
+                elif record.locations:
+                    counts["resolved_by_occurrences"] += 1
+
+        return counts
+
+    @classmethod
+    def build_grammar_dict(cls, rloops, table, window_length):
+        grammar_dict = {"rloops": list(rloops)}
+
+        for region, (mapping, _, _, _) in cls.REGION_RESOLUTION.items():
+            grammar_dict[region] = {
+                cls.GREEK_TO_ASCII.get(z, "???"): list() for z in mapping.values()
+            }
+
+            for val, record in table.get(region, dict()).items():
+                if len(val) != window_length:
+                    continue
+
+                for letter in record.symbols:
+                    ascii_letter = cls.GREEK_TO_ASCII.get(letter, "?")
+                    grammar_dict[region].setdefault(ascii_letter, list()).append(val)
+
+        return grammar_dict
+
+    @classmethod
+    def read_rloops(cls, bed_in, gene_seq, start_idx, window_length):
+        """Yield the key and the parsing blocks of each R-loop in the BED file."""
+        rloops = BedIntervals.read(bed_in).coordinates()
+
+        # We keep track of the row we are reading in the BED file
+        for i, (idx_1, idx_2) in enumerate(rloops, start=1):
+            yield str(idx_1) + "_" + str(idx_2) + "_" + str(i), RLoopBlocks(
+                gene_seq, idx_1 - start_idx, idx_2 - start_idx, window_length
+            )
+
+    @classmethod
+    def __get_symbols_value(cls, block_key, blocks, record, i, window_length):
+        value = ", ".join(record.symbols)
+
+        # The last block before the R-loop carries the omega terminal symbol,
+        # the last block after it carries the alpha terminal symbol
+        if i == blocks.num_blocks(block_key) - 1:
+            if block_key == "r1":
+                if len(record.block) == window_length:
+                    value += cls.__omega + "0"
+                else:
+                    value = cls.__omega + str(len(record.block))
+            elif block_key == "r3_rev":
+                if len(record.block) == window_length:
+                    value = cls.__alpha + "0" + value
+                else:
+                    value = cls.__alpha + str(len(record.block))
+
+        return value
+
+    @classmethod
+    def __write_report_sheet(
+        cls, wb, title, gene_seq, start_idx, end_idx, rloops, table, window_length
+    ):
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font
+
+        ws = wb.create_sheet(title)
         ws.append(("Gene", str(start_idx) + "-" + str(end_idx), gene_seq))
         ws.append(())
         ws.append(("Note: R-loop coordinates are given wrt full plasmid",))
         ws.append(())
 
-        max_cols = max_rloops * cls.COLS_PER_RLOOP  # max_cols: to print only n R-loops
-        sorted_keys = list(
-            res.keys()
-        )  # Need sorted keys bc we iterate on them (if not ordered, result not consistent)
-        sorted_keys.sort(key=cls.__get_order_key)
         header = list()
 
-        for k in sorted_keys:
+        for k, _ in rloops:
             header.extend(
                 (
                     k + "_r1",
@@ -385,546 +435,153 @@ class GrammarDict:
                 )
             )
 
-            if (
-                len(header) >= max_cols
-            ):  # Check we do not have more than max cols allowed by Excel
-                break
-
         ws.append(header)
 
-        wb_region1_values = dict()
-        wb_region2_values = dict()
-        wb_region3_values = dict()
-        wb_region4_values = dict()
-        wb_region1_extra_values = dict()
-        wb_region2_extra_values = dict()
-        wb_region3_extra_values = dict()
-        wb_region4_extra_values = dict()
-
-        if xlsx_threshold_in:
-            wb_regions = openpyxl.load_workbook(xlsx_threshold_in, read_only=True)
-            for ws_region in wb_regions.worksheets:
-                if ws_region.title.endswith("1"):
-                    wb_region1_values = {
-                        x[0].value: x[7].value for x in list(ws_region.rows)
-                    }
-                elif ws_region.title.endswith("2"):
-                    wb_region2_values = {
-                        x[0].value: x[7].value for x in list(ws_region.rows)
-                    }
-                elif ws_region.title.endswith("3"):
-                    wb_region3_values = {
-                        x[0].value: x[7].value for x in list(ws_region.rows)
-                    }
-                elif ws_region.title.endswith("4"):
-                    wb_region4_values = {
-                        x[0].value: x[7].value for x in list(ws_region.rows)
-                    }
-            wb_regions.close()
-
-            wb_regions = openpyxl.load_workbook(xlsx_in, read_only=True)
-            for ws_region in wb_regions.worksheets:
-                if ws_region.title.endswith("1"):
-                    wb_region1_extra_values = {
-                        x[0].value: x[7].value for x in list(ws_region.rows)
-                    }
-                elif ws_region.title.endswith("2"):
-                    wb_region2_extra_values = {
-                        x[0].value: x[7].value for x in list(ws_region.rows)
-                    }
-                elif ws_region.title.endswith("3"):
-                    wb_region3_extra_values = {
-                        x[0].value: x[7].value for x in list(ws_region.rows)
-                    }
-                elif ws_region.title.endswith("4"):
-                    wb_region4_extra_values = {
-                        x[0].value: x[7].value for x in list(ws_region.rows)
-                    }
-            wb_regions.close()
-        else:
-            wb_regions = openpyxl.load_workbook(xlsx_in, read_only=True)
-            for ws_region in wb_regions.worksheets:
-                if ws_region.title.endswith("1"):
-                    wb_region1_values = {
-                        x[0].value: x[7].value for x in list(ws_region.rows)
-                    }
-                elif ws_region.title.endswith("2"):
-                    wb_region2_values = {
-                        x[0].value: x[7].value for x in list(ws_region.rows)
-                    }
-                elif ws_region.title.endswith("3"):
-                    wb_region3_values = {
-                        x[0].value: x[7].value for x in list(ws_region.rows)
-                    }
-                elif ws_region.title.endswith("4"):
-                    wb_region4_values = {
-                        x[0].value: x[7].value for x in list(ws_region.rows)
-                    }
-            wb_regions.close()
-
-        i = 0
-        word_dict = dict()
-        last_cells = dict()
-        row = list()
-        locations = dict()
-        counts = dict()
-
-        grammar_dict = {
-            "rloops": list(res.keys()),
-            "region1": {
-                cls.GREEK_TO_ASCII.get(z, "???"): list()
-                for z in cls.GREEK_MAPPING_R1.values()
-            },
-            "region2_3": {
-                cls.GREEK_TO_ASCII.get(z, "???"): list()
-                for z in cls.GREEK_MAPPING_R2.values()
-            },
-            "region4": {
-                cls.GREEK_TO_ASCII.get(z, "???"): list()
-                for z in cls.GREEK_MAPPING_R3.values()
-            },
-        }
+        fonts = (Font(color="FF0000"), Font(color="000000"))
+        num_rows = max(
+            (
+                blocks.num_blocks(block_key)
+                for _, blocks in rloops
+                for block_key in cls.BLOCK_REGIONS.keys()
+            ),
+            default=0,
+        )
 
-        while len(row) > 0 or i == 0:
-            j = 3
+        # We read one value from r1, r2 and r3 at the same time, but they have
+        # different lengths
+        for i in range(num_rows):
             row = list()
-            use_red_text = False
-
-            # We read one value from r1, r2 and r3 at the same time, but they have different lengths
-            for k in sorted_keys:  # This "for" generates a row in the output XLSX file
-                if not word_dict.get(k, None):
-                    word_dict[k] = {
-                        "r1_funny_letters": list(),
-                        "r2_funny_letters": list(),
-                        "r3_funny_letters": list(),
-                    }
-
-                use_red_text = not use_red_text
-                cell_font = (
-                    Font(color="FF0000") if use_red_text else Font(color="000000")
-                )
-
-                r1_val = res[k]["r1"][i] if len(res[k]["r1"]) > i else None
-
-                r1_val_locations = (
-                    cls.__find_locations(
-                        r1_val,
-                        wb_region1_values,
-                        wb_region2_values,
-                        wb_region3_values,
-                        wb_region4_values,
-                        locations,
-                    )
-                    if r1_val
-                    else None
-                )
-                # If r1_val not in "most relevant list"
-                if (r1_val_locations is None or len(r1_val_locations) < 1) and r1_val:
-                    r1_val_locations = cls.__count_occurrences(r1_val, res, counts)
-
-                r2_val = res[k]["r2_rev"][i] if len(res[k]["r2_rev"]) > i else None
-                r2_val_locations = (
-                    cls.__find_locations(
-                        r2_val,
-                        wb_region1_values,
-                        wb_region2_values,
-                        wb_region3_values,
-                        wb_region4_values,
-                        locations,
-                    )
-                    if r2_val
-                    else None
-                )
-
-                if (r2_val_locations is None or len(r2_val_locations) < 1) and r2_val:
-                    r2_val_locations = cls.__count_occurrences(r2_val, res, counts)
-
-                r3_val = res[k]["r3_rev"][i] if len(res[k]["r3_rev"]) > i else None
-                r3_val_locations = (
-                    cls.__find_locations(
-                        r3_val,
-                        wb_region1_values,
-                        wb_region2_values,
-                        wb_region3_values,
-                        wb_region4_values,
-                        locations,
-                    )
-                    if r3_val
-                    else None
-                )
-
-                if (r3_val_locations is None or len(r3_val_locations) < 1) and r3_val:
-                    r3_val_locations = cls.__count_occurrences(r3_val, res, counts)
-
-                r1_funny_letters = None
-                if r1_val_locations and len(r1_val_locations) > 0:
-                    tmp_val = r1_val_locations[0].split("_")[
-                        1
-                    ]  # take maximum weight/count
-                    # Collect N/W whose value is the same as the maximum one
-                    tmp_keys = [
-                        i.split("_")[0].upper()
-                        for i in r1_val_locations
-                        if i.split("_")[1] == tmp_val
-                    ]
-
-                    # If max is achieved in more than one N-value
-                    if (
-                        len(tmp_keys) > 1
-                        and len([i for i in tmp_keys if i.startswith("N")]) > 0
-                    ):
-                        tmp_locs = cls.__find_locations(
-                            r1_val,
-                            wb_region1_extra_values,
-                            wb_region2_extra_values,
-                            wb_region3_extra_values,
-                            wb_region4_extra_values,
-                            dict(),
-                        )
-                        if len(tmp_locs) == 0:
-                            tmp_keys = ["FORCE_GAMMA"]
-                        else:
-                            tmp_val = tmp_locs[0].split("_")[1]
-                            tmp_keys = [
-                                i.split("_")[0].upper()
-                                for i in tmp_locs
-                                if i.split("_")[1] == tmp_val
-                            ]
-
-                    if (
-                        "N2" in tmp_keys
-                    ):  # This can only happen if tmp_keys has length 1 bc we update it if length > 1
-                        tmp_locs = cls.__find_locations(
-                            r1_val,
-                            dict(),
-                            wb_region2_extra_values,
-                            wb_region3_extra_values,
-                            dict(),
-                            dict(),
-                        )
-                        if len(tmp_locs) > 0:
-                            while "N2" in tmp_keys:
-                                tmp_keys.remove("N2")
-
-                            tmp_val = tmp_locs[0].split("_")[1]
-                            tmp_keys = [
-                                i.split("_")[0].upper()
-                                for i in tmp_locs
-                                if i.split("_")[1] == tmp_val
-                            ]
-
-                    r1_funny_letters = list(
-                        set([cls.GREEK_MAPPING_R1.get(i, "?") for i in set(tmp_keys)])
-                    )
-
-                    if (
-                        cls.__sigma in r1_funny_letters
-                        and cls.__sigma_hat in r1_funny_letters
-                    ):
-                        r1_funny_letters.remove(cls.__sigma)
-                        r1_funny_letters.remove(cls.__sigma_hat)
-                        r1_funny_letters.append(cls.__delta)
-
-                    if len(r1_funny_letters) == 1:
-                        word_dict[k]["r1_funny_letters"].append(r1_funny_letters[0])
-                    else:
-                        word_dict[k]["r1_funny_letters"].append(
-                            "(" + ",".join(r1_funny_letters) + ")"
-                        )
-
-                    x = last_cells.get(k, dict())
-                    x["r1"] = str(j) + "_" + str(i + 6)
-                    last_cells[k] = x
-
-                r2_funny_letters = None
-                if r2_val_locations and len(r2_val_locations) > 0:
-                    tmp_val = r2_val_locations[0].split("_")[1]
-                    tmp_keys = [
-                        i.split("_")[0].upper()
-                        for i in r2_val_locations
-                        if i.split("_")[1] == tmp_val
-                    ]
-
-                    if (
-                        len(tmp_keys) > 1
-                        and len([i for i in tmp_keys if i.startswith("N")]) > 0
-                    ):
-                        tmp_locs = cls.__find_locations(
-                            r2_val,
-                            wb_region1_extra_values,
-                            wb_region2_extra_values,
-                            wb_region3_extra_values,
-                            wb_region4_extra_values,
-                            dict(),
-                        )
-                        if len(tmp_locs) == 0:
-                            tmp_keys = ["FORCE_RHO"]
-                        else:
-                            tmp_val = tmp_locs[0].split("_")[1]
-                            tmp_keys = [
-                                i.split("_")[0].upper()
-                                for i in tmp_locs
-                                if i.split("_")[1] == tmp_val
-                            ]
-
-                    if "N2" in tmp_keys:
-                        tmp_locs = cls.__find_locations(
-                            r2_val,
-                            dict(),
-                            wb_region2_extra_values,
-                            wb_region3_extra_values,
-                            dict(),
-                            dict(),
-                        )
-                        if len(tmp_locs) > 0:
-                            while "N2" in tmp_keys:
-                                tmp_keys.remove("N2")
-
-                            tmp_val = tmp_locs[0].split("_")[1]
-                            tmp_keys = [
-                                i.split("_")[0].upper()
-                                for i in tmp_locs
-                                if i.split("_")[1] == tmp_val
-                            ]
-
-                    r2_funny_letters = list(
-                        set([cls.GREEK_MAPPING_R2.get(i, "?") for i in set(tmp_keys)])
-                    )
-
-                    if (
-                        cls.__tau in r2_funny_letters
-                        and cls.__tau_hat in r2_funny_letters
-                    ):
-                        r2_funny_letters.remove(cls.__tau)
-                        r2_funny_letters.remove(cls.__tau_hat)
-                        r2_funny_letters.append(cls.__beta)
-
-                    if len(r2_funny_letters) == 1:
-                        word_dict[k]["r2_funny_letters"].append(r2_funny_letters[0])
-                    else:
-                        word_dict[k]["r2_funny_letters"].append(
-                            "(" + ",".join(r2_funny_letters) + ")"
-                        )
-
-                r3_funny_letters = None
-                if r3_val_locations and len(r3_val_locations) > 0:
-                    tmp_val = r3_val_locations[0].split("_")[1]
-                    tmp_keys = [
-                        i.split("_")[0].upper()
-                        for i in r3_val_locations
-                        if i.split("_")[1] == tmp_val
-                    ]
-
-                    if (
-                        len(tmp_keys) > 1
-                        and len([i for i in tmp_keys if i.startswith("N")]) > 0
-                    ):
-                        tmp_locs = cls.__find_locations(
-                            r3_val,
-                            wb_region1_extra_values,
-                            wb_region2_extra_values,
-                            wb_region3_extra_values,
-                            wb_region4_extra_values,
-                            dict(),
-                        )
-                        if len(tmp_locs) == 0:
-                            tmp_keys = ["FORCE_GAMMA"]
-                        else:
-                            tmp_val = tmp_locs[0].split("_")[1]
-                            tmp_keys = [
-                                i.split("_")[0].upper()
-                                for i in tmp_locs
-                                if i.split("_")[1] == tmp_val
-                            ]
-
-                    if "N2" in tmp_keys:
-                        tmp_locs = cls.__find_locations(
-                            r3_val,
-                            dict(),
-                            wb_region2_extra_values,
-                            wb_region3_extra_values,
-                            dict(),
-                            dict(),
-                        )
-                        if len(tmp_locs) > 0:
-                            while "N2" in tmp_keys:
-                                tmp_keys.remove("N2")
-
-                            tmp_val = tmp_locs[0].split("_")[1]
-                            tmp_keys = [
-                                i.split("_")[0].upper()
-                                for i in tmp_locs
-                                if i.split("_")[1] == tmp_val
-                            ]
-
-                    r3_funny_letters = list(
-                        set([cls.GREEK_MAPPING_R3.get(i, "?") for i in set(tmp_keys)])
-                    )
-
-                    if (
-                        cls.__sigma in r3_funny_letters
-                        and cls.__sigma_hat in r3_funny_letters
-                    ):
-                        r3_funny_letters.remove(cls.__sigma)
-                        r3_funny_letters.remove(cls.__sigma_hat)
-                        r3_funny_letters.append(cls.__delta)
-
-                    if len(r3_funny_letters) == 1:
-                        word_dict[k]["r3_funny_letters"].append(r3_funny_letters[0])
-                    else:
-                        word_dict[k]["r3_funny_letters"].append(
-                            "(" + ",".join(r3_funny_letters) + ")"
-                        )
-
-                    x = last_cells.get(k, dict())
-                    x["r3"] = str(j + 6) + "_" + str(i + 6)
-                    last_cells[k] = x
-
-                if r1_val and len(r1_val) == window_length and r1_funny_letters:
-                    for letter in r1_funny_letters:
-                        ascii_letter = cls.GREEK_TO_ASCII.get(letter, "?")
-                        items = set(grammar_dict["region1"].get(ascii_letter, list()))
-                        items.add(r1_val)
-                        grammar_dict["region1"][ascii_letter] = list(items)
-
-                if r2_val and len(r2_val) == window_length and r2_funny_letters:
-                    for letter in r2_funny_letters:
-                        ascii_letter = cls.GREEK_TO_ASCII.get(letter, "?")
-                        items = set(grammar_dict["region2_3"].get(ascii_letter, list()))
-                        items.add(r2_val)
-                        grammar_dict["region2_3"][ascii_letter] = list(items)
-
-                if r3_val and len(r3_val) == window_length and r3_funny_letters:
-                    for letter in r3_funny_letters:
-                        ascii_letter = cls.GREEK_TO_ASCII.get(letter, "?")
-                        items = set(grammar_dict["region4"].get(ascii_letter, list()))
-                        items.add(r3_val)
-                        grammar_dict["region4"][ascii_letter] = list(items)
-
-                if r1_val:
-                    r1_val = WriteOnlyCell(ws, value=r1_val)
-                    r1_val.font = cell_font
-
-                if r1_val_locations:
-                    r1_val_location = WriteOnlyCell(
-                        ws, value=", ".join(r1_val_locations)
-                    )
-                    r1_val_location.font = cell_font
-                else:
-                    r1_val_location = None
-
-                if r1_funny_letters:
-                    r1_funny_letter = WriteOnlyCell(
-                        ws, value=", ".join(r1_funny_letters)
-                    )
-                    r1_funny_letter.font = cell_font
-                else:
-                    r1_funny_letter = None
-
-                if r2_val:
-                    r2_val = WriteOnlyCell(ws, value=r2_val)
-                    r2_val.font = cell_font
-
-                if r2_val_locations:
-                    r2_val_location = WriteOnlyCell(
-                        ws, value=", ".join(r2_val_locations)
-                    )
-                    r2_val_location.font = cell_font
-                else:
-                    r2_val_location = None
-
-                if r2_funny_letters:
-                    r2_funny_letter = WriteOnlyCell(
-                        ws, value=", ".join(r2_funny_letters)
-                    )
-                    r2_funny_letter.font = cell_font
-                else:
-                    r2_funny_letter = None
 
-                if r3_val:
-                    r3_val = WriteOnlyCell(ws, value=r3_val)
-                    r3_val.font = cell_font
-
-                if r3_val_locations:
-                    r3_val_location = WriteOnlyCell(
-                        ws, value=", ".join(r3_val_locations)
+            # This "for" generates a row in the output XLSX file
+            for n, (_, blocks) in enumerate(rloops):
+                cell_font = fonts[n % 2]
+
+                for block_key, region in cls.BLOCK_REGIONS.items():
+                    if blocks.num_blocks(block_key) <= i:
+                        row.extend((None, None, None))
+                        continue
+
+                    # The per-block resolution is a lookup in the table
+                    record = table[region][blocks.block(block_key, i)]
+                    cells = (
+                        record.block,
+                        ", ".join(str(x) for x in record.locations),
+                        cls.__get_symbols_value(
+                            block_key, blocks, record, i, window_length
+                        ),
                     )
-                    r3_val_location.font = cell_font
-                else:
-                    r3_val_location = None
 
-                if r3_funny_letters:
-                    r3_funny_letter = WriteOnlyCell(
-                        ws, value=", ".join(r3_funny_letters)
-                    )
-                    r3_funny_letter.font = cell_font
-                else:
-                    r3_funny_letter = None
-
-                row.extend(
-                    (
-                        r1_val,
-                        r1_val_location,
-                        r1_funny_letter,
-                        r2_val,
-                        r2_val_location,
-                        r2_funny_letter,
-                        r3_val,
-                        r3_val_location,
-                        r3_funny_letter,
-                    )
-                )
-
-                j += cls.COLS_PER_RLOOP
-
-                if (
-                    len(row) >= max_cols
-                ):  # Check we do not have more than max cols allowed by Excel
-                    break
-
-            # If we have reached the end of r1, r2, r3 in res, we have None everywhere in row and we have to clear it
-            if len([i for i in row if i is not None]) < 1:
-                row.clear()
+                    for value in cells:
+                        cell = WriteOnlyCell(ws, value=value)
+                        cell.font = cell_font
+                        row.append(cell)
 
             ws.append(row)
-            i += 1
 
         ws.close()
-        wb.save(out_file)
 
-        wb = openpyxl.load_workbook(out_file)
-        ws = wb["Grammar Symbols"]
+    @classmethod
+    def write_report(
+        cls, out_file, gene_seq, start_idx, end_idx, rloops, table, window_length
+    ):
+        """Write the XLSX audit report of the R-loops, given as (key, blocks) pairs.
 
-        for k, x, y in [
-            (i, j.get("r1", None), j.get("r3", None)) for i, j in last_cells.items()
-        ]:
-            x_col = int(x.split("_")[0])
-            x_row = int(x.split("_")[1])
-            v = ws.cell(row=x_row, column=x_col - 2).value
-            cell_value = cls.__omega + str(len(v))
+        Only MAX_REPORT_RLOOPS R-loops fit in a sheet, so the report is sharded
+        across as many "Grammar Symbols" sheets as needed.
+        """
+        from openpyxl import Workbook
 
-            if len(v) == window_length:
-                cell_value = ws.cell(row=x_row, column=x_col).value + cls.__omega + "0"
+        wb = Workbook(write_only=True)
+        rloops = iter(rloops)
+        shard = list(itertools.islice(rloops, cls.MAX_REPORT_RLOOPS))
+        title = "Grammar Symbols"
+        n = 1
+
+        while shard or n == 1:
+            cls.__write_report_sheet(
+                wb, title, gene_seq, start_idx, end_idx, shard, table, window_length
+            )
+            shard = list(itertools.islice(rloops, cls.MAX_REPORT_RLOOPS))
+            n += 1
+            title = "Grammar Symbols " + str(n)
 
-            ws.cell(row=x_row, column=x_col).value = cell_value
-            last_cells[k]["r1"] = cell_value
+        wb.save(out_file)
 
-            y_col = int(y.split("_")[0])
-            y_row = int(y.split("_")[1])
-            v = ws.cell(row=y_row, column=y_col - 2).value
-            cell_value = cls.__alpha + str(len(v))
+    @classmethod
+    def extract_regions(
+        cls,
+        fasta_in,
+        bed_in,
+        xlsx_in,
+        start_idx,
+        end_idx,
+        window_length=5,
+        xlsx_threshold_in=None,
+        out_file="output.xlsx",
+        report=True,
+    ):
+        from Bio import SeqIO
+
+        gene_seq = str(SeqIO.read(fasta_in, 'fasta').seq)
+        gene_seq = gene_seq[start_idx:end_idx]
+        packed_seq = PackedSequence(gene_seq)
+
+        # First pass: occurrences of the tuples of each block (N1, N2, N3), the
+        # keys of the counters are the unique tuples to resolve. The blocks of
+        # duplicate R-loops are read once and counted by their multiplicity
+        records = BedIntervals.read(bed_in)
+        rloops = [
+            str(idx_1) + "_" + str(idx_2) + "_" + str(i)
+            for i, (idx_1, idx_2) in enumerate(records.coordinates(), start=1)
+        ]
+        n_counts = {
+            block_key: collections.Counter() for block_key in cls.BLOCK_REGIONS.keys()
+        }
 
-            if len(v) == window_length:
-                cell_value = cls.__alpha + "0" + ws.cell(row=y_row, column=y_col).value
+        for idx_1, idx_2, weight in records.collapsed()[0].weighted_coordinates():
+            blocks = RLoopBlocks(
+                packed_seq, idx_1 - start_idx, idx_2 - start_idx, window_length
+            )
 
-            ws.cell(row=y_row, column=y_col).value = cell_value
-            last_cells[k]["r3"] = cell_value
+            for block_key, n_counter in n_counts.items():
+                for block in blocks.blocks(block_key):
+                    n_counter[block] += weight
 
-        wb.save(out_file)
+        if xlsx_threshold_in:
+            regions_values = cls.__read_weights(xlsx_threshold_in)
+            regions_extra_values = cls.__read_weights(xlsx_in)
+        else:
+            regions_values = cls.__read_weights(xlsx_in)
+            regions_extra_values = (dict(), dict(), dict(), dict())
+
+        # Second pass: assign the symbols of the unique tuples
+        table = cls.resolve_tuples(
+            {
+                region: n_counts[block_key]
+                for block_key, region in cls.BLOCK_REGIONS.items()
+            },
+            regions_values,
+            regions_extra_values,
+            n_counts,
+        )
+        grammar_dict = cls.build_grammar_dict(rloops, table, window_length)
 
         with open(out_file + ".json", "w") as fout:
             json.dump(grammar_dict, fout)
 
+        if report:
+            cls.write_report(
+                out_file,
+                gene_seq,
+                start_idx,
+                end_idx,
+                cls.read_rloops(bed_in, packed_seq, start_idx, window_length),
+                table,
+                window_length,
+            )
+
+        return table
+
 
 if __name__ == "__main__":
     args = vars(GrammarDict.get_args())
@@ -937,4 +594,5 @@ if __name__ == "__main__":
         args.get("window_length", 5),
         args.get("input_xlsx_threshold", None),
         args.get("output_file", "output.xlsx"),
+        not args.get("no_report", False),
     )
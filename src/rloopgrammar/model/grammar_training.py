@@ -3,7 +3,6 @@ import argparse
 import enum
 import json
 import collections
-import gmpy2
 
 """
 Script to train a grammar based on a set of  words for R-loops.
@@ -18,6 +17,8 @@ smoothing_parameter = 1
 
 class GMPYEncoder(json.JSONEncoder):
     def default(self, obj):
+        import gmpy2
+
         if isinstance(obj, gmpy2.mpq):
             return str(obj)
 
@@ -130,17 +131,19 @@ class GrammarTraining:
         with open(words_in, "r", encoding="utf-8") as fin:
             lines = fin.readlines()
 
-        training_words_greek = []
+        # Duplicate R-loops have the same word, each word is counted once
+        # weighted by its multiplicity
+        training_words_greek = collections.Counter()
         for line in lines:
             parsing = line.split(":")[1].strip()
-            training_words_greek.append(parsing)
+            training_words_greek[parsing] += 1
 
         training_words = []
 
         omega_counts = collections.defaultdict(int)
         alpha_counts = collections.defaultdict(int)
 
-        for word in training_words_greek:
+        for word, weight in training_words_greek.items():
             word = word.replace("σ^", "h")
             word = word.replace("σ", "s")
             word = word.replace("δ", "d")
@@ -151,8 +154,8 @@ class GrammarTraining:
             word = word.replace("β", "B")
 
             for i in range(width):
-                omega_counts[i] += word.count(f"ω{i}")
-                alpha_counts[i] += word.count(f"α{i}")
+                omega_counts[i] += weight * word.count(f"ω{i}")
+                alpha_counts[i] += weight * word.count(f"α{i}")
 
                 word = word.replace(f"ω{i}", "o")
                 word = word.replace(f"\xcf\x89{i}", "o")
@@ -177,7 +180,7 @@ class GrammarTraining:
             word = word.replace("\xce\xb12", "Q")
             word = word.replace("\xce\xb13", "U")
             word = word.replace("\xce\xb14", "V")
-            training_words.append(word)
+            training_words.append((word, weight))
 
         sigma_ct = smoothing_parameter
         sigma_hat_ct = smoothing_parameter
@@ -190,31 +193,20 @@ class GrammarTraining:
         delta_alpha_ct = smoothing_parameter
 
         # reverse each so we read from left to right
-        for word in map(lambda x: x[::-1], training_words):
+        for word, weight in map(lambda x: (x[0][::-1], x[1]), training_words):
             up_to_alpha_part = up_to_alpha(word)
             S_to_S_transitions = up_to_alpha_part[:-2]
             S_to_R_transitions = up_to_alpha_part[-2:]
 
-            sigma_ct += sigma_count(S_to_S_transitions)
-            sigma_hat_ct += sigma_hat_count(S_to_S_transitions)
-            gamma_ct += gamma_count(S_to_S_transitions)
-            delta_ct += delta_count(S_to_S_transitions)
-
-            sigma_alpha_ct += sigma_count(S_to_R_transitions)
-            sigma_hat_alpha_ct += sigma_hat_count(S_to_R_transitions)
-            gamma_alpha_ct += gamma_count(S_to_R_transitions)
-            delta_alpha_ct += delta_count(S_to_R_transitions)
-
-        total_len = (
-            sigma_ct
-            + sigma_hat_ct
-            + delta_ct
-            + gamma_ct
-            + sigma_alpha_ct
-            + sigma_hat_alpha_ct
-            + gamma_alpha_ct
-            + delta_alpha_ct
-        )
+            sigma_ct += weight * sigma_count(S_to_S_transitions)
+            sigma_hat_ct += weight * sigma_hat_count(S_to_S_transitions)
+            gamma_ct += weight * gamma_count(S_to_S_transitions)
+            delta_ct += weight * delta_count(S_to_S_transitions)
+
+            sigma_alpha_ct += weight * sigma_count(S_to_R_transitions)
+            sigma_hat_alpha_ct += weight * sigma_hat_count(S_to_R_transitions)
+            gamma_alpha_ct += weight * gamma_count(S_to_R_transitions)
+            delta_alpha_ct += weight * delta_count(S_to_R_transitions)
 
         S_probabilities_counts = {
             "S_sigma_S": sigma_ct,
@@ -227,20 +219,6 @@ class GrammarTraining:
             "S_delta_alpha_R": delta_alpha_ct,
         }
 
-        def alter_key_name(key):
-            segments = key.split("_")
-            new_segments = segments[:3] + ["i"] + segments[3:]
-            return "_".join(new_segments)
-
-        S_probabilities = {
-            k
-            if "alpha" not in k
-            else alter_key_name(k): gmpy2.mpq(v, total_len)
-            if "alpha" not in k
-            else gmpy2.mpq(v, total_len) / width
-            for k, v in S_probabilities_counts.items()
-        }
-
         tau_ct = smoothing_parameter
         tau_hat_ct = smoothing_parameter
         rho_ct = smoothing_parameter
@@ -251,31 +229,20 @@ class GrammarTraining:
         rho_omega_ct = smoothing_parameter
         beta_omega_ct = smoothing_parameter
 
-        for word in map(lambda x: x[::-1], training_words):
+        for word, weight in map(lambda x: (x[0][::-1], x[1]), training_words):
             after_alpha_to_omega_part = after_alpha_to_omega(word)
             R_to_R_transitions = after_alpha_to_omega_part[:-2]
             R_to_Q_transitions = after_alpha_to_omega_part[-2:]
 
-            tau_ct += tau_count(R_to_R_transitions)
-            tau_hat_ct += tau_hat_count(R_to_R_transitions)
-            rho_ct += rho_count(R_to_R_transitions)
-            beta_ct += beta_count(R_to_R_transitions)
-
-            tau_omega_ct += tau_count(R_to_Q_transitions)
-            tau_hat_omega_ct += tau_hat_count(R_to_Q_transitions)
-            rho_omega_ct += rho_count(R_to_Q_transitions)
-            beta_omega_ct += beta_count(R_to_Q_transitions)
-
-        total_len = (
-            tau_ct
-            + tau_hat_ct
-            + rho_ct
-            + beta_ct
-            + tau_omega_ct
-            + tau_hat_omega_ct
-            + rho_omega_ct
-            + beta_omega_ct
-        )
+            tau_ct += weight * tau_count(R_to_R_transitions)
+            tau_hat_ct += weight * tau_hat_count(R_to_R_transitions)
+            rho_ct += weight * rho_count(R_to_R_transitions)
+            beta_ct += weight * beta_count(R_to_R_transitions)
+
+            tau_omega_ct += weight * tau_count(R_to_Q_transitions)
+            tau_hat_omega_ct += weight * tau_hat_count(R_to_Q_transitions)
+            rho_omega_ct += weight * rho_count(R_to_Q_transitions)
+            beta_omega_ct += weight * beta_count(R_to_Q_transitions)
 
         R_probabilities_counts = {
             "R_tau_R": tau_ct,
@@ -288,15 +255,6 @@ class GrammarTraining:
             "R_beta_omega_Q": beta_omega_ct,
         }
 
-        R_probabilities = {
-            k
-            if "omega" not in k
-            else alter_key_name(k): gmpy2.mpq(v, total_len)
-            if "omega" not in k
-            else gmpy2.mpq(v, total_len) / width
-            for k, v in R_probabilities_counts.items()
-        }
-
         sigma_ct = smoothing_parameter
         sigma_hat_ct = smoothing_parameter
         gamma_ct = smoothing_parameter
@@ -308,31 +266,20 @@ class GrammarTraining:
         delta_end_ct = smoothing_parameter
 
         # reverse each so we read from left to right
-        for word in map(lambda x: x[::-1], training_words):
+        for word, weight in map(lambda x: (x[0][::-1], x[1]), training_words):
             after_omega_part = after_omega(word)
             Q_to_Q_transitions = after_omega_part[:-1]
             Q_to_end_transitions = after_omega_part[-1:]
 
-            sigma_ct += sigma_count(Q_to_Q_transitions)
-            sigma_hat_ct += sigma_hat_count(Q_to_Q_transitions)
-            gamma_ct += gamma_count(Q_to_Q_transitions)
-            delta_ct += delta_count(Q_to_Q_transitions)
-
-            sigma_end_ct += sigma_count(Q_to_end_transitions)
-            sigma_hat_end_ct += sigma_hat_count(Q_to_end_transitions)
-            gamma_end_ct += gamma_count(Q_to_end_transitions)
-            delta_end_ct += delta_count(Q_to_end_transitions)
-
-        total_len = (
-            sigma_ct
-            + sigma_hat_ct
-            + delta_ct
-            + gamma_ct
-            + sigma_end_ct
-            + sigma_hat_end_ct
-            + gamma_end_ct
-            + delta_end_ct
-        )
+            sigma_ct += weight * sigma_count(Q_to_Q_transitions)
+            sigma_hat_ct += weight * sigma_hat_count(Q_to_Q_transitions)
+            gamma_ct += weight * gamma_count(Q_to_Q_transitions)
+            delta_ct += weight * delta_count(Q_to_Q_transitions)
+
+            sigma_end_ct += weight * sigma_count(Q_to_end_transitions)
+            sigma_hat_end_ct += weight * sigma_hat_count(Q_to_end_transitions)
+            gamma_end_ct += weight * gamma_count(Q_to_end_transitions)
+            delta_end_ct += weight * delta_count(Q_to_end_transitions)
 
         Q_probabilities_counts = {
             "Q_sigma_Q": sigma_ct,
@@ -345,23 +292,68 @@ class GrammarTraining:
             "Q_delta_end": delta_end_ct,
         }
 
+        data = cls.probabilities(
+            S_probabilities_counts,
+            R_probabilities_counts,
+            Q_probabilities_counts,
+            width,
+        )
+        cls.write_probabilities(data, out_file)
+
+    @classmethod
+    def probabilities(
+        cls,
+        S_probabilities_counts,
+        R_probabilities_counts,
+        Q_probabilities_counts,
+        width,
+    ):
+        import gmpy2
+
+        def alter_key_name(key):
+            segments = key.split("_")
+            new_segments = segments[:3] + ["i"] + segments[3:]
+            return "_".join(new_segments)
+
+        total_len = sum(S_probabilities_counts.values())
+        S_probabilities = {
+            k
+            if "alpha" not in k
+            else alter_key_name(k): gmpy2.mpq(v, total_len)
+            if "alpha" not in k
+            else gmpy2.mpq(v, total_len) / width
+            for k, v in S_probabilities_counts.items()
+        }
+
+        total_len = sum(R_probabilities_counts.values())
+        R_probabilities = {
+            k
+            if "omega" not in k
+            else alter_key_name(k): gmpy2.mpq(v, total_len)
+            if "omega" not in k
+            else gmpy2.mpq(v, total_len) / width
+            for k, v in R_probabilities_counts.items()
+        }
+
+        total_len = sum(Q_probabilities_counts.values())
         Q_probabilities = {
             k: gmpy2.mpq(v, total_len) for k, v in Q_probabilities_counts.items()
         }
 
-        with open(out_file, "w", encoding="utf-8") as file_handle:
-            data = dict(
-                S_probabilities_counts=S_probabilities_counts,
-                R_probabilities_counts=R_probabilities_counts,
-                Q_probabilities_counts=Q_probabilities_counts,
-                S_probabilities=S_probabilities,
-                R_probabilities=R_probabilities,
-                Q_probabilities=Q_probabilities,
-            )
+        return dict(
+            S_probabilities_counts=S_probabilities_counts,
+            R_probabilities_counts=R_probabilities_counts,
+            Q_probabilities_counts=Q_probabilities_counts,
+            S_probabilities=S_probabilities,
+            R_probabilities=R_probabilities,
+            Q_probabilities=Q_probabilities,
+        )
 
+    @classmethod
+    def write_probabilities(cls, data, out_file):
+        with open(out_file, "w", encoding="utf-8") as file_handle:
             json.dump(data, file_handle, ensure_ascii=False, indent=4, cls=GMPYEncoder)
 
-
 if __name__ == "__main__":
     args = vars(GrammarTraining.get_args())
     GrammarTraining.find_probabilities(
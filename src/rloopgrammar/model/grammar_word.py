@@ -2,6 +2,10 @@
 import argparse
 import json
 
+from rloopgrammar.model.bed_intervals import BedIntervals
+from rloopgrammar.model.packed_sequence import PackedSequence
+from rloopgrammar.model.rloop_blocks import RLoopBlocks
+
 """
 Script to generated words for R-loops in a BED file using a dictionary.
 
@@ -62,17 +66,6 @@ class GrammarWord:
 
         return int(x.split("_")[2])
 
-    @classmethod
-    def __get_regions(cls, gene_seq, bed_start, bed_end):
-        if not gene_seq:
-            raise AssertionError("Specify a gene sequence")
-        if bed_start > bed_end:
-            raise AssertionError("Start index must be lower or equal than end index")
-        if len(gene_seq) < bed_end:
-            raise AssertionError("End index too large")
-
-        return gene_seq[:bed_start], gene_seq[bed_start:bed_end], gene_seq[bed_end:]
-
     @classmethod
     def get_args(cls):
         parser = argparse.ArgumentParser(description="Grammar word")
@@ -141,6 +134,47 @@ class GrammarWord:
         )
         return parser.parse_args()
 
+    @classmethod
+    def __symbols(cls, region_symbols, full):
+        # Symbols of the full blocks starting at the positions of full, in gene
+        # order
+        if not full:
+            return list()
+
+        if full.step < 0:
+            full = full[::-1]
+
+        return region_symbols[full.start : full[-1] + 1 : full.step]
+
+    @classmethod
+    def __word(cls, symbols, blocks):
+        # Blocks before the R-loop, the last one carries omega
+        full, short = blocks.layout("r1")
+        r1_letters = cls.__symbols(symbols["region1"], full)
+
+        if short:
+            r1_letters.append(cls.__omega + str(short[1]))
+        elif r1_letters:
+            r1_letters[-1] = r1_letters[-1] + cls.__omega + "0"
+
+        # Blocks of the R-loop, in gene order
+        full, short = blocks.layout("r2_rev")
+        r2_letters = cls.__symbols(symbols["region2_3"], full)
+
+        if short:
+            r2_letters.insert(0, "?" + str(short[1]))
+
+        # Blocks after the R-loop, in gene order, the first one carries alpha
+        full, short = blocks.layout("r3_rev")
+        r3_letters = cls.__symbols(symbols["region4"], full)
+
+        if short:
+            r3_letters.insert(0, cls.__alpha + str(short[1]))
+        elif r3_letters:
+            r3_letters[0] = cls.__alpha + "0" + r3_letters[0]
+
+        return "".join(r1_letters) + "".join(r2_letters) + "".join(r3_letters)
+
     @classmethod
     def extract_word(
         cls,
@@ -152,144 +186,56 @@ class GrammarWord:
         window_length=5,
         out_file="output.txt",
     ):
-        res = dict()
         with open(fasta_in, "r") as fin:
             fin.readline()
             gene_seq = fin.readline().strip().upper()
 
-        gene_seq = gene_seq[start_idx:end_idx]
-
-        word_dict = dict()
-
-        with open(json_in, "r") as fin:
-            grammar_dict = json.load(fin)
+        gene_seq = PackedSequence(gene_seq[start_idx:end_idx])
+
+        # The dictionary may be given already loaded, as from a model bundle
+        if isinstance(json_in, dict):
+            grammar_dict = json_in
+        else:
+            with open(json_in, "r") as fin:
+                grammar_dict = json.load(fin)
+
+        # Symbol of the block starting at each position of the gene, the first
+        # letter of the dictionary holding its tuple or the default symbol
+        symbols = dict()
+        for region, default in (
+            ("region1", cls.__gamma),
+            ("region2_3", cls.__rho),
+            ("region4", cls.__gamma),
+        ):
+            letters = dict()
+            for letter, v in grammar_dict.get(region, dict()).items():
+                for val in v:
+                    letters.setdefault(val, cls.ASCII_TO_GREEK.get(letter, "?"))
+
+            symbols[region] = gene_seq.kmer_values(window_length, letters, default)
+
+        records = BedIntervals.read(bed_in)
+        unique_rloops, unique_index = records.collapsed()
+
+        # The word of duplicate R-loops is parsed once
+        words = [
+            cls.__word(
+                symbols,
+                RLoopBlocks(
+                    gene_seq, idx_1 - start_idx, idx_2 - start_idx, window_length
+                ),
+            )
+            for idx_1, idx_2 in unique_rloops.coordinates()
+        ]
 
         with open(out_file, "w", encoding="utf-8") as fout:
-            with open(bed_in, "r") as fin:
-                line = fin.readline()
-
-                i = 1  # We keep track of the row we are reading in the BED file
-                while line:
-                    parts = line.strip().split("\t")
-                    idx_1 = int(parts[1])
-                    idx_2 = int(parts[2])
-
-                    r1, r2, r3 = cls.__get_regions(
-                        gene_seq, idx_1 - start_idx, idx_2 - start_idx
-                    )
-                    r1_rev = r1[::-1]
-                    r2_rev = r2[::-1]
-                    r3_rev = r3[::-1]
-
-                    res_r1 = [
-                        r1[i : i + window_length]
-                        for i in range(0, len(r1), window_length)
-                    ]
-                    res_r1_rev = [
-                        r1_rev[i : i + window_length][::-1]
-                        for i in range(0, len(r1), window_length)
-                    ]
-                    res_r2 = [
-                        r2[i : i + window_length]
-                        for i in range(0, len(r2), window_length)
-                    ]
-                    res_r2_rev = [
-                        r2_rev[i : i + window_length][::-1]
-                        for i in range(0, len(r2), window_length)
-                    ]
-                    res_r3 = [
-                        r3[i : i + window_length]
-                        for i in range(0, len(r3), window_length)
-                    ]
-                    res_r3_rev = [
-                        r3_rev[i : i + window_length][::-1]
-                        for i in range(0, len(r3), window_length)
-                    ]
-
-                    k = str(idx_1) + "_" + str(idx_2) + "_" + str(i)
-
-                    if not word_dict.get(k, None):
-                        word_dict[k] = {
-                            "r1_funny_letters": list(),
-                            "r2_funny_letters": list(),
-                            "r3_funny_letters": list(),
-                        }
-
-                    last_val = None
-                    for val in res_r1:
-                        last_val = val
-
-                        if len(val) != window_length:
-                            funny_letter = cls.__omega + str(len(val))
-                        else:
-                            funny_letter = cls.__gamma
-
-                            for letter, v in grammar_dict.get(
-                                "region1", dict()
-                            ).items():
-                                if val in v:
-                                    funny_letter = cls.ASCII_TO_GREEK.get(letter, "?")
-                                    break
-
-                        word_dict[k]["r1_funny_letters"].append(funny_letter)
-
-                    if last_val and len(last_val) == window_length:
-                        word_dict[k]["r1_funny_letters"][-1] = (
-                            word_dict[k]["r1_funny_letters"][-1] + cls.__omega + "0"
-                        )
-
-                    for val in res_r2_rev:
-                        if len(val) != window_length:
-                            funny_letter = "?" + str(len(val))
-                        else:
-                            funny_letter = cls.__rho
-
-                            for letter, v in grammar_dict.get(
-                                "region2_3", dict()
-                            ).items():
-                                if val in v:
-                                    funny_letter = cls.ASCII_TO_GREEK.get(letter, "?")
-                                    break
-
-                        word_dict[k]["r2_funny_letters"].append(funny_letter)
-
-                    last_val = None
-                    for val in res_r3_rev:
-                        last_val = val
-
-                        if len(val) != window_length:
-                            funny_letter = cls.__alpha + str(len(val))
-                        else:
-                            funny_letter = cls.__gamma
-
-                            for letter, v in grammar_dict.get(
-                                "region4", dict()
-                            ).items():
-                                if val in v:
-                                    funny_letter = cls.ASCII_TO_GREEK.get(letter, "?")
-                                    break
-
-                        word_dict[k]["r3_funny_letters"].append(funny_letter)
-
-                    if last_val and len(last_val) == window_length:
-                        word_dict[k]["r3_funny_letters"][-1] = (
-                            cls.__alpha + "0" + word_dict[k]["r3_funny_letters"][-1]
-                        )
-
-                    v = word_dict[k]
-                    write_line = (
-                        k
-                        + ": "
-                        + "".join(v["r1_funny_letters"])
-                        + "".join(reversed(v["r2_funny_letters"]))
-                        + "".join(reversed(v["r3_funny_letters"]))
-                    )
-
-                    fout.write(write_line + "\n")
-                    del word_dict[k]
-
-                    line = fin.readline()
-                    i += 1
+            # We keep track of the row we are reading in the BED file
+            for i, ((idx_1, idx_2), u) in enumerate(
+                zip(records.coordinates(), unique_index.tolist()), start=1
+            ):
+                k = str(idx_1) + "_" + str(idx_2) + "_" + str(i)
+
+                fout.write(k + ": " + words[u] + "\n")
 
 
 if __name__ == "__main__":
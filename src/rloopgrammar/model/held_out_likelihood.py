@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import math
+
+from rloopgrammar.model.bed_intervals import BedIntervals
+from rloopgrammar.model.packed_sequence import PackedSequence
+from rloopgrammar.model.probabilistic_language import from_gmpy
+
+"""
+Script to score held-out R-loops under a trained grammar.
+
+The log-likelihood of an R-loop is the log of the probability of its word
+divided by the partition function, the sum of the probabilities of all the
+R-loops predict.py considers. The probability of a word is a product over its
+blocks, and the blocks before, inside and after an R-loop lie on fixed grids of
+the gene, so log-probabilities of all R-loops come from prefix sums over these
+grids instead of building every word.
+"""
+
+# Probability of a symbol depending on the part of the word it is read in, the
+# last symbol read in each part uses the second table
+TRANSITIONS = {
+    "region4": (
+        "S_probabilities",
+        {
+            "SIGMA": "S_sigma_S",
+            "SIGMA^": "S_sigma_hat_S",
+            "GAMMA": "S_gamma_S",
+            "DELTA": "S_delta_S",
+        },
+        {
+            "SIGMA": "S_sigma_alpha_i_R",
+            "SIGMA^": "S_sigma_hat_i_alpha_R",
+            "GAMMA": "S_gamma_alpha_i_R",
+            "DELTA": "S_delta_alpha_i_R",
+        },
+    ),
+    "region2_3": (
+        "R_probabilities",
+        {
+            "TAU": "R_tau_R",
+            "TAU^": "R_tau_hat_R",
+            "RHO": "R_rho_R",
+            "BETA": "R_beta_R",
+        },
+        {
+            "TAU": "R_tau_omega_i_Q",
+            "TAU^": "R_tau_hat_i_omega_Q",
+            "RHO": "R_rho_omega_i_Q",
+            "BETA": "R_beta_omega_i_Q",
+        },
+    ),
+    "region1": (
+        "Q_probabilities",
+        {
+            "SIGMA": "Q_sigma_Q",
+            "SIGMA^": "Q_sigma_hat_Q",
+            "GAMMA": "Q_gamma_Q",
+            "DELTA": "Q_delta_Q",
+        },
+        {
+            "SIGMA": "Q_sigma_end",
+            "SIGMA^": "Q_sigma_hat_end",
+            "GAMMA": "Q_gamma_end",
+            "DELTA": "Q_delta_end",
+        },
+    ),
+}
+
+# Symbol of tuples missing from the dictionary, as in GrammarWord
+DEFAULT_SYMBOLS = {"region1": "GAMMA", "region2_3": "RHO", "region4": "GAMMA"}
+
+
+class HeldOutLikelihood:
+    @classmethod
+    def get_args(cls):
+        parser = argparse.ArgumentParser(description="Held-out likelihood")
+        parser.add_argument(
+            "-f",
+            "--input-fasta",
+            metavar="FASTA_IN_FILE",
+            type=str,
+            required=True,
+            help="FASTA input file",
+            default=None,
+        )
+        parser.add_argument(
+            "-b",
+            "--input-bed",
+            metavar="BED_IN_FILE",
+            type=str,
+            required=True,
+            help="BED file of the held-out R-loops",
+            default=None,
+        )
+        parser.add_argument(
+            "-j",
+            "--input-json",
+            metavar="JSON_IN_FILE",
+            type=str,
+            required=True,
+            help="Dictionary JSON input file",
+            default=None,
+        )
+        parser.add_argument(
+            "-p",
+            "--input_probabilities",
+            metavar="PROBABILITIES_IN_FILE",
+            type=str,
+            required=True,
+            help="Probabilities input file",
+            default=None,
+        )
+        parser.add_argument(
+            "-s",
+            "--start-index",
+            metavar="START_INDEX",
+            type=int,
+            required=True,
+            help="Start index of gene region",
+            default=0,
+        )
+        parser.add_argument(
+            "-e",
+            "--end-index",
+            metavar="END_INDEX",
+            type=int,
+            required=True,
+            help="End index of gene region",
+            default=0,
+        )
+        parser.add_argument(
+            "-w",
+            "--window-length",
+            metavar="WINDOW_LENGTH",
+            type=int,
+            required=False,
+            help="Number of nucleotides in single region",
+            default=5,
+        )
+        parser.add_argument(
+            "-o",
+            "--output-file",
+            metavar="OUTPUT_FILE",
+            type=str,
+            required=False,
+            help="Output BED file with the log-likelihood of each R-loop",
+            default="output.bed",
+        )
+        return parser.parse_args()
+
+    @classmethod
+    def __strided_cumsum(cls, values, window_length):
+        import numpy as np
+
+        # cumsum[i] is the sum of values[j] for j <= i and j = i mod window_length
+        padding = -len(values) % window_length
+        padded = np.concatenate([values, np.zeros(padding, dtype=values.dtype)])
+        cumsum = padded.reshape(-1, window_length).cumsum(axis=0).reshape(-1)
+
+        return cumsum[: len(values)]
+
+    @classmethod
+    def __block_tables(cls, gene_seq, grammar_dict, probabilities, window_length):
+        # For every block start in the gene and every region, the log-probability of
+        # the block inside its part of the word and when read last, and whether
+        # the grammar has no such transition (the word would have no probability)
+        import numpy as np
+
+        tables = dict()
+        packed_seq = PackedSequence(gene_seq)
+
+        for region, (part, inner, last) in TRANSITIONS.items():
+            symbols = dict()
+            for letter, tuples in grammar_dict.get(region, dict()).items():
+                for val in tuples:
+                    symbols.setdefault(val, letter)
+
+            block_symbols = packed_seq.kmer_values(
+                window_length, symbols, DEFAULT_SYMBOLS[region]
+            )
+
+            for name, keys in (("inner", inner), ("last", last)):
+                log_probabilities = np.zeros(len(block_symbols))
+                missing = np.zeros(len(block_symbols), dtype=np.int64)
+
+                for s, symbol in enumerate(block_symbols):
+                    key = keys.get(symbol)
+
+                    if key is None:
+                        missing[s] = 1
+                    else:
+                        log_probabilities[s] = math.log(
+                            float(probabilities[part][key])
+                        )
+
+                tables[region, name] = (log_probabilities, missing)
+
+        return tables
+
+    @classmethod
+    def __word_terms(cls, tables, gene_length, window_length, index):
+        # Split the log-probability of the word of R-loop (x, y), wrt the gene, in a
+        # part depending on x and a part depending on y; index picks the log
+        # probabilities (0) or the missing transitions (1)
+        import numpy as np
+
+        w = window_length
+        positions = np.arange(gene_length + 1)
+
+        q_inner = cls.__strided_cumsum(tables["region1", "inner"][index], w)
+        q_last = tables["region1", "last"][index]
+        r_inner = cls.__strided_cumsum(tables["region2_3", "inner"][index], w)
+        r_last = tables["region2_3", "last"][index]
+        s_inner = cls.__strided_cumsum(tables["region4", "inner"][index], w)
+        s_last = tables["region4", "last"][index]
+
+        # Blocks before the R-loop, read from the R-loop back to the start of the gene
+        x = np.clip(positions, w, gene_length - w)
+        x_terms = q_last[0] + q_inner[(x // w - 1) * w] - q_inner[0]
+        x_terms = x_terms + r_last[x] - r_inner[x]
+
+        # Blocks after the R-loop, read from the end of the gene back to the R-loop
+        y = np.clip(positions, w, gene_length - w)
+        after_start = gene_length - ((gene_length - y) // w) * w
+        y_terms = r_inner[y - w] + s_last[after_start]
+        y_terms = y_terms + s_inner[gene_length - w] - s_inner[after_start]
+
+        return x_terms, y_terms
+
+    @classmethod
+    def __log_probabilities(cls, tables, gene_length, window_length):
+        x_terms, y_terms = cls.__word_terms(tables, gene_length, window_length, 0)
+        x_missing, y_missing = cls.__word_terms(tables, gene_length, window_length, 1)
+
+        x_terms[x_missing > 0] = -math.inf
+        y_terms[y_missing > 0] = -math.inf
+
+        return x_terms, y_terms
+
+    @classmethod
+    def __logsumexp(cls, values):
+        import numpy as np
+
+        values = np.asarray(values, dtype=float)
+        maximum = values.max() if len(values) else -math.inf
+
+        if maximum == -math.inf:
+            return -math.inf
+
+        return float(maximum + np.log(np.exp(values - maximum).sum()))
+
+    @classmethod
+    def log_partition_function(cls, x_terms, y_terms, gene_length, window_length):
+        # The R-loops of predict.py, wrt the gene
+        w = window_length
+        sums = []
+
+        for x in range(w, gene_length - 2 * w):
+            y_sums = y_terms[x + w : gene_length - w : w]
+            sums.append(cls.__logsumexp(x_terms[x] + y_sums))
+
+        return cls.__logsumexp(sums)
+
+    @classmethod
+    def score(
+        cls,
+        fasta_in,
+        bed_in,
+        json_in,
+        probabs_in,
+        start_idx,
+        end_idx,
+        window_length=5,
+        out_file="output.bed",
+    ):
+        import numpy as np
+
+        with open(fasta_in, "r") as fin:
+            fin.readline()
+            gene_seq = fin.readline().strip().upper()
+
+        gene_seq = gene_seq[start_idx:end_idx]
+        gene_length = len(gene_seq)
+        w = window_length
+
+        with open(json_in, "r") as fin:
+            grammar_dict = json.load(fin)
+
+        with open(probabs_in, "r", encoding="utf-8") as file_handle:
+            probabilities = json.load(file_handle, object_hook=from_gmpy)
+
+        tables = cls.__block_tables(gene_seq, grammar_dict, probabilities, w)
+        x_terms, y_terms = cls.__log_probabilities(tables, gene_length, w)
+        log_partition_function = cls.log_partition_function(
+            x_terms, y_terms, gene_length, w
+        )
+
+        rloops = BedIntervals.read(bed_in, extra_columns=True)
+        x = rloops.starts - start_idx
+        y = rloops.ends - start_idx
+
+        # Only the R-loops of the partition function are scored, the others have
+        # no word the grammar can read (no block before or after it, or not
+        # aligned to the window length) or are not among the R-loops of predict.py
+        scored = (
+            (x >= w)
+            & (x < gene_length - 2 * w)
+            & (y - x >= w)
+            & ((y - x) % w == 0)
+            & (y < gene_length - w)
+        )
+        x_index = np.where(scored, x, w)
+        y_index = np.where(scored, y, gene_length - w)
+
+        log_likelihoods = x_terms[x_index] + y_terms[y_index] - log_partition_function
+
+        with open(out_file, "w") as fout:
+            for line, is_scored, log_likelihood in zip(
+                rloops.lines(), scored, log_likelihoods
+            ):
+                value = str(float(log_likelihood)) if is_scored else "NA"
+                fout.write(line.rstrip("\n") + "\t" + value + "\n")
+
+        scored_log_likelihoods = log_likelihoods[scored]
+
+        return {
+            "rloops": len(rloops),
+            "scored": int(scored.sum()),
+            "log_partition_function": log_partition_function,
+            "total_log_likelihood": float(scored_log_likelihoods.sum()),
+            "mean_log_likelihood": float(scored_log_likelihoods.mean())
+            if len(scored_log_likelihoods)
+            else None,
+        }
+
+
+if __name__ == "__main__":
+    args = vars(HeldOutLikelihood.get_args())
+    summary = HeldOutLikelihood.score(
+        args.get("input_fasta", None),
+        args.get("input_bed", None),
+        args.get("input_json", None),
+        args.get("input_probabilities", None),
+        args.get("start_index", 0),
+        args.get("end_index", 0),
+        args.get("window_length", 5),
+        args.get("output_file", "output.bed"),
+    )
+    print(json.dumps(summary, indent=4))
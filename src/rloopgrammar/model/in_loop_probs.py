@@ -1,9 +1,9 @@
 #!/usr/bin/env python3
 import argparse
-import numpy as np
-import xlsxwriter
 import json
 
+from rloopgrammar.model.bed_intervals import BedIntervals
+
 """
 Script to find probability of a base being in an R-loop based on an input probabilistic language. Probabilities are plotted with alpha on the left and omega on the right.
 
@@ -103,10 +103,10 @@ class Loop_probabilities:
         width,
         output_file="output",
     ):
-        with open(bed_in, "r", encoding="utf-8") as file:
-            bed_all_rloops = [
-                list(map(int, line.split("\t")[1:3])) for line in file.readlines()
-            ]
+        import numpy as np
+        import xlsxwriter
+
+        bed_all_rloops = BedIntervals.read(bed_in).coordinates()
 
         with open(probabs_in, "r") as file:
             lines = file.readlines()
@@ -198,7 +198,6 @@ class Loop_probabilities:
 
 if __name__ == "__main__":
     args = vars(Loop_probabilities.get_args())
-    print(args)
     Loop_probabilities.in_loop_probabilities(
         args.get("input_words", None),
         args["input_bed"],
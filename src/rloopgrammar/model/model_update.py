@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+import argparse
+import collections
+import json
+
+from rloopgrammar.model.bootstrap_ensemble import BootstrapEnsemble
+from rloopgrammar.model.grammar_dict import GrammarDict, SymbolRecord
+from rloopgrammar.model.grammar_training import GrammarTraining
+from rloopgrammar.model.regions_extractor import RegionsExtractor
+from rloopgrammar.model.regions_threshold import RegionsThreshold
+
+"""
+Script to update a grammar with new R-loops without reading its training set.
+
+The occurrences of the windows, parsing blocks and transitions of the training
+set are kept in a statistics file written next to the model when it is built.
+The new R-loops add their occurrences, and only the tuples whose occurrences or
+threshold changed are resolved again. The updated model is the model of the
+training set followed by the new R-loops.
+"""
+
+STATISTICS_SUFFIX = "_statistics.json"
+CHANGES_SUFFIX = "_dictionary_changes.json"
+
+
+class ModelUpdate:
+    @classmethod
+    def get_args(cls):
+        parser = argparse.ArgumentParser(description="Model update")
+        parser.add_argument(
+            "-f",
+            "--input-fasta",
+            metavar="FASTA_IN_FILE",
+            type=str,
+            required=True,
+            help="FASTA input file",
+            default=None,
+        )
+        parser.add_argument(
+            "-b",
+            "--input-bed",
+            metavar="BED_IN_FILE",
+            type=str,
+            required=True,
+            help="Aligned BED file of the new R-loops",
+            default=None,
+        )
+        parser.add_argument(
+            "-j",
+            "--input-json",
+            metavar="JSON_IN_FILE",
+            type=str,
+            required=True,
+            help="Dictionary JSON input file of the model",
+            default=None,
+        )
+        parser.add_argument(
+            "-t",
+            "--input-statistics",
+            metavar="STATISTICS_IN_FILE",
+            type=str,
+            required=False,
+            help="Statistics input file of the model",
+            default=None,
+        )
+        parser.add_argument(
+            "-r",
+            "--input-training-bed",
+            metavar="TRAINING_BED_IN_FILE",
+            type=str,
+            required=False,
+            help="Training set of the model, read if there is no statistics file",
+            default=None,
+        )
+        parser.add_argument(
+            "-s",
+            "--start-index",
+            metavar="START_INDEX",
+            type=int,
+            required=True,
+            help="Start index of gene region",
+            default=0,
+        )
+        parser.add_argument(
+            "-e",
+            "--end-index",
+            metavar="END_INDEX",
+            type=int,
+            required=True,
+            help="End index of gene region",
+            default=0,
+        )
+        parser.add_argument(
+            "-w",
+            "--window-length",
+            metavar="WINDOW_LENGTH",
+            type=int,
+            required=False,
+            help="Number of nucleotides in single region",
+            default=5,
+        )
+        parser.add_argument(
+            "-p",
+            "--padding",
+            type=int,
+            required=False,
+            help="Maximum number of nucleotides to be padded for each region",
+            default=0,
+        )
+        parser.add_argument(
+            "-o",
+            "--prefix-output-files",
+            metavar="PREFIX_OUTPUT_FILES",
+            type=str,
+            required=False,
+            help="Prefix output files (without extension)",
+            default="output",
+        )
+        return parser.parse_args()
+
+    @classmethod
+    def __counted_statistics(cls, statistics, weights=None):
+        import numpy as np
+
+        if weights is None:
+            # Occurrences in all the R-loops of the statistics
+            weights = np.ones(len(statistics.bed_lines), dtype=np.int64)
+
+        window_counts, block_counts, transition_counts = BootstrapEnsemble.counts(
+            statistics, weights
+        )
+        transitions = dict()
+
+        for (region, part), counts in transition_counts.items():
+            transitions.setdefault(region, dict())[part] = counts
+
+        return {
+            "rloops": int(np.sum(weights)),
+            "windows": window_counts,
+            "blocks": block_counts,
+            "transitions": transitions,
+        }
+
+    @classmethod
+    def __merge_counts(cls, counts, new_counts):
+        # Keys of counts first, then the new keys in the order they are read
+        merged = dict(counts)
+
+        for key, count in new_counts.items():
+            merged[key] = merged.get(key, 0) + count
+
+        return merged
+
+    @classmethod
+    def __merge(cls, statistics, new_statistics):
+        return {
+            "rloops": statistics["rloops"] + new_statistics["rloops"],
+            "windows": [
+                cls.__merge_counts(counts, new_counts)
+                for counts, new_counts in zip(
+                    statistics["windows"], new_statistics["windows"]
+                )
+            ],
+            "blocks": {
+                block_key: cls.__merge_counts(
+                    counts, new_statistics["blocks"][block_key]
+                )
+                for block_key, counts in statistics["blocks"].items()
+            },
+            "transitions": {
+                region: {
+                    part: cls.__merge_counts(
+                        counts, new_statistics["transitions"][region][part]
+                    )
+                    for part, counts in parts.items()
+                }
+                for region, parts in statistics["transitions"].items()
+            },
+        }
+
+    @classmethod
+    def __max_names(cls, values):
+        # Names with the maximum value, as GrammarDict compares locations
+        if not values:
+            return None
+
+        maximum = max(values.values())
+
+        return tuple(name for name, value in values.items() if value == maximum)
+
+    @classmethod
+    def __resolution_inputs(cls, val, statistics, region_values):
+        # The locations of a tuple GrammarDict.resolve_tuples compares, tuples
+        # with the same inputs get the same symbols
+        regions_values, regions_extra_values = region_values
+
+        def weights(regions):
+            return {
+                n: regions_extra_values[n][val]
+                for n in regions
+                if val in regions_extra_values[n]
+            }
+
+        thresholded = {
+            n: values[val] for n, values in enumerate(regions_values) if val in values
+        }
+
+        return (
+            cls.__max_names(thresholded),
+            cls.__max_names(
+                {
+                    block_key: statistics["blocks"][block_key].get(val, 0)
+                    for block_key in GrammarDict.BLOCK_REGIONS
+                }
+            ),
+            cls.__max_names(weights(range(4))),
+            cls.__max_names(weights((1, 2))),
+        )
+
+    @classmethod
+    def __ascii(cls, symbols):
+        if symbols is None:
+            return None
+
+        return [GrammarDict.GREEK_TO_ASCII.get(x, "?") for x in symbols]
+
+    @classmethod
+    def model_statistics(
+        cls, fasta_in, bed_in, start_idx, end_idx, window_length=5, padding=0
+    ):
+        """Statistics of the training set of a model."""
+        return cls.__counted_statistics(
+            BootstrapEnsemble.rloop_statistics(
+                fasta_in, bed_in, start_idx, end_idx, window_length, padding
+            )
+        )
+
+    @classmethod
+    def replicate_statistics(cls, statistics, weights):
+        """Statistics of the training set of a bootstrap replicate, given by the
+        weights of the R-loops of statistics, see BootstrapEnsemble."""
+        return cls.__counted_statistics(statistics, weights)
+
+    @classmethod
+    def write_statistics(cls, statistics, out_file):
+        with open(out_file, "w") as fout:
+            json.dump(statistics, fout)
+
+    @classmethod
+    def update(
+        cls,
+        fasta_in,
+        bed_in,
+        json_in,
+        statistics,
+        start_idx,
+        end_idx,
+        window_length=5,
+        padding=0,
+        out_pref="output",
+    ):
+        """Update the model of the statistics with the R-loops of bed_in.
+
+        Writes the weights, threshold, dictionary, probabilities and statistics
+        of the updated model, and returns the tuples whose symbols changed.
+        """
+        with open(json_in, "r") as fin:
+            grammar_dict = json.load(fin)
+
+        rloop_statistics = BootstrapEnsemble.rloop_statistics(
+            fasta_in, bed_in, start_idx, end_idx, window_length, padding
+        )
+        gene_count = rloop_statistics.gene_count
+        updated = cls.__merge(statistics, cls.__counted_statistics(rloop_statistics))
+
+        region_values = BootstrapEnsemble.region_values(
+            statistics["windows"], gene_count, statistics["rloops"]
+        )
+        updated_region_values = BootstrapEnsemble.region_values(
+            updated["windows"], gene_count, updated["rloops"]
+        )
+
+        symbols = dict()
+        for region in GrammarDict.REGION_RESOLUTION:
+            symbols[region] = dict()
+
+            for letter, values in grammar_dict.get(region, dict()).items():
+                for val in values:
+                    symbols[region].setdefault(val, list()).append(
+                        GrammarDict.ASCII_TO_GREEK.get(letter, "?")
+                    )
+
+        # Tuples that are new or whose resolution inputs changed
+        unresolved = dict()
+        for block_key, region in GrammarDict.BLOCK_REGIONS.items():
+            unresolved[region] = [
+                val
+                for val in updated["blocks"][block_key]
+                if len(val) == window_length
+                and (
+                    val not in symbols[region]
+                    or cls.__resolution_inputs(val, statistics, region_values)
+                    != cls.__resolution_inputs(val, updated, updated_region_values)
+                )
+            ]
+
+        n_counts = {
+            block_key: collections.Counter(counts)
+            for block_key, counts in updated["blocks"].items()
+        }
+        resolved = GrammarDict.resolve_tuples(
+            unresolved, *updated_region_values, n_counts
+        )
+
+        table = dict()
+        changes = list()
+
+        for block_key, region in GrammarDict.BLOCK_REGIONS.items():
+            table[region] = dict()
+
+            for val in updated["blocks"][block_key]:
+                if len(val) != window_length:
+                    continue
+
+                if val not in resolved[region]:
+                    table[region][val] = SymbolRecord(
+                        val, tuple(), tuple(symbols[region][val])
+                    )
+                    continue
+
+                record = resolved[region][val]
+                table[region][val] = record
+                old_symbols = symbols[region].get(val)
+
+                if old_symbols is None or set(old_symbols) != set(record.symbols):
+                    changes.append(
+                        {
+                            "region": region,
+                            "tuple": val,
+                            "old": cls.__ascii(old_symbols),
+                            "new": cls.__ascii(record.symbols),
+                        }
+                    )
+
+        rloops = list(grammar_dict["rloops"])
+        for idx_1, idx_2 in rloop_statistics.coordinates:
+            rloops.append(f"{idx_1}_{idx_2}_{len(rloops) + 1}")
+
+        updated_dict = GrammarDict.build_grammar_dict(rloops, table, window_length)
+        probabilities = BootstrapEnsemble.transition_probabilities(
+            updated_dict,
+            {
+                (region, part): counts
+                for region, parts in updated["transitions"].items()
+                for part, counts in parts.items()
+            },
+            window_length,
+        )
+
+        RegionsExtractor.extract_counted_regions(
+            fasta_in,
+            start_idx,
+            end_idx,
+            window_length,
+            updated["windows"],
+            updated["rloops"],
+            out_pref + "_weight.xlsx",
+        )
+        RegionsThreshold.extract_regions(
+            out_pref + "_weight.xlsx", out_pref + "_weight_shannon.xlsx", True
+        )
+
+        with open(out_pref + "_DICT_SHANNON.xlsx.json", "w") as fout:
+            json.dump(updated_dict, fout)
+
+        GrammarTraining.write_probabilities(
+            probabilities, out_pref + "_probabilities.json"
+        )
+
+        cls.write_statistics(updated, out_pref + STATISTICS_SUFFIX)
+
+        with open(out_pref + CHANGES_SUFFIX, "w") as fout:
+            json.dump(
+                {
+                    "rloops_added": len(rloop_statistics.bed_lines),
+                    "tuples_resolved": sum(len(x) for x in unresolved.values()),
+                    "changed": changes,
+                },
+                fout,
+                indent=4,
+            )
+
+        return changes
+
+
+if __name__ == "__main__":
+    args = vars(ModelUpdate.get_args())
+
+    if args.get("input_statistics", None):
+        with open(args["input_statistics"], "r") as fin:
+            statistics = json.load(fin)
+    else:
+        statistics = ModelUpdate.model_statistics(
+            args.get("input_fasta", None),
+            args.get("input_training_bed", None),
+            args.get("start_index", 0),
+            args.get("end_index", 0),
+            args.get("window_length", 5),
+            args.get("padding", 0),
+        )
+
+    changes = ModelUpdate.update(
+        args.get("input_fasta", None),
+        args.get("input_bed", None),
+        args.get("input_json", None),
+        statistics,
+        args.get("start_index", 0),
+        args.get("end_index", 0),
+        args.get("window_length", 5),
+        args.get("padding", 0),
+        args.get("prefix_output_files", "output"),
+    )
+
+    for change in changes:
+        print(change["region"], change["tuple"], change["old"], "->", change["new"])
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+import collections
+
+"""
+Sequences packed 2 bits per base, with the codes of their k-mers.
+
+A, C, G and T are coded 0 to 3 and packed four to a byte, the first base in the
+highest bits. The k-mer starting at each position is coded by its bases as a
+2k-bit integer, found for the whole sequence with k shifts of the base codes,
+so the windows of any offset and phase are a strided view of one array and the
+window arithmetic of the modules is done on positions. Other characters (N,
+lowercase bases) are kept aside: the k-mers covering them have no code and are
+read as strings, as are the k-mers longer than MAX_KMER_LENGTH.
+"""
+
+BASES = "ACGT"
+MAX_KMER_LENGTH = 31  # codes fit in 62 bits
+NO_CODE = 2**64 - 1  # code of the k-mers covering another character
+
+
+class PackedSequence:
+    def __init__(self, seq):
+        import numpy as np
+
+        raw = np.frombuffer(seq.encode("ascii"), dtype=np.uint8)
+        lookup = np.full(256, len(BASES), dtype=np.uint8)
+        for code, base in enumerate(BASES):
+            lookup[ord(base)] = code
+
+        codes = lookup[raw]
+        self.length = len(seq)
+        self.other_positions = np.flatnonzero(codes == len(BASES))
+        self.other_characters = raw[self.other_positions]
+        codes[self.other_positions] = 0
+
+        quads = np.zeros(-(-self.length // 4) * 4, dtype=np.uint8)
+        quads[: self.length] = codes
+        quads = quads.reshape(-1, 4)
+        self.packed = (quads[:, 0] << 6) | (quads[:, 1] << 4) | (quads[:, 2] << 2)
+        self.packed |= quads[:, 3]
+
+        self.__kmer_codes = dict()
+        self.__kmer_strings = dict()
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        """The bases at index as a string, indexed and sliced as a str."""
+        import numpy as np
+
+        if isinstance(index, int):
+            if index < 0:
+                index += self.length
+            if not 0 <= index < self.length:
+                raise IndexError("sequence index out of range")
+
+            return self[index : index + 1]
+
+        start, stop, step = index.indices(self.length)
+        positions = np.arange(start, stop, step)
+
+        if not len(positions):
+            return ""
+
+        first = positions.min()
+        bases = self.bases(first, positions.max() + 1)
+        characters = np.frombuffer(BASES.encode("ascii"), dtype=np.uint8)[
+            bases[positions - first]
+        ]
+
+        # Put back the other characters in the positions read
+        if len(self.other_positions):
+            others = np.isin(self.other_positions, positions)
+            characters[
+                (self.other_positions[others] - start) // step
+            ] = self.other_characters[others]
+
+        return characters.tobytes().decode("ascii")
+
+    @classmethod
+    def encode(cls, kmer):
+        """Code of a k-mer, None if it has another character than A, C, G, T."""
+        code = 0
+
+        for base in kmer:
+            value = BASES.find(base)
+            if value < 0:
+                return None
+            code = (code << 2) | value
+
+        return code
+
+    @classmethod
+    def decode(cls, code, k):
+        return "".join(BASES[(code >> (2 * (k - 1 - j))) & 3] for j in range(k))
+
+    def bases(self, start=0, stop=None):
+        """Code of the bases from start to stop, 0 for the other characters."""
+        import numpy as np
+
+        stop = self.length if stop is None else stop
+        shifts = np.array([6, 4, 2, 0], dtype=np.uint8)
+        packed = self.packed[start // 4 : -(-stop // 4)]
+
+        return ((packed[:, None] >> shifts) & 3).reshape(-1)[
+            start % 4 : start % 4 + stop - start
+        ]
+
+    def __long_kmers(self, k):
+        # k-mers too long for a code, sliced from the decoded sequence
+        seq = self[:]
+
+        return [seq[i : i + k] for i in range(len(seq) - k + 1)]
+
+    def kmer_codes(self, k):
+        """Code of the k-mer starting at each position, NO_CODE if it covers
+        another character. The array is shared, it must not be modified."""
+        import numpy as np
+
+        if k in self.__kmer_codes:
+            return self.__kmer_codes[k]
+
+        if not 0 < k <= MAX_KMER_LENGTH:
+            raise ValueError(f"k-mers have 1 to {MAX_KMER_LENGTH} bases, not {k}")
+
+        n = max(self.length - k + 1, 0)
+        bases = self.bases().astype(np.uint64)
+        codes = np.zeros(n, dtype=np.uint64)
+
+        for j in range(k):
+            codes = (codes << np.uint64(2)) | bases[j : j + n]
+
+        if len(self.other_positions):
+            others = np.zeros(self.length + 1, dtype=np.int64)
+            others[self.other_positions + 1] = 1
+            others = others.cumsum()
+            codes[others[k : k + n] - others[:n] > 0] = np.uint64(NO_CODE)
+
+        codes.flags.writeable = False
+        self.__kmer_codes[k] = codes
+
+        return codes
+
+    def kmer_strings(self, k):
+        """The k-mer starting at each position, as seq[i:i + k]. Equal k-mers
+        are the same string and the list is shared, it must not be modified."""
+        import numpy as np
+
+        if k in self.__kmer_strings:
+            return self.__kmer_strings[k]
+
+        if k > MAX_KMER_LENGTH:
+            return self.__long_kmers(k)
+
+        codes, inverse = np.unique(self.kmer_codes(k), return_inverse=True)
+        decoded = [self.decode(code, k) for code in codes.tolist()]
+        strings = [decoded[i] for i in inverse.tolist()]
+
+        if codes.size and codes[-1] == np.uint64(NO_CODE):
+            for i in np.flatnonzero(inverse == codes.size - 1).tolist():
+                strings[i] = self[i : i + k]
+
+        self.__kmer_strings[k] = strings
+
+        return strings
+
+    def kmer_counts(self, k):
+        """Occurrences of each k-mer of the sequence."""
+        import numpy as np
+
+        if k > MAX_KMER_LENGTH:
+            return dict(collections.Counter(self.__long_kmers(k)))
+
+        codes, counts = np.unique(self.kmer_codes(k), return_counts=True)
+        kmer_counts = {
+            self.decode(code, k): count
+            for code, count in zip(codes.tolist(), counts.tolist())
+            if code != NO_CODE
+        }
+
+        if codes.size and codes[-1] == np.uint64(NO_CODE):
+            for i in np.flatnonzero(self.kmer_codes(k) == np.uint64(NO_CODE)).tolist():
+                kmer = self[i : i + k]
+                kmer_counts[kmer] = kmer_counts.get(kmer, 0) + 1
+
+        return kmer_counts
+
+    def kmer_values(self, k, values, default=None):
+        """values of the k-mer starting at each position, keyed by the k-mers as
+        strings, default for the k-mers not in values."""
+        import numpy as np
+
+        if k > MAX_KMER_LENGTH:
+            return [values.get(kmer, default) for kmer in self.__long_kmers(k)]
+
+        by_code = dict()
+        for kmer, value in values.items():
+            code = self.encode(kmer) if len(kmer) == k else None
+            if code is not None:
+                by_code[code] = value
+
+        codes = self.kmer_codes(k)
+        kmer_values = [by_code.get(code, default) for code in codes.tolist()]
+
+        for i in np.flatnonzero(codes == np.uint64(NO_CODE)).tolist():
+            kmer_values[i] = values.get(self[i : i + k], default)
+
+        return kmer_values
@@ -3,7 +3,6 @@
 import argparse
 import json
 import enum
-import gmpy2
 
 """
 Script to train a grammar based on a set of  words for R-loops.
@@ -14,6 +13,8 @@ Copyright 2021 Svetlana Poznanovic
 """
 
 def from_gmpy(dct):
+    import gmpy2
+
     for k, v in dct.items():
         if isinstance(v, str):
             n, m = tuple(map(int, v.split("/")))
@@ -194,8 +195,12 @@ class Probabilistic_Language:
 
     @classmethod
     def word_probabilities(cls, words_in, probabs_in, width, out_file="output"):
-        with open(probabs_in, "r", encoding="utf-8") as file_handle:
-            probabilities = json.load(file_handle, object_hook=from_gmpy)
+        # The probabilities may be given already loaded, as from a model bundle
+        if isinstance(probabs_in, dict):
+            probabilities = probabs_in
+        else:
+            with open(probabs_in, "r", encoding="utf-8") as file_handle:
+                probabilities = json.load(file_handle, object_hook=from_gmpy)
 
         with open(words_in, "r", encoding="utf-8") as file:
             lines = file.readlines()
@@ -1,8 +1,11 @@
 #!/usr/bin/env python3
 import argparse
+import bisect
+import collections
 import re
 
-from openpyxl import Workbook, load_workbook
+from rloopgrammar.model.bed_intervals import BedIntervals
+from rloopgrammar.model.packed_sequence import PackedSequence
 
 """
 Script to extract strings around two given indexes of a sequence.
@@ -35,7 +38,13 @@ class RegionsExtractor:
         return x[1].get('weight', 0)
 
     @classmethod
-    def __get_regions(cls, seq, idx, window_length, max_padding=0):
+    def __window(cls, seq, kmers, start, end, window_length):
+        # Windows of window_length nucleotides are the shared k-mers of the sequence, shorter ones are
+        # cut at its ends
+        return kmers[start] if end - start == window_length else seq[start:end]
+
+    @classmethod
+    def __get_regions(cls, seq, kmers, idx, window_length, max_padding=0):
         if max_padding < 0:
             max_padding = 0
 
@@ -46,16 +55,43 @@ class RegionsExtractor:
 
         for i in range(0, max_padding + 1):
             if start - i >= 0:
-                r1.append(seq[start - i:idx - i])
+                r1.append(cls.__window(seq, kmers, start - i, idx - i, window_length))
             if end + i <= len(seq):
-                r2.append(seq[idx + i:end + i])
+                r2.append(cls.__window(seq, kmers, idx + i, end + i, window_length))
+
+        return r1, r2
+
+    @classmethod
+    def __get_shifted_regions(cls, seq, kmers, idx, window_length, shift):
+        # The windows __get_regions pads by exactly shift nucleotides, None if out of the sequence
+        start = idx - window_length if idx - window_length >= 0 else 0
+        end = idx + window_length if idx + window_length <= len(seq) else len(seq)
+
+        r1 = cls.__window(seq, kmers, start - shift, idx - shift, window_length) if start - shift >= 0 else None
+        r2 = cls.__window(seq, kmers, idx + shift, end + shift, window_length) if end + shift <= len(seq) else None
 
         return r1, r2
 
     @classmethod
-    def __add_region_info(cls, regions, key_name, region, seq, start_idx, end_idx):
+    def __gene_counter(cls, seq, start_idx, end_idx, window_length):
+        # Occurrences in the gene of every window of window_length nucleotides, shorter windows are searched
+        gene = seq[start_idx:end_idx]
+        kmer_counts = PackedSequence(gene).kmer_counts(window_length)
+        other_counts = dict()
+
+        def gene_count(region):
+            if len(region) == window_length:
+                return kmer_counts.get(region, 0)
+            if region not in other_counts:
+                other_counts[region] = len(re.findall(r'(?=' + region + r')', gene))
+            return other_counts[region]
+
+        return gene_count
+
+    @classmethod
+    def __add_region_info(cls, regions, key_name, region, seq, start_idx, end_idx, weight=1):
         if region not in regions[key_name].keys():
-            item = {'count': 1,
+            item = {'count': weight,
                     'gene': len(re.findall(r'(?=' + region + r')', seq[start_idx:end_idx]))
                     }
             for i in ['A', 'C', 'G', 'T']:
@@ -63,13 +99,13 @@ class RegionsExtractor:
             regions[key_name][region] = item
             regions[key_name]['unique_wnd'] = regions[key_name].get('unique_wnd', 0) + 1
         else:
-            regions[key_name][region]['count'] = regions[key_name][region].get('count', 0) + 1
+            regions[key_name][region]['count'] = regions[key_name][region].get('count', 0) + weight
 
-        regions[key_name]['total_wnd'] = regions[key_name].get('total_wnd', 0) + 1
+        regions[key_name]['total_wnd'] = regions[key_name].get('total_wnd', 0) + weight
 
         for i in ['A', 'C', 'G', 'T']:
             k = 'count_' + i.lower()
-            regions[key_name][k] = regions[key_name].get(k, 0) + regions[key_name][region].get(k, 0)
+            regions[key_name][k] = regions[key_name].get(k, 0) + weight * regions[key_name][region].get(k, 0)
 
     @classmethod
     def get_args(cls):
@@ -107,72 +143,258 @@ class RegionsExtractor:
         for i in range(num_regions):
             regions['Region ' + str(i + 1)] = dict()
 
+        # Start indexes of the R-loops aligned to the window length
+        rloops = cls.__read_rloops(bed_in, window_length, extra_columns=bed_extra)
+
+        if bed_extra:
+            with open(bed_extra_output or bed_in + '_extra.bed', 'w') as fout:
+                fout.writelines(rloops.lines())
+
+        if not create_weights:
+            return
+
         with open(fasta_in, 'r') as fin:
             fin.readline()
             seq = fin.readline().strip().upper()
 
-        with open(bed_in, 'r') as fin:
-            line = fin.readline()
-            rloops_count = 0
+        kmers = PackedSequence(seq).kmer_strings(window_length)
+        unique_rloops, _ = rloops.collapsed()
 
-            if bed_extra:
-                if not bed_extra_output:
-                    fout = open(bed_in + '_extra.bed', 'w')
-                else:
-                    fout = open(bed_extra_output, 'w')
+        # The windows of duplicate R-loops are counted once, weighted by their multiplicity
+        for idx_1, idx_2, weight in unique_rloops.weighted_coordinates():
+            regions_1, regions_2 = cls.__get_regions(seq, kmers, idx_1, window_length, padding)
+            regions_3, regions_4 = cls.__get_regions(seq, kmers, idx_2, window_length, padding)
+
+            if num_regions == 2:
+                cls.__add_region_info(regions, 'Region 1', regions_1[0] + regions_2[0], seq, start_idx, end_idx,
+                                      weight)
+                cls.__add_region_info(regions, 'Region 2', regions_3[0] + regions_4[0], seq, start_idx, end_idx,
+                                      weight)
+            else:
+                for r in regions_1:
+                    cls.__add_region_info(regions, 'Region 1', r, seq, start_idx, end_idx, weight)
 
-            while line:
-                parts = line.strip().split('\t')
-                idx_1 = int(parts[1])
-                idx_2 = int(parts[2])
+                for r in regions_2:
+                    cls.__add_region_info(regions, 'Region 2', r, seq, start_idx, end_idx, weight)
 
-                if idx_1 > idx_2:
-                    raise AssertionError('First index must be less or equal to second index')
+                for r in regions_3:
+                    cls.__add_region_info(regions, 'Region 3', r, seq, start_idx, end_idx, weight)
 
-                i = 0
-                while ((idx_2 - (idx_1 + i)) % window_length) != 0:  # modify first index in R-loop
-                    if i >= 0:
-                        i += 1
+                for r in regions_4:
+                    cls.__add_region_info(regions, 'Region 4', r, seq, start_idx, end_idx, weight)
 
-                        if (idx_1 - i) < 0:
-                            continue
+        return cls.__write_weights(regions, len(rloops), out_file)
 
-                    i *= -1
+    @classmethod
+    def extract_padded_regions(cls, fasta_in, bed_in, start_idx, end_idx, window_length, paddings, out_files):
+        """Weights of the 4 regions for several paddings in one pass.
 
-                idx_1 += i
+        The windows padded by p are those padded by p - 1 plus the windows shifted by p, so counts
+        are accumulated one shift at a time and written to the out file of each requested padding.
+        """
+        out_files = dict(zip(paddings, out_files))
 
-                if bed_extra:
-                    parts[1] = str(idx_1)
-                    fout.write('\t'.join(parts) + '\n')
+        with open(fasta_in, 'r') as fin:
+            fin.readline()
+            seq = fin.readline().strip().upper()
 
-                regions_1, regions_2 = cls.__get_regions(seq, idx_1, window_length, padding)
-                regions_3, regions_4 = cls.__get_regions(seq, idx_2, window_length, padding)
+        kmers = PackedSequence(seq).kmer_strings(window_length)
+        gene_count = cls.__gene_counter(seq, start_idx, end_idx, window_length)
 
-                if num_regions == 2:
-                    cls.__add_region_info(regions, 'Region 1', regions_1[0] + regions_2[0], seq, start_idx, end_idx)
-                    cls.__add_region_info(regions, 'Region 2', regions_3[0] + regions_4[0], seq, start_idx, end_idx)
-                else:
-                    for r in regions_1:
-                        cls.__add_region_info(regions, 'Region 1', r, seq, start_idx, end_idx)
+        rloops = cls.__read_rloops(bed_in, window_length)
+        unique_rloops, _ = rloops.collapsed()
 
-                    for r in regions_2:
-                        cls.__add_region_info(regions, 'Region 2', r, seq, start_idx, end_idx)
+        counts = [dict() for _ in range(4)]
+        first_seen = [dict() for _ in range(4)]  # (R-loop, shift) where extract_regions would add it
 
-                    for r in regions_3:
-                        cls.__add_region_info(regions, 'Region 3', r, seq, start_idx, end_idx)
+        # Unique R-loops are in the order of their first record, so they are first seen in the same order
+        for shift in range(max(paddings) + 1):
+            for n, (idx_1, idx_2, weight) in enumerate(unique_rloops.weighted_coordinates()):
+                windows = cls.__get_shifted_regions(seq, kmers, idx_1, window_length, shift) + \
+                          cls.__get_shifted_regions(seq, kmers, idx_2, window_length, shift)
 
-                    for r in regions_4:
-                        cls.__add_region_info(regions, 'Region 4', r, seq, start_idx, end_idx)
+                for r, wnd in enumerate(windows):
+                    if wnd is None:
+                        continue
 
-                rloops_count += 1
-                line = fin.readline()
+                    counts[r][wnd] = counts[r].get(wnd, 0) + weight
+                    if wnd not in first_seen[r] or (n, shift) < first_seen[r][wnd]:
+                        first_seen[r][wnd] = (n, shift)
 
-            if bed_extra:
-                fout.close()
+            if shift not in out_files:
+                continue
 
-        if not create_weights:
-            return
+            regions = cls.__counted_regions(counts, first_seen, gene_count)
+            cls.__write_weights(regions, len(rloops), out_files[shift])
+
+        return [out_files[p] for p in paddings]
+
+    @classmethod
+    def extract_fold_regions(cls, fasta_in, bed_lines, start_idx, end_idx, window_length, padding, folds,
+                             out_files):
+        """Weights of the 4 regions of the training sets of a k-fold split.
+
+        folds are the (start, end) ranges of bed_lines held out by each fold. Window counts are additive
+        over R-loops, so the counts of all R-loops are found once and each training set takes the total
+        minus the counts of its held-out R-loops.
+        """
+        with open(fasta_in, 'r') as fin:
+            fin.readline()
+            seq = fin.readline().strip().upper()
+
+        kmers = PackedSequence(seq).kmer_strings(window_length)
+        gene_count = cls.__gene_counter(seq, start_idx, end_idx, window_length)
+        rloops = cls.__read_rloops(bed_lines, window_length)
+        unique_rloops, unique_index = rloops.collapsed()
+
+        contributions = []  # windows of each unique R-loop, by region
+        shifts = []  # shift of each of these windows
+        total_counts = [collections.Counter() for _ in range(4)]
+
+        for idx_1, idx_2, weight in unique_rloops.weighted_coordinates():
+            rloop_windows = [[] for _ in range(4)]
+            rloop_shifts = [[] for _ in range(4)]
+
+            for shift in range(max(padding, 0) + 1):
+                windows = cls.__get_shifted_regions(seq, kmers, idx_1, window_length, shift) + \
+                          cls.__get_shifted_regions(seq, kmers, idx_2, window_length, shift)
+
+                for r, wnd in enumerate(windows):
+                    if wnd is not None:
+                        rloop_windows[r].append(wnd)
+                        rloop_shifts[r].append(shift)
+
+            for r in range(4):
+                total_counts[r].update(cls.__weighted_counts(rloop_windows[r], weight))
+            contributions.append(rloop_windows)
+            shifts.append(rloop_shifts)
+
+        # Folds hold out records, so the occurrences of the windows are kept for every record
+        occurrences = [collections.defaultdict(list) for _ in range(4)]  # sorted (R-loop, shift)
+
+        for n, u in enumerate(unique_index.tolist()):
+            for r in range(4):
+                for wnd, shift in zip(contributions[u][r], shifts[u][r]):
+                    occurrences[r][wnd].append((n, shift))
+
+        for (held_start, held_end), out_file in zip(folds, out_files):
+            counts = [dict() for _ in range(4)]
+            first_seen = [dict() for _ in range(4)]
+            held_rloops = collections.Counter(unique_index[held_start:held_end].tolist())
+
+            for r in range(4):
+                held_out = collections.Counter()
+                for u, weight in held_rloops.items():
+                    held_out.update(cls.__weighted_counts(contributions[u][r], weight))
+
+                for wnd, total in total_counts[r].items():
+                    count = total - held_out[wnd]
+                    if count == 0:
+                        continue
+
+                    # First occurrence outside of the held-out R-loops, as in the training set file
+                    occ = occurrences[r][wnd]
+                    first = occ[0] if occ[0][0] < held_start else occ[bisect.bisect_left(occ, (held_end, -1))]
+
+                    counts[r][wnd] = count
+                    first_seen[r][wnd] = first
+
+            regions = cls.__counted_regions(counts, first_seen, gene_count)
+            cls.__write_weights(regions, len(rloops) - (held_end - held_start), out_file)
+
+        return out_files
 
+    @classmethod
+    def extract_rloop_regions(cls, fasta_in, bed_lines, start_idx, end_idx, window_length, padding):
+        """Windows of the 4 regions of each R-loop, and the number of occurrences of a window in the gene.
+
+        The counts of extract_regions on any multiset of these R-loops are sums of their windows. The windows
+        are found once per unique R-loop, duplicate R-loops share the same lists.
+        """
+        with open(fasta_in, 'r') as fin:
+            fin.readline()
+            seq = fin.readline().strip().upper()
+
+        kmers = PackedSequence(seq).kmer_strings(window_length)
+        unique_rloops, unique_index = cls.__read_rloops(bed_lines, window_length).collapsed()
+        contributions = []
+
+        for idx_1, idx_2 in unique_rloops.coordinates():
+            rloop_windows = [[] for _ in range(4)]
+
+            for shift in range(max(padding, 0) + 1):
+                windows = cls.__get_shifted_regions(seq, kmers, idx_1, window_length, shift) + \
+                          cls.__get_shifted_regions(seq, kmers, idx_2, window_length, shift)
+
+                for r, wnd in enumerate(windows):
+                    if wnd is not None:
+                        rloop_windows[r].append(wnd)
+
+            contributions.append(rloop_windows)
+
+        contributions = [contributions[u] for u in unique_index.tolist()]
+
+        return contributions, cls.__gene_counter(seq, start_idx, end_idx, window_length)
+
+    @classmethod
+    def extract_counted_regions(cls, fasta_in, start_idx, end_idx, window_length, counts, rloops_count, out_file):
+        """Weights of the 4 regions from the counts of their windows, in the order extract_regions adds them."""
+        with open(fasta_in, 'r') as fin:
+            fin.readline()
+            seq = fin.readline().strip().upper()
+
+        gene_count = cls.__gene_counter(seq, start_idx, end_idx, window_length)
+        first_seen = [{wnd: n for n, wnd in enumerate(region_counts)} for region_counts in counts]
+        regions = cls.__counted_regions(counts, first_seen, gene_count)
+
+        return cls.__write_weights(regions, rloops_count, out_file)
+
+    @classmethod
+    def __read_rloops(cls, bed_in, window_length, extra_columns=False):
+        # R-loops of a BED file or of its lines, start indexes aligned to the window length
+        rloops = BedIntervals.read(bed_in, extra_columns)
+
+        if (rloops.starts > rloops.ends).any():
+            raise AssertionError('First index must be less or equal to second index')
+
+        return rloops.aligned(window_length)
+
+    @classmethod
+    def __weighted_counts(cls, windows, weight):
+        # Occurrences of the windows of an R-loop found weight times
+        counts = collections.Counter(windows)
+
+        if weight != 1:
+            for wnd in counts:
+                counts[wnd] *= weight
+
+        return counts
+
+    @classmethod
+    def __counted_regions(cls, counts, first_seen, gene_count):
+        # Same regions as extract_regions, windows in the order extract_regions would add them
+        regions = {}
+
+        for r in range(4):
+            region = regions['Region ' + str(r + 1)] = dict()
+
+            for wnd in sorted(counts[r], key=first_seen[r].get):
+                item = {'count': counts[r][wnd], 'gene': gene_count(wnd)}
+                for i in ['A', 'C', 'G', 'T']:
+                    item['count_' + i.lower()] = wnd.count(i)
+                region[wnd] = item
+
+            if counts[r]:
+                region['unique_wnd'] = len(counts[r])
+                region['total_wnd'] = sum(counts[r].values())
+                for i in ['A', 'C', 'G', 'T']:
+                    k = 'count_' + i.lower()
+                    region[k] = sum(c * wnd.count(i) for wnd, c in counts[r].items())
+
+        return regions
+
+    @classmethod
+    def __write_weights(cls, regions, rloops_count, out_file):
         for r in regions.values():
             for k, v in r.items():
                 if '_' in k:
@@ -182,6 +404,8 @@ class RegionsExtractor:
                 else:
                     v['weight'] = v.get('count', 0) / (v.get('gene', 0) * rloops_count)
 
+        from openpyxl import Workbook
+
         wb = Workbook(write_only=True)
 
         for k, v in regions.items():
@@ -222,6 +446,8 @@ class RegionsExtractor:
 
     @classmethod
     def compare_windows(cls, in_file_small, in_file_large, threshold, window_large):
+        from openpyxl import load_workbook
+
         wb_small = load_workbook(in_file_small)
         wb_large = load_workbook(in_file_large, read_only=True)
 
@@ -3,9 +3,6 @@ import argparse
 import dataclasses
 import math
 
-import openpyxl
-from openpyxl import Workbook, load_workbook
-
 """
 Script to select most important tuples in each region.
 
@@ -33,8 +30,10 @@ along with RegionsThreshold.  If not, see <http://www.gnu.org/licenses/>.
 class RegionsThreshold:
     @classmethod
     def __threshold_weight(cls, xlsx_in, out_file):
+        import openpyxl
+
         wb = openpyxl.load_workbook(xlsx_in, read_only=True)
-        wb_out = Workbook(write_only=True)
+        wb_out = openpyxl.Workbook(write_only=True)
 
         for i, ws_name in enumerate(wb.sheetnames):
             ws_out = wb_out.create_sheet(ws_name)
@@ -53,64 +52,76 @@ class RegionsThreshold:
         wb_out.save(out_file)
 
     @classmethod
-    def __threshold_shannon(cls, xlsx_in, out_file):
-        wb = openpyxl.load_workbook(xlsx_in, read_only=True)
-        wb_out = Workbook(write_only=True)
+    def shannon_rows(cls, rows):
+        # Rows sorted by weight (last column) kept by the Shannon entropy threshold,
+        # with the entropy columns appended
+        count = 1
+        entropy_sum = 0
+        max_weight = 0
+        prev_average_entropy = -math.inf
+        group_same_entropies: dict[float, list[str]] = {}
+
+        for row in rows:
+            weight = float(row[len(row) - 1])
+            if count == 1 or max_weight == 0:
+                max_weight = weight
+
+            rescaled_weight = weight / max_weight
+            entropy = -rescaled_weight * math.log(rescaled_weight, 10)
+
+            # If we find the weight inside of our dictionary, we've already
+            # accounted for it, so we skip this entry.
+
+            if group_same_entropies.get(weight):
+                group_same_entropies[weight].append(row[0])
+                new_row = list(row)
 
-        for i, ws_name in enumerate(wb.sheetnames):
-            count = 1
-            entropy_sum = 0
-            max_weight = 0
-            ws_out = wb_out.create_sheet(ws_name)
-            prev_average_entropy = -math.inf
-            group_same_entropies: dict[float, list[str]] = {}
+                entropy_sum += entropy
+                average_entropy = entropy_sum / count
 
-            for row in wb.worksheets[i].iter_rows(values_only=True):
-                weight = float(row[len(row) - 1])
-                if count == 1 or max_weight == 0:
-                    max_weight = weight
+                new_row.append(entropy)
+                new_row.append(average_entropy)
+                new_row.append(prev_average_entropy)
 
-                rescaled_weight = weight / max_weight
-                entropy = -rescaled_weight * math.log(rescaled_weight, 10)
+                yield new_row
+                prev_average_entropy = average_entropy
+                count += 1
+                continue
+            else:
+                group_same_entropies[weight] = [row[0]]
 
-                # If we find the weight inside of our dictionary, we've already
-                # accounted for it, so we skip this entry.
+            entropy_sum += entropy
+            average_entropy = entropy_sum / count
 
-                if group_same_entropies.get(weight):
-                    group_same_entropies[weight].append(row[0])
-                    new_row = list(row)
+            if average_entropy >= prev_average_entropy:
+                new_row = list(row)
+                new_row.append(entropy)
+                new_row.append(average_entropy)
+                new_row.append(prev_average_entropy)
+                new_row.append(1)
 
-                    entropy_sum += entropy
-                    average_entropy = entropy_sum / count
+                yield new_row
+                prev_average_entropy = average_entropy
+            else:
+                break
 
-                    new_row.append(entropy)
-                    new_row.append(average_entropy)
-                    new_row.append(prev_average_entropy)
+            count += 1
 
-                    ws_out.append(new_row)
-                    prev_average_entropy = average_entropy
-                    count += 1
-                    continue
-                else:
-                    group_same_entropies[weight] = [row[0]]
+    @classmethod
+    def __threshold_shannon(cls, xlsx_in, out_file):
+        import openpyxl
 
-                entropy_sum += entropy
-                average_entropy = entropy_sum / count
+        wb = openpyxl.load_workbook(xlsx_in, read_only=True)
+        wb_out = openpyxl.Workbook(write_only=True)
 
-                if average_entropy >= prev_average_entropy:
-                    new_row = list(row)
-                    new_row.append(entropy)
-                    new_row.append(average_entropy)
-                    new_row.append(prev_average_entropy)
-                    new_row.append(1)
+        for i, ws_name in enumerate(wb.sheetnames):
+            ws_out = wb_out.create_sheet(ws_name)
+            rows = wb.worksheets[i].iter_rows(values_only=True)
 
-                    ws_out.append(new_row)
-                    prev_average_entropy = average_entropy
-                else:
-                    ws_out.close()
-                    break
+            for new_row in cls.shannon_rows(rows):
+                ws_out.append(new_row)
 
-                count += 1
+            ws_out.close()
 
         wb_out.save(out_file)
 
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+import dataclasses
+
+from rloopgrammar.model.packed_sequence import PackedSequence
+
+"""
+Parsing blocks of R-loops, kept as offsets into a shared gene sequence.
+
+Blocks before the R-loop are read from the start of the gene, blocks inside
+and after the R-loop are read backwards from the end of their region, so the
+short block (if any) is the one closest to the start of the gene or R-loop.
+The gene sequence is a str or a PackedSequence, the full blocks of a packed
+sequence are its shared k-mers, and layout gives the blocks as positions.
+"""
+
+
+def forward_blocks(seq, start, end, window_length):
+    for i in range(start, end, window_length):
+        yield seq[i : min(i + window_length, end)]
+
+
+def reverse_blocks(seq, start, end, window_length):
+    for i in range(end, start, -window_length):
+        yield seq[max(i - window_length, start) : i]
+
+
+@dataclasses.dataclass(frozen=True)
+class RLoopBlocks:
+    gene_seq: str
+    start: int  # wrt the gene
+    end: int
+    window_length: int
+
+    def __post_init__(self):
+        if not self.gene_seq:
+            raise AssertionError("Specify a gene sequence")
+        if self.start > self.end:
+            raise AssertionError("Start index must be lower or equal than end index")
+        if len(self.gene_seq) < self.end:
+            raise AssertionError("End index too large")
+
+    # Blocks of the region before the R-loop
+    def r1(self):
+        return self.__read("r1")
+
+    # Blocks of the R-loop
+    def r2_rev(self):
+        return self.__read("r2_rev")
+
+    # Blocks of the region after the R-loop
+    def r3_rev(self):
+        return self.__read("r3_rev")
+
+    def __read(self, block_key):
+        if not isinstance(self.gene_seq, PackedSequence):
+            start, end = self.__bounds(block_key)
+            read_blocks = forward_blocks if block_key == "r1" else reverse_blocks
+
+            return read_blocks(self.gene_seq, start, end, self.window_length)
+
+        full, short = self.layout(block_key)
+        kmers = self.gene_seq.kmer_strings(self.window_length)
+        values = [kmers[i] for i in full]
+
+        if short:
+            values.append(self.gene_seq[short[0] : short[0] + short[1]])
+
+        return values
+
+    def blocks(self, block_key):
+        return getattr(self, block_key)()
+
+    def __bounds(self, block_key):
+        if block_key == "r1":
+            return 0, self.start
+        if block_key == "r2_rev":
+            return self.start, self.end
+
+        return self.end, len(self.gene_seq)
+
+    def num_blocks(self, block_key):
+        start, end = self.__bounds(block_key)
+
+        return -(-(end - start) // self.window_length)
+
+    # Starts of the full blocks of block_key, in the same order as
+    # blocks(block_key), and the short block as (start, length), None if the
+    # region is a multiple of the window length; the short block is read last
+    def layout(self, block_key):
+        start, end = self.__bounds(block_key)
+        short = (end - start) % self.window_length
+
+        if block_key == "r1":
+            full = range(start, end - short, self.window_length)
+            short_start = end - short
+        else:
+            full = range(
+                end - self.window_length, start + short - 1, -self.window_length
+            )
+            short_start = start
+
+        return full, (short_start, short) if short else None
+
+    # The i-th block of block_key, in the same order as blocks(block_key)
+    def block(self, block_key, i):
+        start, end = self.__bounds(block_key)
+        offset = i * self.window_length
+
+        if block_key == "r1":
+            block_start = start + offset
+            block_end = min(block_start + self.window_length, end)
+        else:
+            block_end = end - offset
+            block_start = max(block_end - self.window_length, start)
+
+        if (
+            isinstance(self.gene_seq, PackedSequence)
+            and block_end - block_start == self.window_length
+        ):
+            return self.gene_seq.kmer_strings(self.window_length)[block_start]
+
+        return self.gene_seq[block_start:block_end]
@@ -1,7 +1,6 @@
 #!/usr/bin/env python3
 import argparse
 import json
-import openpyxl
 import random
 
 """
@@ -97,6 +96,8 @@ class UnionDict:
     @classmethod
     # Reads tuples and corresponding weight in each region from the xlsx file
     def __read_xlsx(cls, xlsx_in):
+        import openpyxl
+
         region1_values = dict()
         region2_values = dict()
         region3_values = dict()
@@ -527,78 +528,56 @@ class UnionDict:
             json.dump(intersect_region_dict, fout)
 
     @classmethod
-    # Compute union for input dictionaries
-    def union_json(cls, file_list_in, output_filename, method="stochastic"):
-        with open(file_list_in, "r") as fin:
-            json_in_1 = cls.__read_line_from_input_list(fin)
-            xlsx_in_1 = cls.__read_line_from_input_list(fin)
-            json_in_2 = cls.__read_line_from_input_list(fin)
-            xlsx_in_2 = cls.__read_line_from_input_list(fin)
-
-            print(xlsx_in_1, xlsx_in_2)
-            with open(json_in_1, "r") as fin1, open(json_in_2, "r") as fin2:
-                grammar_dict_1 = json.load(fin1)
-                grammar_dict_2 = json.load(fin2)
-
-            (
-                wb1_r1_values,
-                wb1_r2_values,
-                wb1_r3_values,
-                wb1_r4_values,
-            ) = cls.__read_xlsx(xlsx_in_1)
-            weights_1 = {
-                "r1": wb1_r1_values,
-                "r2": wb1_r2_values,
-                "r3": wb1_r3_values,
-                "r4": wb1_r4_values,
-            }
-            (
-                wb2_r1_values,
-                wb2_r2_values,
-                wb2_r3_values,
-                wb2_r4_values,
-            ) = cls.__read_xlsx(xlsx_in_2)
-            weights_2 = {
-                "r1": wb2_r1_values,
-                "r2": wb2_r2_values,
-                "r3": wb2_r3_values,
-                "r4": wb2_r4_values,
-            }
+    # Compute union for dictionaries given with the weights of their tuples
+    def union_models(cls, models, method="stochastic"):
+        models = iter(models)
+        union_dict, union_dict_weights = next(models)
 
+        for grammar_dict_2, weights_2 in models:
             union_dict, union_dict_weights = cls.__union_json(
-                grammar_dict_1, grammar_dict_2, weights_1, weights_2, method
+                union_dict, grammar_dict_2, union_dict_weights, weights_2, method
             )
-            json_in_2 = cls.__read_line_from_input_list(fin, False)
 
-            while json_in_2:
-                with open(json_in_2, "r") as fin1:
-                    grammar_dict_2 = json.load(fin1)
+        global assignments_made
+        print(json.dumps(assignments_made, indent=4))
+
+        return union_dict
+
+    @classmethod
+    # Compute union for input dictionaries
+    def union_json(cls, file_list_in, output_filename, method="stochastic"):
+        def read_models(fin):
+            json_in = cls.__read_line_from_input_list(fin)
+
+            while json_in:
+                xlsx_in = cls.__read_line_from_input_list(fin)
+                print(xlsx_in)
+
+                with open(json_in, "r") as fin1:
+                    grammar_dict = json.load(fin1)
 
-                xlsx_in_2 = cls.__read_line_from_input_list(fin)
                 (
-                    wb2_r1_values,
-                    wb2_r2_values,
-                    wb2_r3_values,
-                    wb2_r4_values,
-                ) = cls.__read_xlsx(xlsx_in_2)
-                weights_2 = {
-                    "r1": wb2_r1_values,
-                    "r2": wb2_r2_values,
-                    "r3": wb2_r3_values,
-                    "r4": wb2_r4_values,
+                    wb_r1_values,
+                    wb_r2_values,
+                    wb_r3_values,
+                    wb_r4_values,
+                ) = cls.__read_xlsx(xlsx_in)
+                weights = {
+                    "r1": wb_r1_values,
+                    "r2": wb_r2_values,
+                    "r3": wb_r3_values,
+                    "r4": wb_r4_values,
                 }
-                union_dict, union_dict_weights = cls.__union_json(
-                    union_dict, grammar_dict_2, union_dict_weights, weights_2, method
-                )
 
-                json_in_2 = cls.__read_line_from_input_list(fin, False)
+                yield grammar_dict, weights
+                json_in = cls.__read_line_from_input_list(fin, False)
+
+        with open(file_list_in, "r") as fin:
+            union_dict = cls.union_models(read_models(fin), method)
 
         with open(output_filename, "w") as fout:
             json.dump(union_dict, fout)
 
-        global assignments_made
-        print(json.dumps(assignments_made, indent=4))
-
 
 if __name__ == "__main__":
     args = vars(UnionDict.get_args())
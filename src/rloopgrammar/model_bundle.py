@@ -0,0 +1,272 @@
+import argparse
+import configparser
+import functools
+import json
+import os
+import pathlib
+import struct
+import zlib
+
+from typing import *
+
+from rloopgrammar.manifest import run_number
+from rloopgrammar.model.grammar_training import GMPYEncoder
+from rloopgrammar.model.probabilistic_language import from_gmpy
+
+"""
+Single-file bundle of a trained model.
+
+A bundle holds the compiled dictionary table, the transition probabilities,
+exact and as floats, the threshold tables and the build metadata of a run, in
+the run folder under a fixed name. The file starts with a fixed-size preamble
+and a header giving the offset of every section, so opening a bundle reads the
+header only and each section is read the first time it is used.
+"""
+
+BUNDLE_FILENAME = "model.rlgb"
+BUNDLE_MAGIC = b"RLGMODEL"
+BUNDLE_FORMAT_VERSION = 1
+
+# magic, format version, header length
+PREAMBLE = struct.Struct("<8sII")
+
+# Files of the runs of a collection built before bundles, by role, the first
+# suffix found is used
+LEGACY_FILE_SUFFIXES = {
+    "dictionary": ("DICT_SHANNON.xlsx.json",),
+    "probabilities": ("_union_probabilities.json", "_probabilities.json"),
+    "thresholds": ("_weight_shannon.xlsx",),
+    "training_set": (".bed_extra_training-set.bed",),
+}
+
+
+def read_thresholds(xlsx_in) -> Dict[str, Dict[str, float]]:
+    """Weights of the thresholded tuples of each region, as UnionDict reads them."""
+    import openpyxl
+
+    thresholds = dict()
+    wb_regions = openpyxl.load_workbook(xlsx_in, read_only=True)
+
+    for ws_region in wb_regions.worksheets:
+        thresholds[f"r{ws_region.title[-1]}"] = {
+            row[0]: row[7] for row in ws_region.iter_rows(values_only=True)
+        }
+
+    wb_regions.close()
+    return thresholds
+
+
+def symbol_table(grammar_dict) -> Dict[str, Dict[str, str]]:
+    """Symbol of each tuple by region, the first letter GrammarWord finds it in."""
+    table = dict()
+
+    for region in ("region1", "region2_3", "region4"):
+        table[region] = dict()
+
+        for letter, values in grammar_dict.get(region, dict()).items():
+            for val in values:
+                table[region].setdefault(val, letter)
+
+    return table
+
+
+def float_probabilities(probabilities) -> Dict[str, Dict[str, float]]:
+    return {
+        key: {k: float(v) for k, v in values.items()}
+        for key, values in probabilities.items()
+    }
+
+
+def write_bundle(
+    bundle_filename: pathlib.Path,
+    metadata: Dict[str, Any],
+    grammar_dict: Dict[str, Any],
+    probabilities: Dict[str, Any],
+    thresholds: Optional[Dict[str, Dict[str, float]]] = None,
+) -> None:
+    sections = {
+        "dictionary": grammar_dict,
+        "symbols": symbol_table(grammar_dict),
+        "probabilities": probabilities,
+        "float_probabilities": float_probabilities(probabilities),
+    }
+    if thresholds is not None:
+        sections["thresholds"] = thresholds
+
+    offsets = dict()
+    payload = bytearray()
+
+    for name, section in sections.items():
+        encoded = zlib.compress(
+            json.dumps(section, cls=GMPYEncoder, ensure_ascii=False).encode()
+        )
+        offsets[name] = [len(payload), len(encoded)]
+        payload += encoded
+
+    header = json.dumps({"metadata": metadata, "sections": offsets}).encode()
+
+    bundle_filename = pathlib.Path(bundle_filename)
+    temporary_filename = bundle_filename.with_name(
+        f"{bundle_filename.name}.{os.getpid()}"
+    )
+    with open(temporary_filename, "wb") as fout:
+        fout.write(PREAMBLE.pack(BUNDLE_MAGIC, BUNDLE_FORMAT_VERSION, len(header)))
+        fout.write(header)
+        fout.write(payload)
+
+    os.replace(temporary_filename, bundle_filename)
+
+
+def bundle_run(
+    run_folder: pathlib.Path,
+    metadata: Dict[str, Any],
+    files: Dict[str, Any],
+) -> None:
+    """Bundle the model of a run folder from the files of its stages.
+
+    files gives the file of each role, the dictionary and probabilities are
+    required, the thresholds are the weight Shannon XLSX file. Every file is
+    recorded in the metadata relative to the run folder.
+    """
+    run_folder = pathlib.Path(run_folder)
+
+    with open(files["dictionary"], "r") as fin:
+        grammar_dict = json.load(fin)
+
+    with open(files["probabilities"], "r", encoding="utf-8") as fin:
+        probabilities = json.load(fin, object_hook=from_gmpy)
+
+    thresholds = read_thresholds(files["thresholds"]) if "thresholds" in files else None
+
+    metadata = dict(
+        metadata,
+        files={
+            role: os.path.relpath(filename, run_folder)
+            for role, filename in files.items()
+        },
+    )
+
+    write_bundle(
+        run_folder / BUNDLE_FILENAME, metadata, grammar_dict, probabilities, thresholds
+    )
+
+
+class ModelBundle:
+    def __init__(self, bundle_filename: pathlib.Path):
+        self.bundle_filename = pathlib.Path(bundle_filename)
+
+        with open(self.bundle_filename, "rb") as fin:
+            magic, version, header_length = PREAMBLE.unpack(fin.read(PREAMBLE.size))
+
+            if magic != BUNDLE_MAGIC:
+                raise ValueError(f"{self.bundle_filename} is not a model bundle.")
+            if version > BUNDLE_FORMAT_VERSION:
+                raise ValueError(
+                    f"{self.bundle_filename} has format version {version}, "
+                    f"this version reads up to {BUNDLE_FORMAT_VERSION}."
+                )
+
+            header = json.loads(fin.read(header_length))
+
+        self.version = version
+        self.metadata: Dict[str, Any] = header["metadata"]
+        self.sections: Dict[str, List[int]] = header["sections"]
+        self.payload_offset = PREAMBLE.size + header_length
+
+    @classmethod
+    def open(cls, run_folder: pathlib.Path) -> "ModelBundle":
+        bundle_filename = pathlib.Path(run_folder) / BUNDLE_FILENAME
+
+        if not bundle_filename.is_file():
+            raise FileNotFoundError(
+                f"{run_folder} has no model bundle, models built before bundles "
+                "are bundled with: rloop-grammar-bundle-models COLLECTION"
+            )
+
+        return cls(bundle_filename)
+
+    def section(self, name: str, object_hook=None) -> Any:
+        if name not in self.sections:
+            return None
+
+        offset, length = self.sections[name]
+
+        with open(self.bundle_filename, "rb") as fin:
+            fin.seek(self.payload_offset + offset)
+            encoded = fin.read(length)
+
+        return json.loads(zlib.decompress(encoded), object_hook=object_hook)
+
+    def path(self, role: str) -> pathlib.Path:
+        """File of the run with the given role, see bundle_run."""
+        return self.bundle_filename.parent / self.metadata["files"][role]
+
+    @functools.cached_property
+    def grammar_dict(self) -> Dict[str, Any]:
+        return self.section("dictionary")
+
+    @functools.cached_property
+    def symbols(self) -> Dict[str, Dict[str, str]]:
+        return self.section("symbols")
+
+    @functools.cached_property
+    def probabilities(self) -> Dict[str, Any]:
+        return self.section("probabilities", object_hook=from_gmpy)
+
+    @functools.cached_property
+    def float_probabilities(self) -> Dict[str, Dict[str, float]]:
+        return self.section("float_probabilities")
+
+    @functools.cached_property
+    def thresholds(self) -> Optional[Dict[str, Dict[str, float]]]:
+        """None for models without thresholds, as bootstrap and union models."""
+        return self.section("thresholds")
+
+
+def bundle_legacy_run(run_folder: pathlib.Path, metadata: Dict[str, Any]) -> None:
+    run_files = sorted(f.name for f in pathlib.Path(run_folder).iterdir())
+    files = dict()
+
+    for role, suffixes in LEGACY_FILE_SUFFIXES.items():
+        for suffix in suffixes:
+            matches = [name for name in run_files if name.endswith(suffix)]
+
+            if matches:
+                files[role] = pathlib.Path(run_folder) / matches[0]
+                break
+
+    bundle_run(run_folder, metadata, files)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Bundle the runs of a collection built before model bundles."
+    )
+    parser.add_argument("collection_folder")
+    args = parser.parse_args()
+
+    collection_folder = pathlib.Path(args.collection_folder)
+    model_config = configparser.ConfigParser()
+    model_config.read(collection_folder / "model_settings.ini")
+    model_parameters = model_config["Model Parameters"]
+    metadata = {
+        "kind": "legacy",
+        "plasmid": model_parameters.get("Plasmid", model_parameters.get("Plasmids")),
+        "window_length": int(model_parameters["WindowLength"]),
+        "padding_length": int(model_parameters["Padding"]),
+    }
+
+    for run_folder in sorted(collection_folder.iterdir()):
+        run = run_number(run_folder.name)
+
+        if (
+            run_folder.is_dir()
+            and run is not None
+            and not (run_folder / BUNDLE_FILENAME).is_file()
+        ):
+            bundle_legacy_run(run_folder, dict(metadata, run=run))
+            print(f"Bundled {run_folder.name}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,3 @@
-import multiprocessing
 import sys
 import os
 import pathlib
@@ -9,14 +8,19 @@ import argparse
 
 from typing import *
 
-NUMBER_OF_PROCESSES = 10
-
 import rloopgrammar.model.grammar_word as grammar_word
 import rloopgrammar.model.probabilistic_language as probabilistic_language
 import rloopgrammar.model.in_loop_probs as in_loop_probs
+import rloopgrammar.model_bundle as model_bundle
+import rloopgrammar.manifest as manifest
+import rloopgrammar.profiling as profiling
+import rloopgrammar.verify as verify
+import rloopgrammar.stage_metrics as stage_metrics
 
 from rloopgrammar.config_reader import read_plasmids
 from rloopgrammar.config_reader import Plasmid
+from rloopgrammar.scheduler import run_tasks
+from rloopgrammar.checkpoint import is_complete
 
 CONFIG_MODEL_PARAMETER_NAME = "Model Parameters"
 CONFIG_PREDICT_PARAMETER_NAME = "Predict Parameters"
@@ -50,15 +54,51 @@ class PredictionParameters:
     plasmid: Plasmid
     window_length: int
     padding_length: int
+    run_number: int
+
+
+def get_run_folder(pp: PredictionParameters) -> pathlib.Path:
+    return pp.prediction_collection_folder / str(pp.model_folder.parts[-1]).replace(
+        "Model", "Prediction"
+    )
+
+
+def get_all_rloops_bed_file(
+    prediction_collection_folder: pathlib.Path, plasmid: Plasmid, window_length: int
+) -> pathlib.Path:
+    return (
+        prediction_collection_folder / f"{plasmid.name}_w{window_length}_all_rloops.bed"
+    )
+
+
+def write_all_rloops(
+    plasmid: Plasmid, window_length: int, bed_filename: pathlib.Path
+) -> int:
+    """Write every R-loop the models score on the gene, returns their number."""
+    rloops = 0
+
+    with open(bed_filename, "w") as file_handle:
+        for x in range(
+            plasmid.gene_start + window_length,
+            plasmid.gene_end - 2 * window_length,
+        ):
+            for y in range(x + window_length, plasmid.gene_end - window_length):
+                if (y - x) % window_length == 0:
+                    file_handle.write(f"{plasmid.name}\t{x}\t{y}\n")
+                    rloops += 1
+
+    return rloops
+
 
+def get_collection_folder(pp: PredictionParameters) -> pathlib.Path:
+    return pp.prediction_collection_folder
 
-def do_prediction(pp: PredictionParameters) -> None:
+
+def do_prediction(pp: PredictionParameters) -> manifest.RunRecord:
     plot_region = pp.plasmid.gene_start + pp.plasmid.gene_end
     print(pp.plasmid.gene_start, pp.plasmid.gene_end, plot_region)
 
-    run_folder = pp.prediction_collection_folder / str(
-        pp.model_folder.parts[-1]
-    ).replace("Model", "Prediction")
+    run_folder = get_run_folder(pp)
 
     try:
         os.mkdir(run_folder)
@@ -69,25 +109,16 @@ def do_prediction(pp: PredictionParameters) -> None:
         filename=pp.prediction_collection_folder / "prediction_log.txt",
         format=f"%(asctime)s [{pp.model_folder.parts[-1][-1]}] - %(message)s",
         level=logging.DEBUG,
+        force=True,
     )
 
     logger = logging.getLogger("r-loop_grammar")
     logger.info(dataclasses.asdict(pp))
 
-    model_files = next(os.walk(pp.model_folder))[2]
-
-    model_files_find = lambda y: list(filter(lambda x: y in x, model_files))[0]
-
-    all_rloops_bed_filename = (
-        pp.prediction_collection_folder
-        / f"{pp.plasmid.name}_w{pp.window_length}_all_rloops.bed"
-    )
+    bundle = model_bundle.ModelBundle.open(pp.model_folder)
 
-    dict_shannon_json_filename = str(
-        pp.model_folder / model_files_find("DICT_SHANNON.xlsx.json")
-    )
-    probabilities_filename = str(
-        pp.model_folder / model_files_find("probabilities.json")
+    all_rloops_bed_filename = get_all_rloops_bed_file(
+        pp.prediction_collection_folder, pp.plasmid, pp.window_length
     )
 
     all_rloops_filename = str(
@@ -104,30 +135,36 @@ def do_prediction(pp: PredictionParameters) -> None:
         / f"{pp.plasmid.name}_SHANNON_p{pp.padding_length}_w{pp.window_length}_base_in_loop"
     )
 
+    metrics = stage_metrics.RunMetrics()
+
     logger.info("Finding word probabilities.")
 
     logger.info("Extracting all words.")
-    grammar_word.GrammarWord.extract_word(
-        pp.plasmid.fasta_file,
-        all_rloops_bed_filename,
-        dict_shannon_json_filename,
-        pp.plasmid.gene_start,
-        pp.plasmid.gene_end,
-        pp.window_length,
-        str(all_rloops_filename),
-    )
+    with metrics.stage("words", [pp.plasmid.fasta_file, all_rloops_bed_filename]):
+        grammar_word.GrammarWord.extract_word(
+            pp.plasmid.fasta_file,
+            all_rloops_bed_filename,
+            bundle.grammar_dict,
+            pp.plasmid.gene_start,
+            pp.plasmid.gene_end,
+            pp.window_length,
+            str(all_rloops_filename),
+        )
 
     # with SupressOutput():
-    probabilistic_language.Probabilistic_Language.word_probabilities(
-        all_rloops_filename,
-        probabilities_filename,
-        pp.window_length,
-        str(prob_lang_filename),
-    )
+    with metrics.stage("word_probabilities", [all_rloops_filename]):
+        probabilistic_language.Probabilistic_Language.word_probabilities(
+            all_rloops_filename,
+            bundle.probabilities,
+            pp.window_length,
+            str(prob_lang_filename),
+        )
 
     logger.info("In loop probabilities.")
 
-    with SupressOutput():
+    with SupressOutput(), metrics.stage(
+        "in_loop", [all_rloops_filename, prob_lang_filename]
+    ):
         in_loop_probs.Loop_probabilities.in_loop_probabilities(
             all_rloops_filename,
             all_rloops_bed_filename,
@@ -139,22 +176,85 @@ def do_prediction(pp: PredictionParameters) -> None:
             str(base_in_loop_no_xlsx),
         )
 
+    metrics.write(run_folder / stage_metrics.RUN_METRICS_FILENAME)
+
+    run_record = manifest.complete_run(
+        run_folder,
+        pp.run_number,
+        dict(
+            model=str(pp.model_folder),
+            plasmid=pp.plasmid.name,
+            window_length=pp.window_length,
+            padding_length=pp.padding_length,
+        ),
+        dict(
+            words=all_rloops_filename,
+            word_probabilities=prob_lang_filename,
+            base_in_loop=base_in_loop_no_xlsx + ".XLSX",
+            stats=base_in_loop_no_xlsx + "_stats.json",
+            metrics=run_folder / stage_metrics.RUN_METRICS_FILENAME,
+        ),
+    )
+    logger.info("Prediction complete.")
+
+    return run_record
+
+
+def prediction_cost(pp: PredictionParameters) -> float:
+    return os.path.getsize(
+        get_all_rloops_bed_file(
+            pp.prediction_collection_folder, pp.plasmid, pp.window_length
+        )
+    )
+
 
 parser = argparse.ArgumentParser(prog=PROGRAM_NAME, description=DESCRIPTION)
 parser.add_argument("output_folder")
 parser.add_argument("-i", "--input_folder", type=str)
+parser.add_argument("--ini_file", type=str)
 parser.add_argument("--plasmids", type=str, nargs="+")
+parser.add_argument(
+    "--resume",
+    action="store_true",
+    help="Reuse the output folders and only run the predictions that did not complete.",
+)
+parser.add_argument(
+    "-j",
+    "--processes",
+    type=int,
+    default=None,
+    help="Number of worker processes, sized to the machine by default.",
+)
+parser.add_argument(
+    "--verify",
+    type=float,
+    default=None,
+    metavar="FRACTION",
+    help="Check a fraction of the runs against the reference pipeline.",
+)
+parser.add_argument(
+    "--profile",
+    action="store_true",
+    help="Write cProfile statistics of every stage to the collection profile folder.",
+)
+parser.add_argument(
+    "--profile_memory",
+    action="store_true",
+    help="With --profile, also write tracemalloc snapshots at the end of every stage.",
+)
 
 
 def main() -> None:
     args = parser.parse_args()
+    profiler = profiling.Profiler(args.profile_memory) if args.profile else None
 
-    plasmids = read_plasmids()
+    plasmids = read_plasmids(args.ini_file)
 
     model_collection_folder = pathlib.Path(args.input_folder)
     predict_plasmid_names = args.plasmids
 
-    model_folders = [x[1] for x in os.walk(model_collection_folder)][0]
+    model_manifest = manifest.Manifest.load(model_collection_folder)
+    model_folders = model_manifest.finished_runs()
 
     model_config = configparser.ConfigParser()
     model_config.read(model_collection_folder / "model_settings.ini")
@@ -167,9 +267,11 @@ def main() -> None:
         list(filter(lambda x: x.name == k, plasmids))[0] for k in predict_plasmid_names
     ]
 
-    for plasmid in predict_plasmids:
-        runs = []
+    runs: list[PredictionParameters] = []
+    collection_parameters: Dict[pathlib.Path, Dict[str, Any]] = {}
+    collection_metrics: Dict[pathlib.Path, stage_metrics.RunMetrics] = {}
 
+    for plasmid in predict_plasmids:
         prediction_folder = build_output_folder_name(
             args.output_folder,
             original_plasmid=original_plasmid,
@@ -178,20 +280,26 @@ def main() -> None:
             width=window_length,
             number_of_models=len(model_folders),
         )
-        os.mkdir(prediction_folder)
-
-        all_rloops_bed_filename = (
-            prediction_folder / f"{plasmid.name}_w{window_length}_all_rloops.bed"
+        if not (args.resume and prediction_folder.is_dir()):
+            os.mkdir(prediction_folder)
+
+        collection_parameters[prediction_folder] = dict(
+            model_folder=str(model_collection_folder),
+            plasmid=plasmid.name,
+            window_length=window_length,
+            padding_length=padding,
         )
 
-        with open(all_rloops_bed_filename, "w") as file_handle:
-            for x in range(
-                plasmid.gene_start + window_length,
-                plasmid.gene_end - 2 * window_length,
-            ):
-                for y in range(x + window_length, plasmid.gene_end - window_length):
-                    if (y - x) % window_length == 0:
-                        file_handle.write(f"{plasmid.name}\t{x}\t{y}\n")
+        collection_metrics[prediction_folder] = stage_metrics.RunMetrics()
+
+        with profiling.session(profiler, prediction_folder), collection_metrics[
+            prediction_folder
+        ].stage("candidates") as measured:
+            measured.counters["rloops"] = write_all_rloops(
+                plasmid,
+                window_length,
+                get_all_rloops_bed_file(prediction_folder, plasmid, window_length),
+            )
 
         for model_folder in model_folders:
             relative_path_model_folder = model_collection_folder / model_folder
@@ -203,11 +311,49 @@ def main() -> None:
                     plasmid,
                     window_length,
                     padding,
+                    model_manifest.run_number(model_folder),
                 )
             )
 
-        with multiprocessing.Pool(NUMBER_OF_PROCESSES) as pool:
-            pool.map(do_prediction, runs)
+    if args.resume:
+        runs = [pp for pp in runs if not is_complete(get_run_folder(pp))]
+        print(f"Resuming {len(runs)} incomplete predictions.")
+
+    manifests = [
+        manifest.Manifest.create(
+            prediction_folder,
+            "prediction",
+            parameters,
+            [
+                (get_run_folder(pp), pp.run_number)
+                for pp in runs
+                if pp.prediction_collection_folder == prediction_folder
+            ],
+        )
+        for prediction_folder, parameters in collection_parameters.items()
+    ]
+
+    run_tasks(
+        profiling.profiled(do_prediction, get_collection_folder, profiler),
+        runs,
+        cost=prediction_cost,
+        processes=args.processes,
+        on_result=manifest.recorder(manifests),
+    )
+
+    for collection_manifest in manifests:
+        stage_metrics.write_collection_metrics(
+            collection_manifest,
+            collection_metrics[collection_manifest.collection_folder],
+        )
+
+    if args.verify and not verify.verify_collections(
+        [collection_manifest.collection_folder for collection_manifest in manifests],
+        plasmids,
+        sample=args.verify,
+        processes=args.processes,
+    ):
+        sys.exit(1)
 
 
 if __name__ == "__main__":
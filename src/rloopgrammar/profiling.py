@@ -0,0 +1,326 @@
+import argparse
+import cProfile
+import collections
+import contextlib
+import dataclasses
+import io
+import multiprocessing
+import os
+import pathlib
+import pstats
+import time
+import tracemalloc
+
+from typing import *
+
+"""
+Profiling of the runs of a collection.
+
+With --profile, every process running a collection profiles each stage of its
+runs with its own cProfile profiler, and the code outside the stages under the
+"task" stage, so the time of a stage is not counted twice. The statistics are
+accumulated over the tasks of a worker and written to the profile folder of the
+collection, one file by process and stage, with optional tracemalloc snapshots
+at the end of every stage. rloop-grammar-merge-profiles combines them into a
+single report of the hot paths of the collection.
+
+The snapshots are taken with no profiler enabled and filtered when merged, and
+their time is reported by overhead so the stage metrics leave it out.
+"""
+
+PROFILE_FOLDER = "profile"
+PROFILE_REPORT_FILENAME = "profile_report.txt"
+MERGED_PROFILE_FILENAME = "profile.prof"
+
+PROFILE_SUFFIX = ".prof"
+SNAPSHOT_SUFFIX = ".tracemalloc"
+
+TASK_STAGE = "task"  # code outside the stages of a run
+TOP_ENTRIES = 30
+
+SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+)
+
+
+@dataclasses.dataclass
+class Profiler:
+    trace_memory: bool = False
+
+
+class Session:
+    """Profilers of the stages run by a process, by profile folder and stage."""
+
+    def __init__(self, trace_memory: bool):
+        self.pid = os.getpid()
+        self.name = f"{multiprocessing.current_process().name}-{self.pid}"
+        self.trace_memory = trace_memory
+        self.profiles: Dict[Tuple[pathlib.Path, str], cProfile.Profile] = {}
+        self.snapshots: Dict[Tuple[pathlib.Path, str], int] = {}
+        self.folder: Optional[pathlib.Path] = None
+        self.active: Optional[cProfile.Profile] = None
+        self.overhead = (0.0, 0.0)  # wall and CPU seconds spent in snapshots
+
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def switch(
+        self, profile: Optional[cProfile.Profile]
+    ) -> Optional[cProfile.Profile]:
+        """Profile with profile only, returns the profiler it replaces."""
+        previous = self.active
+
+        if previous is not None:
+            previous.disable()
+        if profile is not None:
+            profile.enable()
+
+        self.active = profile
+        return previous
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        key = (self.folder, name)
+        previous = self.switch(self.profiles.setdefault(key, cProfile.Profile()))
+
+        try:
+            yield
+        finally:
+            # The snapshot is not charged to the stage nor to the enclosing one
+            self.switch(None)
+
+            if self.trace_memory:
+                self.snapshot(name)
+
+            self.switch(previous)
+
+    def snapshot(self, name: str) -> None:
+        wall_time, cpu_time = time.perf_counter(), time.process_time()
+        key = (self.folder, name)
+        self.snapshots[key] = self.snapshots.get(key, 0) + 1
+
+        tracemalloc.take_snapshot().dump(
+            str(
+                self.folder
+                / f"{self.name}.{name}.{self.snapshots[key]}{SNAPSHOT_SUFFIX}"
+            )
+        )
+
+        self.overhead = (
+            self.overhead[0] + time.perf_counter() - wall_time,
+            self.overhead[1] + time.process_time() - cpu_time,
+        )
+
+    @contextlib.contextmanager
+    def collection(self, folder: pathlib.Path) -> Iterator[None]:
+        folder.mkdir(parents=True, exist_ok=True)
+        previous, self.folder = self.folder, folder
+
+        try:
+            with self.stage(TASK_STAGE):
+                yield
+        finally:
+            self.dump(folder)
+            self.folder = previous
+
+    def dump(self, folder: pathlib.Path) -> None:
+        """Write the statistics accumulated so far for a profile folder."""
+        for (profile_folder, name), profile in self.profiles.items():
+            if profile_folder == folder and profile is not self.active:
+                profile.dump_stats(folder / f"{self.name}.{name}{PROFILE_SUFFIX}")
+
+
+_session: Optional[Session] = None
+
+
+@contextlib.contextmanager
+def session(
+    profiler: Optional[Profiler], collection_folder: pathlib.Path
+) -> Iterator[None]:
+    """Profile the stages run in the block into the folder of a collection.
+
+    Does nothing without a profiler.
+    """
+    global _session
+
+    if profiler is None:
+        yield
+        return
+
+    # a forked worker starts its own statistics
+    if _session is None or _session.pid != os.getpid():
+        _session = Session(profiler.trace_memory)
+
+    with _session.collection(pathlib.Path(collection_folder) / PROFILE_FOLDER):
+        yield
+
+
+@contextlib.contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Profile a stage on its own, in the session of the process if any."""
+    if _session is None or _session.pid != os.getpid() or _session.folder is None:
+        yield
+        return
+
+    with _session.stage(name):
+        yield
+
+
+def overhead() -> Tuple[float, float]:
+    """Wall and CPU seconds the process has spent on memory snapshots."""
+    if _session is None or _session.pid != os.getpid():
+        return 0.0, 0.0
+
+    return _session.overhead
+
+
+class ProfiledTask:
+    """Worker function profiled in the collection of each of its tasks."""
+
+    def __init__(
+        self,
+        function: Callable[[Any], Any],
+        collection_folder: Callable[[Any], pathlib.Path],
+        profiler: Profiler,
+    ):
+        self.function = function
+        self.collection_folder = collection_folder
+        self.profiler = profiler
+
+    def __call__(self, task: Any) -> Any:
+        with session(self.profiler, self.collection_folder(task)):
+            return self.function(task)
+
+
+def profiled(
+    function: Callable[[Any], Any],
+    collection_folder: Callable[[Any], pathlib.Path],
+    profiler: Optional[Profiler],
+) -> Callable[[Any], Any]:
+    """Worker function for run_tasks, profiled if there is a profiler.
+
+    collection_folder gives the collection of a task, it must be picklable as
+    the function.
+    """
+    if profiler is None:
+        return function
+
+    return ProfiledTask(function, collection_folder, profiler)
+
+
+def file_stage(filename: pathlib.Path) -> str:
+    # PROCESS-PID.STAGE.prof or PROCESS-PID.STAGE.N.tracemalloc
+    return filename.name.split(".")[1]
+
+
+def memory_report(snapshot_filenames: List[pathlib.Path], top: int) -> str:
+    """Largest allocation sites of a stage, at their peak over the snapshots."""
+    sizes: Dict[str, int] = collections.defaultdict(int)
+    counts: Dict[str, int] = collections.defaultdict(int)
+
+    for filename in snapshot_filenames:
+        snapshot = tracemalloc.Snapshot.load(str(filename))
+        snapshot = snapshot.filter_traces(SNAPSHOT_FILTERS)
+
+        for statistic in snapshot.statistics("lineno"):
+            site = str(statistic.traceback[0])
+
+            if statistic.size > sizes[site]:
+                sizes[site] = statistic.size
+                counts[site] = statistic.count
+
+    lines = [f"{'KiB':>12} {'blocks':>10}  allocation site"]
+    for site, size in sorted(sizes.items(), key=lambda x: x[1], reverse=True)[:top]:
+        lines.append(f"{size / 1024:>12.1f} {counts[site]:>10}  {site}")
+
+    return "\n".join(lines) + "\n"
+
+
+def merge_profiles(
+    collection_folder: pathlib.Path, top: int = TOP_ENTRIES
+) -> pathlib.Path:
+    """Combine the profiles of a collection into a report of its hot paths.
+
+    The merged statistics are also written for pstats and profile viewers.
+    """
+    collection_folder = pathlib.Path(collection_folder)
+    profile_folder = collection_folder / PROFILE_FOLDER
+
+    profile_filenames = sorted(profile_folder.glob(f"*{PROFILE_SUFFIX}"))
+    snapshot_filenames = sorted(profile_folder.glob(f"*{SNAPSHOT_SUFFIX}"))
+
+    if not profile_filenames:
+        raise FileNotFoundError(
+            f"{collection_folder} has no profiles, collections are profiled with "
+            "--profile"
+        )
+
+    by_stage: Dict[str, List[pathlib.Path]] = collections.defaultdict(list)
+    for filename in profile_filenames:
+        by_stage[file_stage(filename)].append(filename)
+
+    processes = {filename.name.split(".")[0] for filename in profile_filenames}
+    report = io.StringIO()
+    report.write(
+        f"Profiles of {collection_folder}: {len(by_stage)} stages "
+        f"in {len(processes)} processes.\n\n"
+    )
+
+    merged = pstats.Stats(*map(str, profile_filenames), stream=report)
+    merged.dump_stats(collection_folder / MERGED_PROFILE_FILENAME)
+    merged.strip_dirs()
+
+    report.write("== All stages, by cumulative time ==\n")
+    merged.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+    report.write("== All stages, by internal time ==\n")
+    merged.sort_stats(pstats.SortKey.TIME).print_stats(top)
+
+    stage_times = {
+        name: pstats.Stats(*map(str, filenames), stream=report)
+        for name, filenames in by_stage.items()
+    }
+
+    for name, stats in sorted(
+        stage_times.items(), key=lambda x: x[1].total_tt, reverse=True
+    ):
+        report.write(f"== Stage {name}, by internal time ==\n")
+        stats.strip_dirs().sort_stats(pstats.SortKey.TIME).print_stats(top)
+
+    snapshots_by_stage: Dict[str, List[pathlib.Path]] = collections.defaultdict(list)
+    for filename in snapshot_filenames:
+        snapshots_by_stage[file_stage(filename)].append(filename)
+
+    for name, filenames in sorted(snapshots_by_stage.items()):
+        report.write(f"== Stage {name}, memory at the end of the stage ==\n")
+        report.write(memory_report(filenames, top))
+        report.write("\n")
+
+    report_filename = collection_folder / PROFILE_REPORT_FILENAME
+    with open(report_filename, "w") as fout:
+        fout.write(report.getvalue())
+
+    return report_filename
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Merge the profiles of collections run with --profile."
+    )
+    parser.add_argument("collection_folders", nargs="+")
+    parser.add_argument(
+        "-n",
+        "--top",
+        type=int,
+        default=TOP_ENTRIES,
+        help="Number of functions and allocation sites listed in each section.",
+    )
+    args = parser.parse_args()
+
+    for collection_folder in args.collection_folders:
+        print(f"Wrote {merge_profiles(collection_folder, args.top)}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+"""
+Frozen copy of the model stages as first published, one R-loop record and one
+string at a time, the reference of rloopgrammar.verify.
+
+The modules of rloopgrammar.model are optimized in place and these are not:
+they are only changed to fix a bug found in both, so that a change of the model
+modules shows as a divergence of the runs they build.
+"""
@@ -0,0 +1,88 @@
+import multiprocessing
+import os
+
+from typing import *
+
+"""
+Scheduling of the independent runs of a model collection.
+
+The pool is sized to the cores the process may use and to the memory currently
+available, and tasks are submitted largest first so that a long run does not
+start last and leave the other workers idle.
+"""
+
+DEFAULT_TASK_MEMORY = 1 << 30  # bytes, rough peak of a single model build
+
+
+def available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def available_memory() -> Optional[int]:
+    try:
+        with open("/proc/meminfo", "r") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def number_of_workers(
+    number_of_tasks: int,
+    task_memory: int = DEFAULT_TASK_MEMORY,
+    processes: Optional[int] = None,
+) -> int:
+    if processes:
+        return max(1, min(processes, number_of_tasks))
+
+    workers = available_cores()
+    memory = available_memory()
+
+    if memory is not None:
+        workers = min(workers, memory // task_memory)
+
+    return max(1, min(workers, number_of_tasks))
+
+
+def run_tasks(
+    function: Callable[[Any], Any],
+    tasks: Iterable[Any],
+    cost: Optional[Callable[[Any], float]] = None,
+    task_memory: int = DEFAULT_TASK_MEMORY,
+    processes: Optional[int] = None,
+    on_result: Optional[Callable[[Any], None]] = None,
+) -> List[Any]:
+    """Run function over tasks in a pool, largest cost first.
+
+    Results are returned in completion order, and passed to on_result in the
+    calling process as each task completes.
+    """
+    tasks = list(tasks)
+
+    if not tasks:
+        return []
+
+    if cost is not None:
+        tasks.sort(key=cost, reverse=True)
+
+    workers = number_of_workers(len(tasks), task_memory, processes)
+
+    results = []
+
+    with multiprocessing.Pool(workers) as pool:
+        for result in pool.imap_unordered(function, tasks, chunksize=1):
+            if on_result is not None:
+                on_result(result)
+
+            results.append(result)
+
+    return results
@@ -0,0 +1,121 @@
+import dataclasses
+import hashlib
+import inspect
+import json
+import os
+import pathlib
+import shutil
+import tempfile
+
+from typing import *
+
+"""
+Content-addressed cache for the stages of a model build.
+
+A stage is keyed by its name, the source code of the modules it runs, its
+parameters and the content of its input files. Files produced by a stage are
+addressed by the key of that stage rather than by their bytes, since XLSX files
+embed timestamps and would never hash the same twice.
+"""
+
+CACHE_FORMAT_VERSION = 1
+
+
+def file_digest(filename) -> str:
+    digest = hashlib.sha256()
+
+    with open(filename, "rb") as file_handle:
+        for chunk in iter(lambda: file_handle.read(1 << 20), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+@dataclasses.dataclass
+class Stage:
+    name: str
+    inputs: List[str]
+    outputs: List[str]
+    parameters: Dict[str, Any]
+    code: List[Any]  # modules whose source code the stage depends on
+
+
+class StageCache:
+    def __init__(self, cache_folder: Optional[pathlib.Path]):
+        self.cache_folder = pathlib.Path(cache_folder) if cache_folder else None
+        self.addresses: Dict[str, str] = {}
+        self.code_digests: Dict[str, str] = {}
+
+    def __code_digest(self, module) -> str:
+        source_file = inspect.getsourcefile(module)
+
+        if source_file not in self.code_digests:
+            self.code_digests[source_file] = file_digest(source_file)
+
+        return self.code_digests[source_file]
+
+    def __input_address(self, filename) -> str:
+        filename = str(filename)
+
+        if filename not in self.addresses:
+            self.addresses[filename] = file_digest(filename)
+
+        return self.addresses[filename]
+
+    def key(self, stage: Stage) -> str:
+        description = {
+            "version": CACHE_FORMAT_VERSION,
+            "name": stage.name,
+            "code": [self.__code_digest(m) for m in stage.code],
+            "parameters": stage.parameters,
+            "inputs": [self.__input_address(f) for f in stage.inputs],
+        }
+        encoded = json.dumps(description, sort_keys=True, default=str).encode()
+
+        return hashlib.sha256(encoded).hexdigest()
+
+    def run(self, stage: Stage, function: Callable[[], Any]) -> bool:
+        """Run function to produce the outputs of stage, unless they are cached.
+
+        Returns True if the outputs were restored from the cache.
+        """
+        if self.cache_folder is None:
+            function()
+            return False
+
+        key = self.key(stage)
+        artifact_folder = self.cache_folder / key[:2] / key
+        artifact_names = [
+            f"{n}_{pathlib.Path(f).name}" for n, f in enumerate(stage.outputs)
+        ]
+
+        cached = artifact_folder.is_dir() and all(
+            (artifact_folder / name).is_file() for name in artifact_names
+        )
+
+        if cached:
+            for name, output in zip(artifact_names, stage.outputs):
+                shutil.copyfile(artifact_folder / name, output)
+        else:
+            function()
+            self.__store(artifact_folder, artifact_names, stage.outputs)
+
+        for n, output in enumerate(stage.outputs):
+            self.addresses[str(output)] = f"{key}:{n}"
+
+        return cached
+
+    def __store(self, artifact_folder, artifact_names, outputs) -> None:
+        artifact_folder.parent.mkdir(parents=True, exist_ok=True)
+        temporary_folder = pathlib.Path(
+            tempfile.mkdtemp(dir=artifact_folder.parent, prefix=".tmp_")
+        )
+
+        for name, output in zip(artifact_names, outputs):
+            shutil.copyfile(output, temporary_folder / name)
+
+        try:
+            os.rename(temporary_folder, artifact_folder)
+        except OSError:
+            # Another worker stored the same artifact first
+            shutil.rmtree(temporary_folder, ignore_errors=True)
@@ -0,0 +1,181 @@
+import contextlib
+import dataclasses
+import json
+import os
+import pathlib
+import sys
+import time
+
+from typing import *
+
+import rloopgrammar.profiling as profiling
+
+from rloopgrammar.manifest import Manifest
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+"""
+Time and resource metrics of the stages of a run.
+
+Each stage records its wall and CPU time, the peak resident memory of the
+process when it ends, the size of its input files, whether it was restored from
+the stage cache and counters of its own. A run writes its stages next to its
+artifacts, and the runs of a collection are rolled up in a summary per stage.
+The stages are also the stages profiled with --profile, see profiling.
+"""
+
+RUN_METRICS_FILENAME = "metrics.json"
+COLLECTION_METRICS_FILENAME = "metrics_summary.json"
+
+SLOWEST_RUNS = 5
+
+
+def peak_rss() -> Optional[int]:
+    """Peak resident memory of the process so far, in bytes."""
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # kilobytes, except on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def input_size(filenames: Iterable[Any]) -> int:
+    return sum(os.path.getsize(f) for f in filenames if os.path.isfile(f))
+
+
+@dataclasses.dataclass
+class StageMetrics:
+    name: str
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+    peak_rss: Optional[int] = None
+    input_bytes: int = 0
+    cached: bool = False
+    counters: Dict[str, int] = dataclasses.field(default_factory=dict)
+
+
+class RunMetrics:
+    def __init__(self):
+        self.stages: List[StageMetrics] = []
+        self.current: Optional[StageMetrics] = None
+
+    @contextlib.contextmanager
+    def stage(self, name: str, inputs: Iterable[Any] = ()) -> Iterator[StageMetrics]:
+        metrics = StageMetrics(name, input_bytes=input_size(inputs))
+        wall_time, cpu_time = time.perf_counter(), time.process_time()
+        overhead = profiling.overhead()
+        self.current = metrics
+
+        try:
+            with profiling.stage(name):
+                yield metrics
+        finally:
+            # Without the time of the memory snapshots taken with --profile_memory
+            wall_overhead, cpu_overhead = (
+                end - start for end, start in zip(profiling.overhead(), overhead)
+            )
+            metrics.wall_time = time.perf_counter() - wall_time - wall_overhead
+            metrics.cpu_time = time.process_time() - cpu_time - cpu_overhead
+            metrics.peak_rss = peak_rss()
+            self.current = None
+            self.stages.append(metrics)
+
+    def count(self, counters: Dict[str, int]) -> None:
+        """Add to the counters of the running stage."""
+        for key, value in counters.items():
+            self.current.counters[key] = self.current.counters.get(key, 0) + value
+
+    def as_dict(self) -> Dict[str, Any]:
+        peaks = [s.peak_rss for s in self.stages if s.peak_rss is not None]
+
+        return {
+            "wall_time": sum(s.wall_time for s in self.stages),
+            "cpu_time": sum(s.cpu_time for s in self.stages),
+            "peak_rss": max(peaks) if peaks else None,
+            "stages": [dataclasses.asdict(s) for s in self.stages],
+        }
+
+    def write(self, metrics_filename: pathlib.Path) -> None:
+        with open(metrics_filename, "w") as fout:
+            json.dump(self.as_dict(), fout, indent=1)
+
+
+def summarize(
+    runs: Dict[str, Dict[str, Any]],
+    collection_metrics: Optional[RunMetrics] = None,
+) -> Dict[str, Any]:
+    """Roll up the metrics of the runs of a collection by stage."""
+    stages: Dict[str, Dict[str, Any]] = {}
+
+    for run in runs.values():
+        for metrics in run["stages"]:
+            summary = stages.setdefault(
+                metrics["name"],
+                {
+                    "runs": 0,
+                    "wall_time": 0.0,
+                    "max_wall_time": 0.0,
+                    "cpu_time": 0.0,
+                    "peak_rss": None,
+                    "input_bytes": 0,
+                    "cache_hits": 0,
+                    "counters": {},
+                },
+            )
+            summary["runs"] += 1
+            summary["wall_time"] += metrics["wall_time"]
+            summary["max_wall_time"] = max(
+                summary["max_wall_time"], metrics["wall_time"]
+            )
+            summary["cpu_time"] += metrics["cpu_time"]
+            summary["input_bytes"] += metrics["input_bytes"]
+            summary["cache_hits"] += int(metrics["cached"])
+
+            if metrics["peak_rss"] is not None:
+                summary["peak_rss"] = max(summary["peak_rss"] or 0, metrics["peak_rss"])
+
+            for key, value in metrics["counters"].items():
+                summary["counters"][key] = summary["counters"].get(key, 0) + value
+
+    for summary in stages.values():
+        summary["mean_wall_time"] = summary["wall_time"] / summary["runs"]
+        summary["cache_hit_rate"] = summary["cache_hits"] / summary["runs"]
+
+    slowest_runs = sorted(runs.items(), key=lambda x: x[1]["wall_time"], reverse=True)
+
+    return {
+        "runs": len(runs),
+        "wall_time": sum(run["wall_time"] for run in runs.values()),
+        "cpu_time": sum(run["cpu_time"] for run in runs.values()),
+        "stages": stages,
+        "collection_stages": (
+            collection_metrics.as_dict()["stages"] if collection_metrics else []
+        ),
+        "slowest_runs": [
+            {"run": name, "wall_time": run["wall_time"]}
+            for name, run in slowest_runs[:SLOWEST_RUNS]
+        ],
+    }
+
+
+def write_collection_metrics(
+    manifest: Manifest, collection_metrics: Optional[RunMetrics] = None
+) -> None:
+    """Write the summary of the metrics of the runs listed in a manifest.
+
+    collection_metrics are the stages run once for the whole collection.
+    """
+    runs = dict()
+
+    for folder in manifest.finished_runs():
+        if manifest.has_artifact(folder, "metrics"):
+            with open(manifest.artifact(folder, "metrics"), "r") as fin:
+                runs[folder] = json.load(fin)
+
+    with open(manifest.collection_folder / COLLECTION_METRICS_FILENAME, "w") as fout:
+        json.dump(summarize(runs, collection_metrics), fout, indent=1)
@@ -0,0 +1,264 @@
+import sys
+import os
+import pathlib
+import dataclasses
+import math
+import random
+import argparse
+import shutil
+import tempfile
+
+from typing import *
+
+import rloopgrammar.model.regions_extractor as region_extractor
+import rloopgrammar.model.training_set as training_set
+import rloopgrammar.manifest as manifest
+import rloopgrammar.stage_metrics as stage_metrics
+
+from rloopgrammar.build_model import (
+    ModelParameters,
+    SupressOutput,
+    build_model,
+    build_output_folder_name,
+    create_bed_extra,
+    get_run_folder,
+    write_model_settings,
+)
+from rloopgrammar.config_reader import read_plasmids
+from rloopgrammar.config_reader import Plasmid
+from rloopgrammar.stage_cache import StageCache
+from rloopgrammar.scheduler import run_tasks
+from rloopgrammar.checkpoint import is_complete
+
+PROGRAM_NAME = pathlib.Path(sys.argv[0]).parts[-1][:-4]
+DESCRIPTION = "Build R-loop grammar model collections over widths and paddings."
+
+
+@dataclasses.dataclass
+class SweepParameters:
+    run_number: int
+    plasmid: Plasmid
+    window_length: int
+    training_set_percent: float
+    bed_extra_file: pathlib.Path
+    models: List[ModelParameters]  # one per padding, all with this width and run
+
+
+def sweep_run(sp: SweepParameters) -> List[manifest.RunRecord]:
+    """Build one run of every padding from a shared training set.
+
+    The aligned BED and the training set only depend on the width, and the
+    weights of all paddings are counted in a single pass over the training set.
+    """
+    seed = os.urandom(32)
+    random.seed(seed)
+
+    with open(sp.bed_extra_file, "r") as bed_file_fd:
+        bed_file_length = len(bed_file_fd.readlines())
+
+    training_set_size = math.ceil(bed_file_length * (sp.training_set_percent / 100.0))
+
+    with tempfile.TemporaryDirectory() as shared_folder:
+        shared_folder = pathlib.Path(shared_folder)
+        seed_filename = shared_folder / "SEED.b"
+        training_set_filename = shared_folder / "bed_extra_training-set.bed"
+        weight_filenames = [
+            shared_folder / f"p{mp.padding_length}_weight.xlsx" for mp in sp.models
+        ]
+
+        with open(seed_filename, "wb") as seed_file:
+            seed_file.write(seed)
+
+        training_set.TrainingSet.training_set(
+            str(sp.bed_extra_file), training_set_size, str(training_set_filename)
+        )
+
+        with SupressOutput():
+            region_extractor.RegionsExtractor.extract_padded_regions(
+                sp.plasmid.fasta_file,
+                str(training_set_filename),
+                sp.plasmid.gene_start,
+                sp.plasmid.gene_end,
+                sp.window_length,
+                [mp.padding_length for mp in sp.models],
+                [str(f) for f in weight_filenames],
+            )
+
+        return [
+            build_model(
+                dataclasses.replace(
+                    mp,
+                    seed_file=seed_filename,
+                    training_set_file=training_set_filename,
+                    weight_file=weight_filename,
+                )
+            )
+            for mp, weight_filename in zip(sp.models, weight_filenames)
+        ]
+
+
+def sweep_cost(sp: SweepParameters) -> float:
+    return os.path.getsize(sp.bed_extra_file) * sp.training_set_percent * len(sp.models)
+
+
+parser = argparse.ArgumentParser(prog=PROGRAM_NAME, description=DESCRIPTION)
+parser.add_argument(
+    "output_folder",
+    help="Collection folder, %%width and %%padding are replaced for each collection.",
+)
+parser.add_argument("-i", "--ini_file", type=str)
+parser.add_argument("-c", "--count", type=int, default=10)
+parser.add_argument("-p", "--paddings", type=int, nargs="+", default=[13])
+parser.add_argument("-k", "--widths", type=int, nargs="+", default=[4])
+parser.add_argument("--plasmid", type=str)
+parser.add_argument("-sp", "--sampling_precent", type=int, default=10)
+parser.add_argument(
+    "--cache_folder",
+    type=str,
+    default=None,
+    help="Reuse the aligned BED files of previous sweeps with the same inputs.",
+)
+parser.add_argument(
+    "--resume",
+    action="store_true",
+    help="Reuse the output folders and only run the runs that did not complete.",
+)
+parser.add_argument(
+    "-j",
+    "--processes",
+    type=int,
+    default=None,
+    help="Number of worker processes, sized to the machine by default.",
+)
+
+
+def main() -> None:
+    args = parser.parse_args()
+    print(args)
+
+    plasmids = read_plasmids(args.ini_file)
+    plasmid = list(filter(lambda x: x.name == args.plasmid, plasmids))[0]
+
+    number_of_models = args.count
+    paddings = sorted(set(args.paddings))
+    widths = sorted(set(args.widths))
+    cache = StageCache(args.cache_folder)
+
+    parent_folders = {
+        (width, padding): build_output_folder_name(
+            args.output_folder,
+            plasmid=plasmid.name,
+            padding=padding,
+            width=width,
+            number_of_models=number_of_models,
+        )
+        for width in widths
+        for padding in paddings
+    }
+
+    if len(set(parent_folders.values())) < len(parent_folders):
+        parser.error("output_folder must contain %width and %padding for a sweep.")
+
+    sweeps: list[SweepParameters] = []
+    collection_metrics = {
+        parent_folder: stage_metrics.RunMetrics()
+        for parent_folder in parent_folders.values()
+    }
+
+    for width in widths:
+        bed_extra_files = {}
+
+        for padding in paddings:
+            parent_folder = parent_folders[(width, padding)]
+
+            if not (args.resume and parent_folder.is_dir()):
+                os.mkdir(parent_folder)
+
+            write_model_settings(
+                parent_folder, plasmid, width, padding, number_of_models
+            )
+
+            bed_extra_files[padding] = (
+                parent_folder / f"{plasmid.name}_p{padding}_w{width}.bed_extra.bed"
+            )
+
+        # The alignment of the R-loops does not depend on the padding, it is
+        # measured in the collection of the first padding
+        with collection_metrics[parent_folders[(width, paddings[0])]].stage(
+            "extract", [plasmid.fasta_file, plasmid.bed_file]
+        ) as measured:
+            measured.cached = create_bed_extra(
+                plasmid, width, paddings[0], bed_extra_files[paddings[0]], cache
+            )
+        for padding in paddings[1:]:
+            shutil.copyfile(bed_extra_files[paddings[0]], bed_extra_files[padding])
+
+        for run_number in range(number_of_models):
+            models = [
+                ModelParameters(
+                    parent_folders[(width, padding)],
+                    run_number,
+                    plasmid,
+                    width,
+                    padding,
+                    args.sampling_precent,
+                    None,
+                    None,
+                    bed_extra_files[padding],
+                )
+                for padding in paddings
+            ]
+
+            if args.resume:
+                models = [mp for mp in models if not is_complete(get_run_folder(mp))]
+
+            if models:
+                sweeps.append(
+                    SweepParameters(
+                        run_number,
+                        plasmid,
+                        width,
+                        args.sampling_precent,
+                        bed_extra_files[paddings[0]],
+                        models,
+                    )
+                )
+
+    manifests = [
+        manifest.Manifest.create(
+            parent_folder,
+            "model",
+            dict(
+                plasmid=plasmid.name,
+                window_length=width,
+                padding_length=padding,
+                number_of_models=number_of_models,
+                training_set_percent=args.sampling_precent,
+            ),
+            [
+                (get_run_folder(mp), mp.run_number)
+                for sp in sweeps
+                for mp in sp.models
+                if mp.parent_folder == parent_folder
+            ],
+        )
+        for (width, padding), parent_folder in parent_folders.items()
+    ]
+
+    run_tasks(
+        sweep_run,
+        sweeps,
+        cost=sweep_cost,
+        processes=args.processes,
+        on_result=manifest.recorder(manifests),
+    )
+
+    for collection_manifest in manifests:
+        stage_metrics.write_collection_metrics(
+            collection_manifest,
+            collection_metrics[collection_manifest.collection_folder],
+        )
+
+
+if __name__ == "__main__":
+    main()
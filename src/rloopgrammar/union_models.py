@@ -1,4 +1,3 @@
-import multiprocessing
 import sys
 import os
 import pathlib
@@ -8,18 +7,21 @@ import configparser
 import logging
 import argparse
 import random
-import gmpy2
 
 from typing import *
 
 import rloopgrammar.model.union_dict as union_dict
 import rloopgrammar.model.grammar_word as grammar_word
 import rloopgrammar.model.grammar_training as grammar_training
+import rloopgrammar.model_bundle as model_bundle
+import rloopgrammar.manifest as manifest
+import rloopgrammar.profiling as profiling
+import rloopgrammar.stage_metrics as stage_metrics
 
 from rloopgrammar.config_reader import read_plasmids
 from rloopgrammar.config_reader import Plasmid
-
-NUMBER_OF_PROCESSES = 10
+from rloopgrammar.scheduler import run_tasks
+from rloopgrammar.checkpoint import is_complete
 
 CONFIG_UNION_PARAMETER_NAME = "Union Parameters"
 CONFIG_MODEL_PARAMETER_NAME = "Model Parameters"
@@ -29,11 +31,15 @@ DESCRIPTION = "Build a hybrid model based off the union of two dictionaries."
 
 class GMPYEncoder(json.JSONEncoder):
     def default(self, obj):
+        import gmpy2
+
         if isinstance(obj, gmpy2.mpq):
             return str(obj)
 
 
 def from_gmpy(dct):
+    import gmpy2
+
     for k, v in dct.items():
         if isinstance(v, str):
             n, m = tuple(map(int, v.split("/")))
@@ -61,63 +67,38 @@ class UnionParameters:
     window_length: int
     padding_length: int
     method: str
+    run_number: int
 
 
-def build_union_model(up: UnionParameters) -> None:
-    run_number = up.plasmid_1_model_folder.parts[-1].split("_")[-1]
-    run_folder = (
+def get_run_folder(up: UnionParameters) -> pathlib.Path:
+    return (
         up.union_collection_folder
-        / f"UnionModel_{up.plasmid_1.name}_{up.plasmid_2.name}_p{up.padding_length}_w{up.window_length}_{run_number}"
+        / f"UnionModel_{up.plasmid_1.name}_{up.plasmid_2.name}_p{up.padding_length}_w{up.window_length}_{up.run_number}"
     )
 
-    print(f"Building Union Model {run_number}")
-
-    random.seed(int(run_number))
-
-    os.mkdir(run_folder)
 
-    plasmid_1_model_files = next(os.walk(up.plasmid_1_model_folder))[2]
-    plasmid_2_model_files = next(os.walk(up.plasmid_2_model_folder))[2]
+def get_collection_folder(up: UnionParameters) -> pathlib.Path:
+    return up.union_collection_folder
 
-    plasmid_1_model_files_find = lambda y: list(
-        filter(lambda x: y in x, plasmid_1_model_files)
-    )[0]
-    plasmid_2_model_files_find = lambda y: list(
-        filter(lambda x: y in x, plasmid_2_model_files)
-    )[0]
 
-    print(f"Finding files {run_number}")
+def build_union_model(up: UnionParameters) -> manifest.RunRecord:
+    run_number = up.run_number
+    run_folder = get_run_folder(up)
 
-    bed_extra_training_set_filename_1 = (
-        up.plasmid_1_model_folder
-        / plasmid_1_model_files_find("bed_extra_training-set.bed")
-    )
-    bed_extra_training_set_filename_2 = (
-        up.plasmid_2_model_folder
-        / plasmid_2_model_files_find("bed_extra_training-set.bed")
-    )
+    print(f"Building Union Model {run_number}")
 
-    dict_shannon_xlsx_filename_1 = (
-        up.plasmid_1_model_folder / plasmid_1_model_files_find("DICT_SHANNON.xlsx")
-    )
-    dict_shannon_json_filename_1 = (
-        up.plasmid_1_model_folder / plasmid_1_model_files_find("DICT_SHANNON.xlsx.json")
-    )
+    random.seed(run_number)
 
-    weights_xlsx_filename_1 = up.plasmid_1_model_folder / plasmid_1_model_files_find(
-        "_weight_shannon.xlsx"
-    )
+    try:
+        os.mkdir(run_folder)
+    except FileExistsError:
+        pass
 
-    weights_xlsx_filename_2 = up.plasmid_2_model_folder / plasmid_2_model_files_find(
-        "_weight_shannon.xlsx"
-    )
+    bundle_1 = model_bundle.ModelBundle.open(up.plasmid_1_model_folder)
+    bundle_2 = model_bundle.ModelBundle.open(up.plasmid_2_model_folder)
 
-    dict_shannon_xlsx_filename_2 = (
-        up.plasmid_2_model_folder / plasmid_2_model_files_find("DICT_SHANNON.xlsx")
-    )
-    dict_shannon_json_filename_2 = (
-        up.plasmid_2_model_folder / plasmid_2_model_files_find("DICT_SHANNON.xlsx.json")
-    )
+    bed_extra_training_set_filename_1 = bundle_1.path("training_set")
+    bed_extra_training_set_filename_2 = bundle_2.path("training_set")
 
     union_dict_name = run_folder / (
         f"out_union_w{up.window_length}_p{up.padding_length}_union.DICT_SHANNON.xlsx.json"
@@ -144,61 +125,76 @@ def build_union_model(up: UnionParameters) -> None:
         / f"SHANNON_p{up.padding_length}_w{up.window_length}_{run_number}_union_probabilities.json"
     )
 
-    union_input_file = str(
-        run_folder
-        / f"{up.plasmid_1.name}_{up.plasmid_2.name}_union_w{up.window_length}_p{up.padding_length}_{run_number}_input.txt"
-    )
+    metrics = stage_metrics.RunMetrics()
 
     print("Unioning dictionaries.")
 
-    with open(
-        union_input_file,
-        "w",
-    ) as file_handle:
-        file_handle.write(f"{dict_shannon_json_filename_1}\n")
-        file_handle.write(f"{weights_xlsx_filename_1}\n")
-        file_handle.write(f"{dict_shannon_json_filename_2}\n")
-        file_handle.write(f"{weights_xlsx_filename_2}\n")
-
-    union_dict.UnionDict.union_json(
-        union_input_file, output_filename=union_dict_name, method=up.method
-    )
+    for bundle in (bundle_1, bundle_2):
+        if bundle.thresholds is None:
+            raise ValueError(
+                f"{bundle.bundle_filename.parent} has no threshold tables to weigh "
+                "its tuples in a union."
+            )
 
-    print("Extracting training set 1 words.")
+    with metrics.stage("dictionary"):
+        union_grammar_dict = union_dict.UnionDict.union_models(
+            [
+                (bundle_1.grammar_dict, bundle_1.thresholds),
+                (bundle_2.grammar_dict, bundle_2.thresholds),
+            ],
+            method=up.method,
+        )
 
-    grammar_word.GrammarWord.extract_word(
-        up.plasmid_1.fasta_file,
-        bed_extra_training_set_filename_1,
-        union_dict_name,
-        up.plasmid_1.gene_start,
-        up.plasmid_1.gene_end,
-        up.window_length,
-        training_set_words_filename_1,
-    )
+        with open(union_dict_name, "w") as fout:
+            json.dump(union_grammar_dict, fout)
+
+    with metrics.stage(
+        "words",
+        [
+            up.plasmid_1.fasta_file,
+            bed_extra_training_set_filename_1,
+            up.plasmid_2.fasta_file,
+            bed_extra_training_set_filename_2,
+        ],
+    ):
+        print("Extracting training set 1 words.")
+
+        grammar_word.GrammarWord.extract_word(
+            up.plasmid_1.fasta_file,
+            bed_extra_training_set_filename_1,
+            union_dict_name,
+            up.plasmid_1.gene_start,
+            up.plasmid_1.gene_end,
+            up.window_length,
+            training_set_words_filename_1,
+        )
 
-    print("Extracting training set 2 words.")
+        print("Extracting training set 2 words.")
 
-    grammar_word.GrammarWord.extract_word(
-        up.plasmid_2.fasta_file,
-        bed_extra_training_set_filename_2,
-        union_dict_name,
-        up.plasmid_2.gene_start,
-        up.plasmid_2.gene_end,
-        up.window_length,
-        training_set_words_filename_2,
-    )
+        grammar_word.GrammarWord.extract_word(
+            up.plasmid_2.fasta_file,
+            bed_extra_training_set_filename_2,
+            union_dict_name,
+            up.plasmid_2.gene_start,
+            up.plasmid_2.gene_end,
+            up.window_length,
+            training_set_words_filename_2,
+        )
 
-    print("Finding probabilities 1.")
+    with metrics.stage(
+        "probabilities", [training_set_words_filename_1, training_set_words_filename_2]
+    ):
+        print("Finding probabilities 1.")
 
-    grammar_training.GrammarTraining.find_probabilities(
-        training_set_words_filename_1, up.window_length, probabilities_filename_1
-    )
+        grammar_training.GrammarTraining.find_probabilities(
+            training_set_words_filename_1, up.window_length, probabilities_filename_1
+        )
 
-    print("Finding probabilities 2.")
+        print("Finding probabilities 2.")
 
-    grammar_training.GrammarTraining.find_probabilities(
-        training_set_words_filename_2, up.window_length, probabilities_filename_2
-    )
+        grammar_training.GrammarTraining.find_probabilities(
+            training_set_words_filename_2, up.window_length, probabilities_filename_2
+        )
 
     # CREATE FILE WITH AVERAGE PROBABILITIES
     print(f"Finding average probabilities.")
@@ -227,19 +223,79 @@ def build_union_model(up: UnionParameters) -> None:
     with open(av_probabilities_filename, "w") as fout:
         json.dump(probabilities_2, fout, cls=GMPYEncoder, ensure_ascii=False, indent=4)
 
+    run_metadata = dict(
+        kind="union",
+        plasmid=f"{up.plasmid_1.name} {up.plasmid_2.name}",
+        window_length=up.window_length,
+        padding_length=up.padding_length,
+        run=run_number,
+        method=up.method,
+    )
+    run_files = dict(
+        dictionary=union_dict_name, probabilities=av_probabilities_filename
+    )
+    with metrics.stage("bundle", run_files.values()):
+        model_bundle.bundle_run(run_folder, run_metadata, run_files)
+
+    metrics.write(run_folder / stage_metrics.RUN_METRICS_FILENAME)
+
+    return manifest.complete_run(
+        run_folder,
+        run_number,
+        run_metadata,
+        dict(
+            run_files,
+            bundle=run_folder / model_bundle.BUNDLE_FILENAME,
+            metrics=run_folder / stage_metrics.RUN_METRICS_FILENAME,
+        ),
+    )
+
+
+def union_cost(up: UnionParameters) -> float:
+    return sum(
+        f.stat().st_size
+        for folder in (up.plasmid_1_model_folder, up.plasmid_2_model_folder)
+        for f in folder.iterdir()
+    )
+
 
 parser = argparse.ArgumentParser(prog=PROGRAM_NAME, description=DESCRIPTION)
 parser.add_argument("output_folder")
 parser.add_argument("-m", "--method", type=str)
 parser.add_argument("-i", "--input_folders", type=str, nargs="+")
+parser.add_argument("--ini_file", type=str)
+parser.add_argument(
+    "--resume",
+    action="store_true",
+    help="Reuse the output folder and only build the union runs that did not complete.",
+)
+parser.add_argument(
+    "-j",
+    "--processes",
+    type=int,
+    default=None,
+    help="Number of worker processes, sized to the machine by default.",
+)
+parser.add_argument(
+    "--profile",
+    action="store_true",
+    help="Write cProfile statistics of every stage to the collection profile folder.",
+)
+parser.add_argument(
+    "--profile_memory",
+    action="store_true",
+    help="With --profile, also write tracemalloc snapshots at the end of every stage.",
+)
 
 
 def main() -> None:
     args = parser.parse_args()
+    profiler = profiling.Profiler(args.profile_memory) if args.profile else None
 
-    plasmids = read_plasmids()
+    plasmids = read_plasmids(args.ini_file)
 
     model_folder_name_tuples = [args.input_folders]
+    union_runs: list[UnionParameters] = []
 
     for model_folder_tuple in model_folder_name_tuples:
         model1_config = configparser.ConfigParser()
@@ -270,22 +326,19 @@ def main() -> None:
             list(filter(lambda x: x.name == k, plasmids))[0] for k in plasmid_name_tuple
         ]
 
-        # sort by the run number
-        model1_folders = sorted(
-            [x[1] for x in os.walk(model_folder_tuple[0])][0],
-            key=lambda x: int(x.split("_")[-1]),
-        )
-        model2_folders = sorted(
-            [x[1] for x in os.walk(model_folder_tuple[1])][0],
-            key=lambda x: int(x.split("_")[-1]),
-        )
+        # by the run number
+        model1_manifest = manifest.Manifest.load(model_folder_tuple[0])
+        model2_manifest = manifest.Manifest.load(model_folder_tuple[1])
+        model1_folders = model1_manifest.finished_runs()
+        model2_folders = model2_manifest.finished_runs()
 
         assert len(model1_folders) == len(
             model2_folders
         ), "Model folder lengths don't match"
 
         union_model_collection_folder = pathlib.Path(args.output_folder)
-        os.mkdir(union_model_collection_folder)
+        if not (args.resume and union_model_collection_folder.is_dir()):
+            os.mkdir(union_model_collection_folder)
 
         run_config = configparser.ConfigParser()
         run_config[CONFIG_MODEL_PARAMETER_NAME] = {}
@@ -303,7 +356,6 @@ def main() -> None:
         ) as configfile:
             run_config.write(configfile)
 
-        union_runs: list[UnionParameters] = []
         for run_folder_tuple in zip(model1_folders, model2_folders):
             union_runs.append(
                 UnionParameters(
@@ -317,11 +369,36 @@ def main() -> None:
                     window_length=window_length,
                     padding_length=padding_length,
                     method=args.method,
+                    run_number=model1_manifest.run_number(run_folder_tuple[0]),
                 )
             )
 
-        with multiprocessing.Pool(NUMBER_OF_PROCESSES) as pool:
-            pool.map(build_union_model, union_runs)
+    if args.resume:
+        union_runs = [up for up in union_runs if not is_complete(get_run_folder(up))]
+        print(f"Resuming {len(union_runs)} incomplete union models.")
+
+    union_manifest = manifest.Manifest.create(
+        union_model_collection_folder,
+        "union",
+        dict(
+            model_folders=args.input_folders,
+            plasmid=" ".join(plasmid_name_tuple),
+            window_length=window_length,
+            padding_length=padding_length,
+            method=args.method,
+        ),
+        [(get_run_folder(up), up.run_number) for up in union_runs],
+    )
+
+    run_tasks(
+        profiling.profiled(build_union_model, get_collection_folder, profiler),
+        union_runs,
+        cost=union_cost,
+        processes=args.processes,
+        on_result=manifest.recorder([union_manifest]),
+    )
+
+    stage_metrics.write_collection_metrics(union_manifest)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,289 @@
+import sys
+import os
+import pathlib
+import dataclasses
+import configparser
+import math
+import random
+import logging
+import argparse
+import json
+import shutil
+
+from typing import *
+
+import rloopgrammar.model.model_update as model_update
+import rloopgrammar.model_bundle as model_bundle
+import rloopgrammar.manifest as manifest
+
+from rloopgrammar.build_model import (
+    CONFIG_MODEL_PARAMETER_NAME,
+    build_output_folder_name,
+    create_bed_extra,
+)
+from rloopgrammar.config_reader import read_plasmids
+from rloopgrammar.config_reader import Plasmid
+from rloopgrammar.stage_cache import StageCache
+from rloopgrammar.scheduler import run_tasks
+from rloopgrammar.checkpoint import is_complete
+
+PROGRAM_NAME = pathlib.Path(sys.argv[0]).parts[-1][:-4]
+DESCRIPTION = "Update a collection of R-loop grammar models with new R-loops."
+
+
+@dataclasses.dataclass
+class UpdateParameters:
+    model_folder: pathlib.Path
+    parent_folder: pathlib.Path
+    plasmid: Plasmid
+    window_length: int
+    padding_length: int
+    training_set_percent: float
+    bed_extra_file: pathlib.Path  # the new R-loops, aligned
+    run_number: int
+
+
+def get_run_folder(up: UpdateParameters) -> pathlib.Path:
+    return up.parent_folder / up.model_folder.parts[-1]
+
+
+def update_model(up: UpdateParameters) -> manifest.RunRecord:
+    """Add new R-loops to the training set of a model, see ModelUpdate.
+
+    The statistics of the training set are read from the model folder, models
+    built without them read their training set once.
+    """
+    run_folder = get_run_folder(up)
+
+    try:
+        os.mkdir(run_folder)
+    except FileExistsError:
+        pass
+
+    logging.basicConfig(
+        filename=up.parent_folder / "model_update_log.txt",
+        format=f"%(asctime)s [{up.model_folder.parts[-1]}] - %(message)s",
+        level=logging.DEBUG,
+        force=True,
+    )
+    logger = logging.getLogger("r-loop_grammar")
+
+    logger.info(dataclasses.asdict(up))
+
+    bundle = model_bundle.ModelBundle.open(up.model_folder)
+    training_set_filename = bundle.path("training_set")
+
+    run_prefix = str(
+        run_folder / training_set_filename.name[: -len(".bed_extra_training-set.bed")]
+    )
+    new_rloops_filename = run_prefix + ".bed_extra_new-rloops.bed"
+
+    if "statistics" in bundle.metadata["files"]:
+        with open(bundle.path("statistics"), "r") as fin:
+            statistics = json.load(fin)
+    else:
+        logger.info("Counting training set.")
+        statistics = model_update.ModelUpdate.model_statistics(
+            up.plasmid.fasta_file,
+            str(training_set_filename),
+            up.plasmid.gene_start,
+            up.plasmid.gene_end,
+            up.window_length,
+            up.padding_length,
+        )
+
+    with open(up.bed_extra_file, "r") as bed_file_fd:
+        new_rloops = bed_file_fd.readlines()
+
+    # The new R-loops are drawn from a recorded seed, as the training sets
+    seed = os.urandom(32)
+    seed_filename = run_prefix + "_SEED.b"
+
+    with open(seed_filename, "wb") as seed_file:
+        seed_file.write(seed)
+
+    random.seed(seed)
+    new_rloops_size = math.ceil(len(new_rloops) * (up.training_set_percent / 100.0))
+    new_rloops = random.sample(new_rloops, min(new_rloops_size, len(new_rloops)))
+
+    with open(new_rloops_filename, "w") as fout:
+        fout.writelines(new_rloops)
+
+    logger.info(f"Adding {len(new_rloops)} R-loops.")
+
+    changes = model_update.ModelUpdate.update(
+        up.plasmid.fasta_file,
+        new_rloops_filename,
+        str(bundle.path("dictionary")),
+        statistics,
+        up.plasmid.gene_start,
+        up.plasmid.gene_end,
+        up.window_length,
+        up.padding_length,
+        run_prefix,
+    )
+
+    # The training set of the updated model
+    with open(run_prefix + ".bed_extra_training-set.bed", "w") as fout:
+        with open(training_set_filename, "r") as fin:
+            shutil.copyfileobj(fin, fout)
+        fout.writelines(new_rloops)
+
+    run_metadata = dict(
+        {k: v for k, v in bundle.metadata.items() if k != "files"},
+        kind="update",
+        updated_model=up.model_folder.parts[-1],
+        rloops_added=len(new_rloops),
+    )
+    run_files = dict(
+        dictionary=run_prefix + "_DICT_SHANNON.xlsx.json",
+        probabilities=run_prefix + "_probabilities.json",
+        thresholds=run_prefix + "_weight_shannon.xlsx",
+        training_set=run_prefix + ".bed_extra_training-set.bed",
+        statistics=run_prefix + model_update.STATISTICS_SUFFIX,
+        seed=seed_filename,
+    )
+    model_bundle.bundle_run(run_folder, run_metadata, run_files)
+
+    for change in changes:
+        logger.info(
+            f"{change['region']} {change['tuple']}: {change['old']} -> {change['new']}"
+        )
+
+    run_record = manifest.complete_run(
+        run_folder,
+        up.run_number,
+        run_metadata,
+        dict(
+            run_files,
+            bundle=run_folder / model_bundle.BUNDLE_FILENAME,
+            changes=run_prefix + model_update.CHANGES_SUFFIX,
+        ),
+    )
+    logger.info(f"Update complete, {len(changes)} tuples changed symbols.")
+
+    return run_record
+
+
+def update_cost(up: UpdateParameters) -> float:
+    return os.path.getsize(up.bed_extra_file) * up.training_set_percent
+
+
+parser = argparse.ArgumentParser(prog=PROGRAM_NAME, description=DESCRIPTION)
+parser.add_argument("output_folder")
+parser.add_argument("-i", "--ini_file", type=str)
+parser.add_argument(
+    "-m", "--model_folder", type=str, required=True, help="Collection to update."
+)
+parser.add_argument(
+    "-b", "--bed_file", type=str, required=True, help="BED file of the new R-loops."
+)
+parser.add_argument(
+    "-sp",
+    "--sampling_precent",
+    type=int,
+    default=100,
+    help="Percent of the new R-loops added to the training set of each model.",
+)
+parser.add_argument(
+    "--resume",
+    action="store_true",
+    help="Reuse the output folder and only update the models that did not complete.",
+)
+parser.add_argument(
+    "-j",
+    "--processes",
+    type=int,
+    default=None,
+    help="Number of worker processes, sized to the machine by default.",
+)
+
+
+def main() -> None:
+    args = parser.parse_args()
+    print(args)
+
+    plasmids = read_plasmids(args.ini_file)
+
+    model_collection_folder = pathlib.Path(args.model_folder)
+    model_manifest = manifest.Manifest.load(model_collection_folder)
+    model_folders = model_manifest.finished_runs()
+
+    model_config = configparser.ConfigParser()
+    model_config.read(model_collection_folder / "model_settings.ini")
+
+    window_length = int(model_config[CONFIG_MODEL_PARAMETER_NAME]["WindowLength"])
+    padding = int(model_config[CONFIG_MODEL_PARAMETER_NAME]["Padding"])
+    plasmid_name = model_config[CONFIG_MODEL_PARAMETER_NAME]["Plasmid"]
+    plasmid = list(filter(lambda x: x.name == plasmid_name, plasmids))[0]
+
+    parent_folder = build_output_folder_name(
+        args.output_folder,
+        plasmid=plasmid.name,
+        padding=padding,
+        width=window_length,
+        number_of_models=len(model_folders),
+    )
+    if not (args.resume and parent_folder.is_dir()):
+        os.mkdir(parent_folder)
+
+    shutil.copyfile(
+        model_collection_folder / "model_settings.ini",
+        parent_folder / "model_settings.ini",
+    )
+
+    # The new R-loops are aligned once for all the models
+    bed_extra_file = (
+        parent_folder / f"{plasmid.name}_p{padding}_w{window_length}.new_bed_extra.bed"
+    )
+    create_bed_extra(
+        dataclasses.replace(plasmid, bed_file=args.bed_file),
+        window_length,
+        padding,
+        bed_extra_file,
+        StageCache(None),
+    )
+
+    runs = [
+        UpdateParameters(
+            model_collection_folder / model_folder,
+            parent_folder,
+            plasmid,
+            window_length,
+            padding,
+            args.sampling_precent,
+            bed_extra_file,
+            model_manifest.run_number(model_folder),
+        )
+        for model_folder in model_folders
+    ]
+
+    if args.resume:
+        runs = [up for up in runs if not is_complete(get_run_folder(up))]
+        print(f"Resuming {len(runs)} incomplete updates.")
+
+    update_manifest = manifest.Manifest.create(
+        parent_folder,
+        "update",
+        dict(
+            plasmid=plasmid.name,
+            window_length=window_length,
+            padding_length=padding,
+            model_folder=str(model_collection_folder),
+            bed_file=args.bed_file,
+            training_set_percent=args.sampling_precent,
+        ),
+        [(get_run_folder(up), up.run_number) for up in runs],
+    )
+
+    run_tasks(
+        update_model,
+        runs,
+        cost=update_cost,
+        processes=args.processes,
+        on_result=manifest.recorder([update_manifest]),
+    )
+
+
+if __name__ == "__main__":
+    main()
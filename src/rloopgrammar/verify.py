@@ -0,0 +1,526 @@
+import argparse
+import dataclasses
+import json
+import numbers
+import pathlib
+import random
+import sys
+import tempfile
+
+from typing import *
+
+import rloopgrammar.model_bundle as model_bundle
+import rloopgrammar.manifest as manifest
+import rloopgrammar.predict as predict
+
+from rloopgrammar.config_reader import read_plasmids
+from rloopgrammar.config_reader import Plasmid
+from rloopgrammar.scheduler import run_tasks
+
+"""
+Equivalence checks of the runs of a collection against the reference pipeline.
+
+A model run is rebuilt from its training set by the frozen stages of
+rloopgrammar.reference, each reading the files of the previous one, and its
+bundle is compared with the rebuilt dictionary, exact probabilities and
+thresholds. This covers the runs built from cached stages, shared or subtracted
+weights, bootstrap statistics and incremental updates, and any change of the
+optimized model modules. A prediction run is recomputed by the same stages from
+the JSON files of its model instead of its bundle, and its words, word
+probabilities, per-base profile and stats are compared. The first divergence of
+each run is reported, and a sample of the runs keeps the check cheap, the
+reference stages reading one R-loop at a time.
+"""
+
+VERIFICATION_FILENAME = "verification.json"
+
+MODEL_KINDS = ("model", "bootstrap", "kfold", "update", "legacy")
+PREDICTION_KINDS = ("prediction",)
+
+
+@dataclasses.dataclass
+class Tolerances:
+    probability: float = 0.0  # the probabilities are exact rationals
+    weight: float = 1e-12
+    profile: float = 1e-9
+    stats: float = 1e-9
+
+
+@dataclasses.dataclass
+class VerificationTask:
+    collection_folder: pathlib.Path
+    folder: str  # run folder
+    kind: str
+    plasmid: Plasmid
+    tolerances: Tolerances
+
+
+@dataclasses.dataclass
+class Divergence:
+    folder: str
+    artifact: str
+    path: str  # keys and indexes to the first differing value
+    reference: str
+    candidate: str
+
+
+def sorted_dictionary(grammar_dict: Dict[str, Any]) -> Dict[str, Any]:
+    """Dictionary with the tuples of every symbol sorted.
+
+    GrammarDict collects the tuples of a symbol in a set, their order depends on
+    the hash seed and on the order the R-loops are read in.
+    """
+    return {
+        key: (
+            {symbol: sorted(tuples) for symbol, tuples in value.items()}
+            if isinstance(value, dict)
+            else value
+        )
+        for key, value in grammar_dict.items()
+    }
+
+
+def first_divergence(
+    reference: Any, candidate: Any, tolerance: float, path: str = ""
+) -> Optional[Tuple[str, Any, Any]]:
+    """First value of candidate differing from reference, in reading order.
+
+    Numbers differ by more than the tolerance relative to the larger of them,
+    as the word probabilities are far below any absolute tolerance, other values
+    are compared exactly. Returns the path to the value and both values.
+    """
+    if isinstance(reference, dict) and isinstance(candidate, dict):
+        for key in reference:
+            if key not in candidate:
+                return f"{path}/{key}", reference[key], None
+
+            divergence = first_divergence(
+                reference[key], candidate[key], tolerance, f"{path}/{key}"
+            )
+            if divergence:
+                return divergence
+
+        for key in candidate:
+            if key not in reference:
+                return f"{path}/{key}", None, candidate[key]
+
+        return None
+
+    if isinstance(reference, list) and isinstance(candidate, list):
+        for index, (r, c) in enumerate(zip(reference, candidate)):
+            divergence = first_divergence(r, c, tolerance, f"{path}[{index}]")
+            if divergence:
+                return divergence
+
+        if len(reference) != len(candidate):
+            index = min(len(reference), len(candidate))
+            return (
+                f"{path}[{index}]",
+                reference[index] if index < len(reference) else None,
+                candidate[index] if index < len(candidate) else None,
+            )
+
+        return None
+
+    numeric = (
+        isinstance(reference, numbers.Number)
+        and isinstance(candidate, numbers.Number)
+        and not isinstance(reference, bool)
+    )
+
+    if numeric and abs(reference - candidate) <= tolerance * max(
+        abs(reference), abs(candidate)
+    ):
+        return None
+    if not numeric and reference == candidate:
+        return None
+
+    return path, reference, candidate
+
+
+def reference_model(
+    plasmid: Plasmid,
+    training_set_file: pathlib.Path,
+    window_length: int,
+    padding_length: int,
+    folder: pathlib.Path,
+) -> Dict[str, Any]:
+    """Model of a training set, built by the reference stages."""
+    import rloopgrammar.reference.regions_extractor as region_extractor
+    import rloopgrammar.reference.regions_threshold as region_threshold
+    import rloopgrammar.reference.grammar_dict as grammar_dict
+    import rloopgrammar.reference.grammar_word as grammar_word
+    import rloopgrammar.reference.grammar_training as grammar_training
+    import rloopgrammar.reference.probabilistic_language as probabilistic_language
+
+    weight_filename = str(folder / "weight.xlsx")
+    weight_shannon_filename = str(folder / "weight_shannon.xlsx")
+    dict_filename = str(folder / "DICT_SHANNON.xlsx")
+    words_filename = str(folder / "WORDS_SHANNON.txt")
+    probabilities_filename = str(folder / "probabilities.json")
+
+    with predict.SupressOutput():
+        region_extractor.RegionsExtractor.extract_regions(
+            plasmid.fasta_file,
+            str(training_set_file),
+            plasmid.gene_start,
+            plasmid.gene_end,
+            window_length=window_length,
+            out_pref=weight_filename,
+            num_regions=4,
+            padding=padding_length,
+            bed_extra=False,
+            create_weights=True,
+        )
+        region_threshold.RegionsThreshold.extract_regions(
+            weight_filename, weight_shannon_filename, True  # Shannon Entropy
+        )
+        grammar_dict.GrammarDict.extract_regions(
+            plasmid.fasta_file,
+            str(training_set_file),
+            weight_filename,
+            plasmid.gene_start,
+            plasmid.gene_end,
+            window_length,
+            weight_shannon_filename,
+            dict_filename,
+        )
+        grammar_word.GrammarWord.extract_word(
+            plasmid.fasta_file,
+            str(training_set_file),
+            dict_filename + ".json",
+            plasmid.gene_start,
+            plasmid.gene_end,
+            window_length,
+            words_filename,
+        )
+        grammar_training.GrammarTraining.find_probabilities(
+            words_filename, window_length, probabilities_filename
+        )
+
+    with open(dict_filename + ".json", "r") as fin:
+        dictionary = json.load(fin)
+
+    with open(probabilities_filename, "r", encoding="utf-8") as fin:
+        probabilities = json.load(fin, object_hook=probabilistic_language.from_gmpy)
+
+    return dict(
+        dictionary=sorted_dictionary(dictionary),
+        probabilities=probabilities,
+        thresholds=model_bundle.read_thresholds(weight_shannon_filename),
+    )
+
+
+def read_profile(xlsx_in: pathlib.Path) -> List[float]:
+    """Probability of each base, as written by Loop_probabilities."""
+    import openpyxl
+
+    wb = openpyxl.load_workbook(xlsx_in, read_only=True)
+    rows = wb.active.iter_rows(min_row=2, values_only=True)
+    profile = [row[1] for row in rows]
+    wb.close()
+
+    return profile
+
+
+def read_prediction(
+    words_filename: pathlib.Path,
+    probabilities_filename: pathlib.Path,
+    base_in_loop_filename: pathlib.Path,
+    stats_filename: pathlib.Path,
+) -> Dict[str, Any]:
+    with open(words_filename, "r") as fin:
+        words = fin.read().splitlines()
+
+    with open(probabilities_filename, "r") as fin:
+        word_probabilities = [float(line) for line in fin]
+
+    with open(stats_filename, "r") as fin:
+        stats = json.load(fin)
+
+    return dict(
+        words=words,
+        word_probabilities=word_probabilities,
+        profile=read_profile(base_in_loop_filename),
+        stats=stats,
+    )
+
+
+def reference_prediction(
+    plasmid: Plasmid,
+    model_folder: pathlib.Path,
+    all_rloops_bed_file: pathlib.Path,
+    window_length: int,
+    folder: pathlib.Path,
+) -> Dict[str, Any]:
+    """Prediction of a model recomputed from its JSON files by the reference
+    stages."""
+    import rloopgrammar.reference.grammar_word as grammar_word
+    import rloopgrammar.reference.probabilistic_language as probabilistic_language
+    import rloopgrammar.reference.in_loop_probs as in_loop_probs
+
+    bundle = model_bundle.ModelBundle.open(model_folder)
+
+    words_filename = str(folder / "all_rloops_WORDS_SHANNON")
+    probabilities_filename = str(folder / "prob_lang.py")
+    base_in_loop_no_xlsx = str(folder / "base_in_loop")
+
+    with predict.SupressOutput():
+        grammar_word.GrammarWord.extract_word(
+            plasmid.fasta_file,
+            str(all_rloops_bed_file),
+            str(bundle.path("dictionary")),
+            plasmid.gene_start,
+            plasmid.gene_end,
+            window_length,
+            words_filename,
+        )
+        probabilistic_language.Probabilistic_Language.word_probabilities(
+            words_filename,
+            str(bundle.path("probabilities")),
+            window_length,
+            probabilities_filename,
+        )
+        in_loop_probs.Loop_probabilities.in_loop_probabilities(
+            words_filename,
+            str(all_rloops_bed_file),
+            plasmid.gene_start + plasmid.gene_end,
+            plasmid.gene_start,
+            plasmid.gene_end,
+            probabilities_filename,
+            window_length,
+            base_in_loop_no_xlsx,
+        )
+
+    return read_prediction(
+        words_filename,
+        probabilities_filename,
+        base_in_loop_no_xlsx + ".XLSX",
+        base_in_loop_no_xlsx + "_stats.json",
+    )
+
+
+def verify_run(task: VerificationTask) -> Optional[Divergence]:
+    """First divergence of a run from the reference pipeline, if any."""
+    collection_manifest = manifest.Manifest.load(task.collection_folder)
+    run_folder = collection_manifest.run_folder(task.folder)
+    tolerances = task.tolerances
+
+    with tempfile.TemporaryDirectory() as reference_folder:
+        if task.kind in PREDICTION_KINDS:
+            parameters = collection_manifest.runs[task.folder]["parameters"]
+            window_length = parameters["window_length"]
+
+            reference = reference_prediction(
+                task.plasmid,
+                pathlib.Path(parameters["model"]),
+                predict.get_all_rloops_bed_file(
+                    task.collection_folder, task.plasmid, window_length
+                ),
+                window_length,
+                pathlib.Path(reference_folder),
+            )
+            candidate = read_prediction(
+                *(
+                    collection_manifest.artifact(task.folder, role)
+                    for role in ("words", "word_probabilities", "base_in_loop", "stats")
+                )
+            )
+            checks = [
+                ("words", 0.0),
+                ("word_probabilities", tolerances.profile),
+                ("profile", tolerances.profile),
+                ("stats", tolerances.stats),
+            ]
+        else:
+            bundle = model_bundle.ModelBundle.open(run_folder)
+
+            reference = reference_model(
+                task.plasmid,
+                bundle.path("training_set"),
+                bundle.metadata["window_length"],
+                bundle.metadata["padding_length"],
+                pathlib.Path(reference_folder),
+            )
+            candidate = dict(
+                dictionary=sorted_dictionary(bundle.grammar_dict),
+                probabilities=bundle.probabilities,
+                thresholds=bundle.thresholds,
+            )
+            checks = [
+                ("dictionary", 0.0),
+                ("probabilities", tolerances.probability),
+                ("thresholds", tolerances.weight),
+            ]
+
+    for artifact, tolerance in checks:
+        # models without thresholds, as bootstrap replicates
+        if candidate[artifact] is None:
+            continue
+
+        divergence = first_divergence(
+            reference[artifact], candidate[artifact], tolerance
+        )
+        if divergence:
+            path, reference_value, candidate_value = divergence
+            return Divergence(
+                task.folder,
+                artifact,
+                path,
+                str(reference_value),
+                str(candidate_value),
+            )
+
+    return None
+
+
+def sample_runs(folders: List[str], sample: float, seed: Any = None) -> List[str]:
+    """A fraction of the runs, at least one, by run order."""
+    count = min(len(folders), max(1, round(len(folders) * sample)))
+    sampled = set(random.Random(seed).sample(folders, count))
+
+    return [folder for folder in folders if folder in sampled]
+
+
+def verify_collection(
+    collection_folder: pathlib.Path,
+    plasmids: List[Plasmid],
+    tolerances: Optional[Tolerances] = None,
+    sample: float = 1.0,
+    seed: Any = None,
+    processes: Optional[int] = None,
+) -> List[Divergence]:
+    """Check a sample of the runs of a collection, see verify_run.
+
+    The results are written to the collection folder.
+    """
+    collection_folder = pathlib.Path(collection_folder)
+    collection_manifest = manifest.Manifest.load(collection_folder)
+    tolerances = tolerances or Tolerances()
+    kind = collection_manifest.kind
+
+    if kind not in MODEL_KINDS + PREDICTION_KINDS:
+        raise ValueError(f"{collection_folder}: {kind} collections are not verified.")
+
+    tasks = []
+    folders = sample_runs(collection_manifest.finished_runs(), sample, seed)
+
+    for folder in folders:
+        if kind in PREDICTION_KINDS:
+            plasmid_name = collection_manifest.parameters["plasmid"]
+        else:
+            plasmid_name = model_bundle.ModelBundle.open(
+                collection_manifest.run_folder(folder)
+            ).metadata["plasmid"]
+
+        plasmid = [p for p in plasmids if p.name == plasmid_name][0]
+        tasks.append(
+            VerificationTask(collection_folder, folder, kind, plasmid, tolerances)
+        )
+
+    divergences = [
+        divergence
+        for divergence in run_tasks(verify_run, tasks, processes=processes)
+        if divergence is not None
+    ]
+    divergences.sort(key=lambda d: collection_manifest.run_number(d.folder))
+
+    with open(collection_folder / VERIFICATION_FILENAME, "w") as fout:
+        json.dump(
+            dict(
+                sample=sample,
+                runs=folders,
+                tolerances=dataclasses.asdict(tolerances),
+                divergences=[dataclasses.asdict(d) for d in divergences],
+            ),
+            fout,
+            indent=1,
+        )
+
+    return divergences
+
+
+def report(collection_folder: pathlib.Path, divergences: List[Divergence]) -> None:
+    if not divergences:
+        print(f"{collection_folder}: the verified runs match the reference.")
+        return
+
+    for divergence in divergences:
+        print(
+            f"{collection_folder}/{divergence.folder}: {divergence.artifact} "
+            f"diverges at {divergence.path or '/'}, reference "
+            f"{divergence.reference}, run {divergence.candidate}"
+        )
+
+
+def verify_collections(
+    collection_folders: Iterable[pathlib.Path],
+    plasmids: List[Plasmid],
+    tolerances: Optional[Tolerances] = None,
+    sample: float = 1.0,
+    seed: Any = None,
+    processes: Optional[int] = None,
+) -> bool:
+    """Check and report collections, returns True if none diverged."""
+    matched = True
+
+    for collection_folder in collection_folders:
+        divergences = verify_collection(
+            collection_folder, plasmids, tolerances, sample, seed, processes
+        )
+        report(collection_folder, divergences)
+        matched = matched and not divergences
+
+    return matched
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Check collections against the reference model pipeline."
+    )
+    parser.add_argument("collection_folders", nargs="+")
+    parser.add_argument("-i", "--ini_file", type=str)
+    parser.add_argument(
+        "-s",
+        "--sample",
+        type=float,
+        default=1.0,
+        help="Fraction of the runs of each collection checked.",
+    )
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument(
+        "--probability_tolerance", type=float, default=Tolerances.probability
+    )
+    parser.add_argument("--weight_tolerance", type=float, default=Tolerances.weight)
+    parser.add_argument("--profile_tolerance", type=float, default=Tolerances.profile)
+    parser.add_argument("--stats_tolerance", type=float, default=Tolerances.stats)
+    parser.add_argument(
+        "-j",
+        "--processes",
+        type=int,
+        default=None,
+        help="Number of worker processes, sized to the machine by default.",
+    )
+    args = parser.parse_args()
+
+    plasmids = read_plasmids(args.ini_file)
+    tolerances = Tolerances(
+        args.probability_tolerance,
+        args.weight_tolerance,
+        args.profile_tolerance,
+        args.stats_tolerance,
+    )
+
+    if not verify_collections(
+        args.collection_folders,
+        plasmids,
+        tolerances,
+        args.sample,
+        args.seed,
+        args.processes,
+    ):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import dataclasses
+import pathlib
+import sys
+
+import pytest
+
+import rloopgrammar.benchmark.synthetic as synthetic
+import rloopgrammar.build_model as build_model
+
+from rloopgrammar.config_reader import Plasmid
+
+# A gene short enough to enumerate every R-loop the models score
+SCALE = synthetic.custom_scale(120, 300, mean_length=40.0, sd_length=12.0)
+WINDOW_LENGTH = 4
+PADDING_LENGTH = 3
+
+
+@dataclasses.dataclass
+class SyntheticData:
+    folder: pathlib.Path
+    plasmid: Plasmid
+    ini_file: pathlib.Path
+
+
+@dataclasses.dataclass
+class SyntheticCollection:
+    data: SyntheticData
+    collection_folder: pathlib.Path
+    run_folders: list
+
+
+def run_main(main, argv):
+    """Run the main of a command line program with the arguments argv."""
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(sys, "argv", [main.__module__] + [str(x) for x in argv])
+        main()
+
+
+@pytest.fixture(scope="session")
+def synthetic_data(tmp_path_factory):
+    folder = tmp_path_factory.mktemp("synthetic")
+    plasmid = synthetic.write_plasmid(folder, SCALE, seed=0)
+
+    return SyntheticData(folder, plasmid, folder / "plasmids.ini")
+
+
+@pytest.fixture(scope="session")
+def model_collection(synthetic_data, tmp_path_factory):
+    """A collection of two models of the synthetic plasmid."""
+    collection_folder = tmp_path_factory.mktemp("models") / "collection"
+
+    run_main(
+        build_model.main,
+        [
+            collection_folder,
+            "-i",
+            synthetic_data.ini_file,
+            "--plasmid",
+            synthetic_data.plasmid.name,
+            "-c",
+            2,
+            "-p",
+            PADDING_LENGTH,
+            "-k",
+            WINDOW_LENGTH,
+            "-sp",
+            50,
+            "-j",
+            1,
+        ],
+    )
+
+    return SyntheticCollection(
+        synthetic_data,
+        collection_folder,
+        sorted(
+            folder for folder in collection_folder.iterdir() if folder.is_dir()
+        ),
+    )
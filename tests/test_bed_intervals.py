@@ -0,0 +1,69 @@
+import random
+
+import pytest
+
+from rloopgrammar.model.bed_intervals import BedIntervals, align_starts
+
+
+def baseline_align_start(idx_1, idx_2, window_length):
+    """The alignment loop of the baseline regions_extractor, one R-loop at a
+    time: back 1, forward 1, back 2, forward 2, ... without going below 0."""
+    i = 0
+    while ((idx_2 - (idx_1 + i)) % window_length) != 0:  # modify first index in R-loop
+        if i >= 0:
+            i += 1
+
+            if (idx_1 - i) < 0:
+                continue
+
+        i *= -1
+
+    return idx_1 + i
+
+
+@pytest.mark.parametrize("window_length", range(1, 9))
+def test_align_starts_matches_baseline(window_length):
+    rloops = [
+        (start, start + length) for start in range(0, 20) for length in range(0, 30)
+    ]
+    starts, ends = zip(*rloops)
+
+    assert align_starts(starts, ends, window_length).tolist() == [
+        baseline_align_start(start, end, window_length) for start, end in rloops
+    ]
+
+
+def test_aligned_lengths_are_multiples():
+    rng = random.Random(0)
+    starts = [rng.randrange(0, 1000) for _ in range(500)]
+    ends = [start + rng.randrange(0, 200) for start in starts]
+
+    aligned = align_starts(starts, ends, 7)
+
+    assert all((end - start) % 7 == 0 for start, end in zip(aligned.tolist(), ends))
+    assert all(start >= 0 for start in aligned.tolist())
+
+
+def test_read_skips_blank_lines():
+    intervals = BedIntervals.read(
+        ["chr\t5\t10\tname\t0\t+\n", "\n", "chr\t1\t3\n"], extra_columns=True
+    )
+
+    assert intervals.coordinates() == [(5, 10), (1, 3)]
+    assert intervals.extra == [["name", "0", "+"], []]
+    assert intervals.lines() == ["chr\t5\t10\tname\t0\t+\n", "chr\t1\t3\n"]
+
+
+def test_collapsed_in_first_occurrence_order():
+    rng = random.Random(1)
+    rloops = [(rng.randrange(0, 5), rng.randrange(5, 9)) for _ in range(200)]
+    intervals = BedIntervals.read(f"chr\t{start}\t{end}\n" for start, end in rloops)
+
+    collapsed, index = intervals.collapsed()
+
+    unique = list(dict.fromkeys(rloops))
+    assert collapsed.coordinates() == unique
+    assert collapsed.weighted_coordinates() == [
+        (start, end, rloops.count((start, end))) for start, end in unique
+    ]
+    assert [unique[i] for i in index.tolist()] == rloops
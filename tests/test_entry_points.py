@@ -0,0 +1,54 @@
+import os
+import pathlib
+import subprocess
+import sys
+
+import pytest
+
+import rloopgrammar
+
+PACKAGE_FOLDER = pathlib.Path(rloopgrammar.__file__).parent
+
+# Research scripts reading the files of the papers, not entry points
+EXCLUDED_FOLDERS = ("analysis",)
+
+
+def entry_modules():
+    modules = []
+
+    for path in sorted(PACKAGE_FOLDER.rglob("*.py")):
+        relative = path.relative_to(PACKAGE_FOLDER.parent)
+
+        if relative.parts[1] in EXCLUDED_FOLDERS:
+            continue
+        if "__main__" not in path.read_text(encoding="utf-8"):
+            continue
+
+        modules.append(".".join(relative.with_suffix("").parts))
+
+    return modules
+
+
+def test_entry_modules_found():
+    assert "rloopgrammar.build_model" in entry_modules()
+    assert "rloopgrammar.model.bootstrap_ensemble" in entry_modules()
+
+
+@pytest.mark.parametrize("module", entry_modules())
+def test_help(module):
+    """Every entry point builds its parser, conflicting options fail here."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [str(PACKAGE_FOLDER.parent)] + env.get("PYTHONPATH", "").split(os.pathsep)
+    )
+
+    completed = subprocess.run(
+        [sys.executable, "-m", module, "-h"],
+        capture_output=True,
+        text=True,
+        env=env,
+        timeout=120,
+    )
+
+    assert completed.returncode == 0, completed.stderr
+    assert "usage:" in completed.stdout
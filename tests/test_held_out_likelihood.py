@@ -0,0 +1,115 @@
+import contextlib
+import io
+import math
+
+import pytest
+
+import rloopgrammar.model_bundle as model_bundle
+import rloopgrammar.predict as predict
+import rloopgrammar.reference.grammar_word as grammar_word
+import rloopgrammar.reference.probabilistic_language as probabilistic_language
+
+from rloopgrammar.model.held_out_likelihood import HeldOutLikelihood
+
+from conftest import WINDOW_LENGTH
+
+
+@pytest.fixture(scope="module")
+def scored_model(model_collection, tmp_path_factory):
+    """Every R-loop of predict.py, with boundary reads, scored by a model, and the
+    probabilities of their words computed one word at a time."""
+    folder = tmp_path_factory.mktemp("held_out")
+    plasmid = model_collection.data.plasmid
+    bundle = model_bundle.ModelBundle.open(model_collection.run_folders[0])
+    w = WINDOW_LENGTH
+
+    all_rloops_filename = folder / "all_rloops.bed"
+    predict.write_all_rloops(plasmid, w, all_rloops_filename)
+
+    words_filename = folder / "words.txt"
+    probabilities_filename = folder / "probabilities.txt"
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        grammar_word.GrammarWord.extract_word(
+            plasmid.fasta_file,
+            str(all_rloops_filename),
+            str(bundle.path("dictionary")),
+            plasmid.gene_start,
+            plasmid.gene_end,
+            w,
+            str(words_filename),
+        )
+        probabilistic_language.Probabilistic_Language.word_probabilities(
+            str(words_filename),
+            str(bundle.path("probabilities")),
+            w,
+            str(probabilities_filename),
+        )
+
+    with open(all_rloops_filename, "r") as fin:
+        rloops = [tuple(map(int, line.split("\t")[1:3])) for line in fin]
+
+    with open(probabilities_filename, "r") as fin:
+        brute_force = dict(zip(rloops, (float(line) for line in fin)))
+
+    # Aligned reads just outside the R-loops of predict.py
+    gene_start, gene_end = plasmid.gene_start, plasmid.gene_end
+    boundary = [
+        (gene_end - 2 * w, gene_end - w),
+        (gene_end - 3 * w, gene_end - w),
+        (gene_end - 2 * w, gene_end),
+        (gene_start, gene_start + 2 * w),
+    ]
+
+    bed_filename = folder / "scored.bed"
+    with open(bed_filename, "w") as fout:
+        for start, end in rloops + boundary:
+            fout.write(f"{plasmid.name}\t{start}\t{end}\n")
+
+    out_filename = folder / "scored_log_likelihood.bed"
+    summary = HeldOutLikelihood.score(
+        plasmid.fasta_file,
+        str(bed_filename),
+        str(bundle.path("dictionary")),
+        str(bundle.path("probabilities")),
+        plasmid.gene_start,
+        plasmid.gene_end,
+        w,
+        str(out_filename),
+    )
+
+    with open(out_filename, "r") as fin:
+        scores = {
+            (int(start), int(end)): value
+            for _, start, end, value in (line.rstrip("\n").split("\t") for line in fin)
+        }
+
+    return brute_force, boundary, scores, summary
+
+
+def test_boundary_reads_not_scored(scored_model):
+    brute_force, boundary, scores, summary = scored_model
+
+    assert all(scores[rloop] == "NA" for rloop in boundary)
+    assert summary["scored"] == len(brute_force)
+
+
+def test_probabilities_sum_to_one(scored_model):
+    brute_force, boundary, scores, summary = scored_model
+    total = math.fsum(
+        math.exp(float(value)) for value in scores.values() if value != "NA"
+    )
+
+    assert total <= 1 + 1e-9
+    assert total == pytest.approx(1.0, rel=1e-9)
+
+
+def test_probabilities_match_words(scored_model):
+    """The closed form matches the probabilities of the words, normalised over
+    every R-loop of predict.py."""
+    brute_force, boundary, scores, summary = scored_model
+
+    for rloop, probability in brute_force.items():
+        assert math.exp(float(scores[rloop])) == pytest.approx(
+            probability, rel=1e-9, abs=1e-300
+        ), rloop
@@ -0,0 +1,85 @@
+import collections
+import random
+
+import pytest
+
+import rloopgrammar.model.packed_sequence as packed_sequence
+
+from rloopgrammar.model.packed_sequence import MAX_KMER_LENGTH, PackedSequence
+
+
+def random_sequence(length, seed, alphabet="ACGT"):
+    rng = random.Random(seed)
+    return "".join(rng.choice(alphabet) for _ in range(length))
+
+
+# Sequences with and without other characters than A, C, G, T
+SEQUENCES = [
+    random_sequence(101, 0),
+    random_sequence(97, 1, "ACGTACGTACGTNa"),
+    "N" * 5 + random_sequence(40, 2) + "acgt",
+]
+KMER_LENGTHS = [1, 2, 3, 4, 7, MAX_KMER_LENGTH, MAX_KMER_LENGTH + 1, 40]
+
+
+@pytest.mark.parametrize("seq", SEQUENCES)
+def test_slices(seq):
+    packed = PackedSequence(seq)
+
+    assert len(packed) == len(seq)
+    assert packed[:] == seq
+    assert [packed[i] for i in range(-len(seq), len(seq))] == list(seq + seq)
+
+    for index in [slice(3, 17), slice(5, 90, 3), slice(None, None, -2), slice(7, 7)]:
+        assert packed[index] == seq[index]
+
+
+@pytest.mark.parametrize("seq", SEQUENCES)
+@pytest.mark.parametrize("k", KMER_LENGTHS)
+def test_kmers(seq, k):
+    packed = PackedSequence(seq)
+    kmers = [seq[i : i + k] for i in range(len(seq) - k + 1)]
+    values = {kmer: i for i, kmer in enumerate(sorted(set(kmers[::2])))}
+
+    assert packed.kmer_strings(k) == kmers
+    assert packed.kmer_counts(k) == dict(collections.Counter(kmers))
+    assert packed.kmer_values(k, values, -1) == [values.get(x, -1) for x in kmers]
+
+
+@pytest.mark.parametrize("seq", SEQUENCES)
+@pytest.mark.parametrize("k", [1, 4, 6])
+def test_string_fallback_matches_packed(monkeypatch, seq, k):
+    """The k-mers longer than MAX_KMER_LENGTH are read as strings, with the
+    same results as the codes of the packed k-mers."""
+    packed = PackedSequence(seq)
+    values = {kmer: i for i, kmer in enumerate(sorted(set(packed.kmer_strings(k))))}
+    packed_results = (
+        packed.kmer_strings(k),
+        packed.kmer_counts(k),
+        packed.kmer_values(k, values),
+    )
+
+    monkeypatch.setattr(packed_sequence, "MAX_KMER_LENGTH", k - 1)
+    fallback = PackedSequence(seq)
+
+    assert (
+        fallback.kmer_strings(k),
+        fallback.kmer_counts(k),
+        fallback.kmer_values(k, values),
+    ) == packed_results
+
+
+def test_encode_decode():
+    for kmer in ["A", "ACGT", random_sequence(MAX_KMER_LENGTH, 3)]:
+        code = PackedSequence.encode(kmer)
+
+        assert PackedSequence.decode(code, len(kmer)) == kmer
+
+    assert PackedSequence.encode("ACNT") is None
+
+
+def test_kmer_codes_bounds():
+    packed = PackedSequence(SEQUENCES[0])
+
+    with pytest.raises(ValueError):
+        packed.kmer_codes(MAX_KMER_LENGTH + 1)
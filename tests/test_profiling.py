@@ -0,0 +1,87 @@
+import pytest
+
+import rloopgrammar.kfold_model as kfold_model
+import rloopgrammar.predict as predict
+import rloopgrammar.profiling as profiling
+import rloopgrammar.union_models as union_models
+
+from conftest import PADDING_LENGTH, WINDOW_LENGTH, run_main
+
+# Stages profiled by each command, with the code outside them under "task"
+PROFILED_STAGES = {
+    "kfold": {
+        "task",
+        "extract",
+        "folds",
+        "threshold",
+        "dictionary",
+        "words",
+        "probabilities",
+        "held_out",
+        "statistics",
+        "bundle",
+    },
+    "predict": {"task", "candidates", "words", "word_probabilities", "in_loop"},
+    "union": {"task", "dictionary", "words", "probabilities", "bundle"},
+}
+
+
+def command_arguments(command, model_collection):
+    data = model_collection.data
+
+    if command == "kfold":
+        return kfold_model.main, [
+            "-i",
+            data.ini_file,
+            "--plasmids",
+            data.plasmid.name,
+            "-f",
+            3,
+            "-p",
+            PADDING_LENGTH,
+            "-w",
+            WINDOW_LENGTH,
+        ]
+
+    if command == "predict":
+        return predict.main, [
+            "-i",
+            model_collection.collection_folder,
+            "--ini_file",
+            data.ini_file,
+            "--plasmids",
+            data.plasmid.name,
+        ]
+
+    # the union of the models of the collection with themselves
+    return union_models.main, [
+        "-m",
+        "deterministic",
+        "-i",
+        model_collection.collection_folder,
+        model_collection.collection_folder,
+        "--ini_file",
+        data.ini_file,
+    ]
+
+
+@pytest.mark.parametrize("command", sorted(PROFILED_STAGES))
+def test_profile(command, model_collection, tmp_path):
+    collection_folder = tmp_path / command
+    main, argv = command_arguments(command, model_collection)
+
+    run_main(main, [collection_folder] + argv + ["-j", 1, "--profile"])
+
+    profile_filenames = list(
+        (collection_folder / profiling.PROFILE_FOLDER).glob(
+            f"*{profiling.PROFILE_SUFFIX}"
+        )
+    )
+
+    assert {
+        profiling.file_stage(filename) for filename in profile_filenames
+    } == PROFILED_STAGES[command]
+
+    report_filename = profiling.merge_profiles(collection_folder)
+    assert report_filename.is_file()
+    assert (collection_folder / profiling.MERGED_PROFILE_FILENAME).is_file()
@@ -0,0 +1,155 @@
+import pytest
+
+import rloopgrammar.build_model as build_model
+import rloopgrammar.kfold_model as kfold_model
+import rloopgrammar.manifest as manifest
+import rloopgrammar.predict as predict
+
+from rloopgrammar.checkpoint import COMPLETION_MARKER, is_complete
+from rloopgrammar.model.grammar_training import GrammarTraining
+from rloopgrammar.model.held_out_likelihood import HeldOutLikelihood
+from rloopgrammar.model.in_loop_probs import Loop_probabilities
+
+from conftest import PADDING_LENGTH, WINDOW_LENGTH, run_main
+
+
+class Interrupted(RuntimeError):
+    pass
+
+
+def interrupt_run(monkeypatch, cls, name, run_name):
+    """Make a stage of the run whose files are named after run_name fail, the
+    workers are forked with the patched stage."""
+    stage = getattr(cls, name)
+
+    def interrupted_stage(*args, **kwargs):
+        if any(run_name in str(x) for x in list(args) + list(kwargs.values())):
+            raise Interrupted(run_name)
+
+        return stage(*args, **kwargs)
+
+    monkeypatch.setattr(cls, name, interrupted_stage)
+
+
+def run_folders(collection_folder, prefix):
+    return sorted(
+        folder
+        for folder in collection_folder.iterdir()
+        if folder.is_dir() and folder.name.startswith(prefix)
+    )
+
+
+def interrupt_and_resume(monkeypatch, main, argv, collection_folder, prefix, stage):
+    """Run a collection with its run 1 failing, then resume it.
+
+    The runs completed before the failure are not run again, and every run of
+    the resumed collection is complete.
+    """
+    interrupt_run(monkeypatch, *stage, f"_w{WINDOW_LENGTH}_1")
+
+    with pytest.raises(Interrupted):
+        run_main(main, argv)
+
+    monkeypatch.undo()
+
+    folders = run_folders(collection_folder, prefix)
+    completed = {
+        folder.name: (folder / COMPLETION_MARKER).stat().st_mtime_ns
+        for folder in folders
+        if is_complete(folder)
+    }
+
+    assert folders[0].name in completed
+    assert folders[1].name not in completed
+
+    run_main(main, argv + ["--resume"])
+
+    folders = run_folders(collection_folder, prefix)
+    assert all(is_complete(folder) for folder in folders)
+
+    for name, marker_time in completed.items():
+        assert (collection_folder / name / COMPLETION_MARKER).stat().st_mtime_ns == (
+            marker_time
+        )
+
+    collection_manifest = manifest.Manifest.load(collection_folder)
+    assert collection_manifest.finished_runs() == [f.name for f in folders]
+
+
+def test_resume_build(monkeypatch, synthetic_data, tmp_path):
+    collection_folder = tmp_path / "models"
+
+    interrupt_and_resume(
+        monkeypatch,
+        build_model.main,
+        [
+            collection_folder,
+            "-i",
+            synthetic_data.ini_file,
+            "--plasmid",
+            synthetic_data.plasmid.name,
+            "-c",
+            3,
+            "-p",
+            PADDING_LENGTH,
+            "-k",
+            WINDOW_LENGTH,
+            "-sp",
+            50,
+            "-j",
+            1,
+        ],
+        collection_folder,
+        "Model_",
+        (GrammarTraining, "find_probabilities"),
+    )
+
+
+def test_resume_kfold(monkeypatch, synthetic_data, tmp_path):
+    collection_folder = tmp_path / "folds"
+
+    interrupt_and_resume(
+        monkeypatch,
+        kfold_model.main,
+        [
+            collection_folder,
+            "-i",
+            synthetic_data.ini_file,
+            "--plasmids",
+            synthetic_data.plasmid.name,
+            "-f",
+            3,
+            "-p",
+            PADDING_LENGTH,
+            "-w",
+            WINDOW_LENGTH,
+            "-j",
+            1,
+        ],
+        collection_folder,
+        "Model_",
+        (HeldOutLikelihood, "score"),
+    )
+
+
+def test_resume_predict(monkeypatch, model_collection, tmp_path):
+    collection_folder = tmp_path / "predictions"
+
+    interrupt_and_resume(
+        monkeypatch,
+        predict.main,
+        [
+            collection_folder,
+            "-i",
+            model_collection.collection_folder,
+            "--ini_file",
+            model_collection.data.ini_file,
+            "--plasmids",
+            model_collection.data.plasmid.name,
+            "-j",
+            1,
+        ],
+        collection_folder,
+        "Prediction_",
+        (Loop_probabilities, "in_loop_probabilities"),
+    )
@@ -0,0 +1,87 @@
+import random
+
+import pytest
+
+from rloopgrammar.model.packed_sequence import MAX_KMER_LENGTH, PackedSequence
+from rloopgrammar.model.rloop_blocks import RLoopBlocks
+
+BLOCK_KEYS = ["r1", "r2_rev", "r3_rev"]
+
+
+def baseline_blocks(gene_seq, start, end, window_length):
+    """Blocks of the regions as sliced by the baseline grammar_word."""
+    r1, r2, r3 = gene_seq[:start], gene_seq[start:end], gene_seq[end:]
+    r2_rev, r3_rev = r2[::-1], r3[::-1]
+
+    return {
+        "r1": [r1[i : i + window_length] for i in range(0, len(r1), window_length)],
+        "r2_rev": [
+            r2_rev[i : i + window_length][::-1]
+            for i in range(0, len(r2), window_length)
+        ],
+        "r3_rev": [
+            r3_rev[i : i + window_length][::-1]
+            for i in range(0, len(r3), window_length)
+        ],
+    }
+
+
+def rloops(gene_length, count, seed):
+    rng = random.Random(seed)
+
+    for _ in range(count):
+        start = rng.randrange(0, gene_length + 1)
+        yield start, rng.randrange(start, gene_length + 1)
+
+
+@pytest.mark.parametrize(
+    "window_length", [1, 3, 4, 7, MAX_KMER_LENGTH, MAX_KMER_LENGTH + 1, 37]
+)
+@pytest.mark.parametrize("alphabet", ["ACGT", "ACGTN"])
+def test_blocks_match_baseline(window_length, alphabet):
+    """Blocks of a str and of a PackedSequence, through its k-mer codes or read
+    as strings past MAX_KMER_LENGTH, are the blocks of the baseline."""
+    rng = random.Random(window_length)
+    gene_seq = "".join(rng.choice(alphabet) for _ in range(150))
+    packed_seq = PackedSequence(gene_seq)
+
+    for start, end in rloops(len(gene_seq), 40, window_length):
+        expected = baseline_blocks(gene_seq, start, end, window_length)
+
+        for seq in (gene_seq, packed_seq):
+            blocks = RLoopBlocks(seq, start, end, window_length)
+
+            for block_key in BLOCK_KEYS:
+                assert list(blocks.blocks(block_key)) == expected[block_key]
+                assert blocks.num_blocks(block_key) == len(expected[block_key])
+                assert [
+                    blocks.block(block_key, i)
+                    for i in range(blocks.num_blocks(block_key))
+                ] == expected[block_key]
+
+
+@pytest.mark.parametrize("window_length", [3, 4])
+def test_layout(window_length):
+    gene_seq = "ACGT" * 10
+
+    for start, end in rloops(len(gene_seq), 30, 0):
+        blocks = RLoopBlocks(gene_seq, start, end, window_length)
+
+        for block_key in BLOCK_KEYS:
+            full, short = blocks.layout(block_key)
+            positions = [(i, window_length) for i in full]
+            if short:
+                positions.append(short)
+
+            assert [gene_seq[i : i + length] for i, length in positions] == list(
+                blocks.blocks(block_key)
+            )
+
+
+def test_invalid_rloops():
+    with pytest.raises(AssertionError):
+        RLoopBlocks("", 0, 0, 4)
+    with pytest.raises(AssertionError):
+        RLoopBlocks("ACGT", 3, 2, 4)
+    with pytest.raises(AssertionError):
+        RLoopBlocks("ACGT", 0, 5, 4)
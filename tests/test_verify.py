@@ -0,0 +1,102 @@
+import json
+import shutil
+
+import pytest
+
+import rloopgrammar.manifest as manifest
+import rloopgrammar.predict as predict
+import rloopgrammar.verify as verify
+
+from conftest import run_main
+
+
+@pytest.fixture(scope="module")
+def prediction_collection(model_collection, tmp_path_factory):
+    """Predictions of the synthetic plasmid by the models of the collection."""
+    collection_folder = tmp_path_factory.mktemp("verify") / "predictions"
+
+    run_main(
+        predict.main,
+        [
+            collection_folder,
+            "-i",
+            model_collection.collection_folder,
+            "--ini_file",
+            model_collection.data.ini_file,
+            "--plasmids",
+            model_collection.data.plasmid.name,
+            "-j",
+            1,
+        ],
+    )
+
+    return collection_folder
+
+
+def verify_runs(collection_folder, plasmid):
+    collection_manifest = manifest.Manifest.load(collection_folder)
+
+    return [
+        verify.verify_run(
+            verify.VerificationTask(
+                collection_folder,
+                folder,
+                collection_manifest.kind,
+                plasmid,
+                verify.Tolerances(),
+            )
+        )
+        for folder in collection_manifest.finished_runs()
+    ]
+
+
+def test_models_match_reference(model_collection):
+    divergences = verify_runs(
+        model_collection.collection_folder, model_collection.data.plasmid
+    )
+
+    assert len(divergences) == len(model_collection.run_folders)
+    assert divergences == [None] * len(divergences)
+
+
+def test_predictions_match_reference(model_collection, prediction_collection):
+    divergences = verify_runs(prediction_collection, model_collection.data.plasmid)
+
+    assert len(divergences) == len(model_collection.run_folders)
+    assert divergences == [None] * len(divergences)
+
+
+def test_verify_collection(model_collection, prediction_collection):
+    plasmids = [model_collection.data.plasmid]
+
+    for collection_folder in (
+        model_collection.collection_folder,
+        prediction_collection,
+    ):
+        assert verify.verify_collection(collection_folder, plasmids, processes=1) == []
+
+        with open(collection_folder / verify.VERIFICATION_FILENAME, "r") as fin:
+            assert json.load(fin)["divergences"] == []
+
+
+def test_changed_prediction_diverges(model_collection, prediction_collection, tmp_path):
+    collection_folder = tmp_path / "predictions"
+    shutil.copytree(prediction_collection, collection_folder)
+
+    collection_manifest = manifest.Manifest.load(collection_folder)
+    folder = collection_manifest.finished_runs()[0]
+    probabilities_filename = collection_manifest.artifact(folder, "word_probabilities")
+
+    with open(probabilities_filename, "r") as fin:
+        probabilities = fin.read().splitlines()
+
+    probabilities[1] = repr(float(probabilities[1]) * 2)
+
+    with open(probabilities_filename, "w") as fout:
+        fout.write("\n".join(probabilities) + "\n")
+
+    divergence = verify_runs(collection_folder, model_collection.data.plasmid)[0]
+
+    assert divergence.folder == folder
+    assert divergence.artifact == "word_probabilities"
+    assert divergence.path == "[1]"